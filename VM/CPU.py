@@ -1,7 +1,9 @@
-from .Memory import Memory
-from .Registers import Reg32, Sreg
+from .Memory import Memory, PagedMemory
+from .Registers import Reg32, IntReg32, Sreg
 from .util import CPU
 from .FPU import FPU
+from .decodeCache import DecodeCache
+from .translator import BlockTranslator
 
 eax, ecx, edx, ebx, esp, ebp, esi, edi = range(8)
 
@@ -10,17 +12,22 @@ class CPU32(CPU):
     __slots__ = ('reg', 'sreg', 'mem', 'fpu', 'eip', 'opcode',
                  'modes', 'default_mode', 'current_mode',
                  'sizes', 'operand_size', 'address_size', 'stack_address_size',
-                 'code_segment_end', 'running', 'fmt'
+                 'code_segment_end', 'running', 'fmt', 'decode_cache', 'translator', 'register_operands'
                  )
 
-    def __init__(self, memsize: int):
+    def __init__(self, memsize: int, paged=False, int_registers=False):
         super().__init__()
 
-        self.reg = Reg32()
+        self.reg = IntReg32() if int_registers else Reg32()
         self.sreg = Sreg()
+        # (self.reg, number) pairs returned by `process_ModRM`, allocated once
+        self.register_operands = tuple((self.reg, number) for number in range(8))
 
         self.fpu = FPU()
-        self.mem = Memory(memsize, self.sreg)  # stack grows downward, user memory - upward
+        # stack grows downward, user memory - upward
+        self.mem = (PagedMemory if paged else Memory)(memsize, self.sreg)
+        self.decode_cache = DecodeCache(self.mem)
+        self.translator = BlockTranslator(self, self.decode_cache)
 
         self.eip = 0
         self.opcode = 0
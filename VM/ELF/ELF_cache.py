@@ -0,0 +1,192 @@
+"""
+Memory images of ELF executables and an on-disk cache for them.
+
+`ELFImage` is what `ExecuteELF.execute` needs to start a program: the segments to load (with their addresses
+and offsets in the `source` file), the entry point and the functions from the symbol table.
+The segments are read into the VM's memory straight from the file, see `Memory.map_file`.
+
+`ELFCache` stores images in files, so that the next runs of the same executable don't need to parse
+the ELF headers and the symbol table. A cached image holds the contents of all the segments laid out as they are
+in memory, so that it's loaded with one bulk copy. An image is found by the path, the modification time and the size
+of the executable. It's used right away if the inode and the change time of the executable are the same as when
+it was stored, otherwise only if the SHA-256 hash of the executable's contents still matches.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from collections import namedtuple
+
+from .ELF_impl import ELF32
+from .ELF_enums import e_type, p_type
+
+__all__ = 'ELFImage', 'Segment', 'ELFCache', 'build_image', 'DEFAULT_CACHE_DIRECTORY'
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'pyvm', 'elf')
+
+MAGIC = b'PyVMimg\0'
+VERSION = 3
+HEADER = struct.Struct('<8sI')  # magic, length of the JSON metadata that follows, then the memory image
+
+CHUNK_SIZE = 1 << 20  # the executable is hashed in chunks of this many bytes
+
+# base: the lowest address occupied by the segments
+# end: the highest address occupied by the PT_LOAD segments plus one
+# entry: the entry point
+# segments: the `Segment`s to load, in order
+# functions: {name: address} of the functions from the symbol table, see `ELF32.functions`
+# source: the file to read the segments from
+ELFImage = namedtuple('ELFImage', 'base end entry segments functions source')
+
+# `filesz` bytes at `offset` in the source file are loaded to `address`, the rest of the `memsz` bytes are zeros (BSS)
+Segment = namedtuple('Segment', 'address offset filesz memsz')
+
+LOADED_SEGMENTS = p_type.PT_LOAD, p_type.PT_GNU_EH_FRAME
+
+
+def build_image(elf: ELF32) -> ELFImage:
+    """
+    Collect the segments of `elf` into an `ELFImage`.
+    """
+    if elf.hdr.e_type != e_type.ET_EXEC:
+        raise ValueError(f'ELF file {elf.fname!r} is not executable (type: {elf.hdr.e_type})')
+
+    segments = [phdr for phdr in elf.phdrs if phdr.p_type in LOADED_SEGMENTS]
+
+    base = min(phdr.p_vaddr for phdr in segments)
+    end = max(phdr.p_vaddr + phdr.p_memsz for phdr in segments if phdr.p_type == p_type.PT_LOAD)
+
+    return ELFImage(
+        base, end, elf.hdr.e_entry,
+        tuple(Segment(phdr.p_vaddr, phdr.p_offset, phdr.p_filesz, phdr.p_memsz) for phdr in segments),
+        elf.functions(), elf.fname
+    )
+
+
+class ELFCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIRECTORY):
+        self.directory = directory
+        self.hits = self.misses = 0
+
+    def path(self, fname: str, stat: os.stat_result) -> str:
+        key = f'{os.path.realpath(fname)}\0{stat.st_mtime_ns}\0{stat.st_size}'.encode()
+
+        return os.path.join(self.directory, hashlib.sha256(key).hexdigest() + '.img')
+
+    @staticmethod
+    def identity(stat: os.stat_result) -> list:
+        """
+        Any write to the executable changes its change time, even if the modification time is set back afterwards.
+        """
+        return [stat.st_ino, stat.st_size, stat.st_mtime_ns, stat.st_ctime_ns]
+
+    @staticmethod
+    def digest(fname: str) -> str:
+        sha256 = hashlib.sha256()
+
+        with open(fname, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                sha256.update(chunk)
+
+        return sha256.hexdigest()
+
+    def get(self, fname: str) -> ELFImage:
+        """
+        :return: the image of the executable `fname`, from the cache if possible
+        """
+        stat = os.stat(fname)
+        path = self.path(fname, stat)
+        identity = self.identity(stat)
+
+        meta = self.load(path)
+        digest = None
+        if meta is not None and meta['stat'] != identity:
+            digest = self.digest(fname)
+            if meta['sha256'] != digest:
+                meta = None
+
+        if meta is not None:
+            self.hits += 1
+            return self.image(path, meta)
+
+        self.misses += 1
+        with ELF32(fname) as elf:
+            image = build_image(elf)
+
+        self.store(path, digest or self.digest(fname), identity, image)
+
+        return image
+
+    @staticmethod
+    def image(path: str, meta: dict) -> ELFImage:
+        """
+        :return: the image whose metadata `meta` was read from the file `path`
+        """
+        segment = Segment(meta['base'], meta['offset'], meta['size'], meta['end'] - meta['base'])
+
+        return ELFImage(meta['base'], meta['end'], meta['entry'], (segment, ), meta['functions'], path)
+
+    def load(self, path: str):
+        """
+        :return: the metadata stored in the file `path` or `None` if there's no such file or it's broken
+        """
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+        with file:
+            try:
+                magic, length = HEADER.unpack(file.read(HEADER.size))
+                meta = json.loads(file.read(length).decode())
+            except (struct.error, UnicodeDecodeError, ValueError):
+                return None
+
+            if magic != MAGIC or not isinstance(meta, dict) or meta.get('version') != VERSION:
+                return None
+
+            meta['offset'] = HEADER.size + length
+            if os.fstat(file.fileno()).st_size != meta['offset'] + meta['size']:
+                return None
+
+        return meta
+
+    def store(self, path: str, digest: str, identity: list, image: ELFImage) -> None:
+        """
+        Write `image` and the contents of its segments to the file `path`. The file is replaced atomically,
+        so concurrent runs never see a partially written image.
+        """
+        data = bytearray(max(segment.address + segment.filesz for segment in image.segments) - image.base)
+
+        with open(image.source, 'rb') as f:
+            for segment in image.segments:
+                f.seek(segment.offset)
+                start = segment.address - image.base
+                data[start:start + segment.filesz] = f.read(segment.filesz)
+
+        meta = {
+            'version': VERSION,
+            'sha256': digest,
+            'stat': identity,
+            'base': image.base,
+            'end': image.end,
+            'entry': image.entry,
+            'size': len(data),
+            'functions': image.functions,
+        }
+        header = json.dumps(meta).encode()
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(HEADER.pack(MAGIC, len(header)))
+                file.write(header)
+                file.write(data)
+
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
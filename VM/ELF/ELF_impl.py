@@ -1,5 +1,5 @@
 from .ELF_structs import ELF32_Ehdr, ELF32_Shdr, ELF32_Phdr, ELF32_Sym
-from .ELF_enums import EI_CLASS, EI_DATA, e_machine, e_type, p_type
+from .ELF_enums import EI_CLASS, EI_DATA, e_machine, e_type, p_type, st_type
 
 
 __all__ = 'ELF32',
@@ -19,7 +19,9 @@ class ELF32:
         assert ident.EI_DATA == EI_DATA.ELFDATA2LSB, f'Big endian is not supported (file {self.fname!r})'
         assert self.hdr.e_machine == e_machine.x86, f'Architecture {self.hdr.e_machine} is not supported (file {self.fname!r})'
         
+        self.__sections = None
         self.__phdrs = None
+        self.__symtab = None
         
     def __enter__(self):
         return self
@@ -39,3 +41,64 @@ class ELF32:
         self.__phdrs = [ELF32_Phdr(self.file) for _ in range(self.hdr.e_phnum)]
         
         return self.__phdrs
+
+    @property
+    def sections(self):
+        if self.__sections is not None:
+            return self.__sections
+
+        self.file.seek(self.hdr.e_shoff)
+        sections = [ELF32_Shdr(self.file) for _ in range(self.hdr.e_shnum)]
+
+        if not sections:
+            self.__sections = {}
+            return self.__sections
+
+        shstrndx = sections[self.hdr.e_shstrndx]
+        self.file.seek(shstrndx.sh_offset)
+        names = self.file.read(shstrndx.sh_size)
+
+        self.__sections = {
+            names[section.sh_name:].split(b'\0', 1)[0].decode(): section
+            for section in sections[1:]
+        }
+
+        return self.__sections
+
+    @property
+    def symtab(self):
+        """
+        All the symbols from the `.symtab` section: {name: ELF32_Sym}. Empty if the file is stripped.
+        """
+        if self.__symtab is not None:
+            return self.__symtab
+
+        try:
+            sec_symtab = self.sections['.symtab']
+            sec_strtab = self.sections['.strtab']
+        except KeyError:
+            self.__symtab = {}
+            return self.__symtab
+
+        self.file.seek(sec_symtab.sh_offset)
+        symbols = [ELF32_Sym(self.file) for _ in range(sec_symtab.sh_size // sec_symtab.sh_entsize)]
+
+        self.file.seek(sec_strtab.sh_offset)
+        names = self.file.read(sec_strtab.sh_size)
+
+        self.__symtab = {
+            names[sym.st_name:].split(b'\0', 1)[0].decode(): sym
+            for sym in symbols
+        }
+
+        return self.__symtab
+
+    def functions(self) -> dict:
+        """
+        :return: {name: address} of the functions defined in the `.symtab` section
+        """
+        return {
+            name: sym.st_value
+            for name, sym in self.symtab.items()
+            if sym.type == st_type.STT_FUNC.value and sym.st_value
+        }
@@ -66,3 +66,7 @@ class ELF32_Sym(ELF_parser):
     st_info: 'B' = lambda x: str(enums.st_bind(x>>4)) + '|' + str(enums.st_type(x & 0xF))
     st_other: 'B'
     st_shndex: 'H'
+
+    @property
+    def type(self) -> int:
+        return self._st_info & 0xF
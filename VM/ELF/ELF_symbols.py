@@ -0,0 +1,81 @@
+from bisect import bisect_right
+
+from .ELF_impl import ELF32
+from .ELF_enums import st_type
+
+
+__all__ = 'SymbolIndex',
+
+SHN_UNDEF = 0  # the section index of undefined symbols
+
+
+class SymbolIndex:
+    """
+    Maps addresses to the names of the functions that contain them.
+
+    The functions are kept sorted by address, so a lookup is a binary search.
+    """
+
+    def __init__(self, functions=()):
+        """
+        :param functions: an iterable of (address, size, name). A size of 0 means "unknown":
+            such a function extends up to the next one.
+        """
+        functions = sorted(functions)
+
+        self.addresses = [address for address, _, _ in functions]
+        self.ends = [address + size if size else None for address, size, _ in functions]
+        self.names = [name for _, _, name in functions]
+
+    @classmethod
+    def from_elf(cls, elf: ELF32) -> 'SymbolIndex':
+        """
+        Index the functions from the `.symtab` section of `elf`, as well as untyped labels in `.text`
+        (hand-written entry points like `_start` usually don't have a type).
+        """
+        text = elf.sections.get('.text')
+
+        def is_code(sym) -> bool:
+            if sym.type == st_type.STT_FUNC.value:
+                return True
+
+            return (
+                sym.type == st_type.STT_NOTYPE.value and text is not None
+                and text.sh_addr <= sym.st_value < text.sh_addr + text.sh_size
+            )
+
+        return cls(
+            (sym.st_value, sym.st_size, name)
+            for name, sym in elf.symtab.items()
+            if name and sym.st_shndex != SHN_UNDEF and is_code(sym)
+        )
+
+    @classmethod
+    def from_file(cls, fname: str) -> 'SymbolIndex':
+        with ELF32(fname) as elf:
+            return cls.from_elf(elf)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def lookup(self, address: int):
+        """
+        :return: (name, start address) of the function that contains `address` or `None`
+        """
+        i = bisect_right(self.addresses, address) - 1
+        if i < 0:
+            return None
+
+        end = self.ends[i]
+        if end is not None and address >= end:
+            return None
+
+        return self.names[i], self.addresses[i]
+
+    def name(self, address: int) -> str:
+        """
+        :return: the name of the function that contains `address` or the address itself in hex
+        """
+        found = self.lookup(address)
+
+        return f'0x{address:08x}' if found is None else found[0]
@@ -1,2 +1,4 @@
 from . import ELF_enums as enums
 from .ELF_impl import *
+from .ELF_symbols import *
+from .ELF_cache import *
@@ -1,9 +1,32 @@
+import mmap
+import struct
 from ctypes import addressof, pointer, memmove, memset, string_at
 
 from .ctypes_types import ubyte, uword, udword, uqword
 from .FPU import flt, dbl, binary80
 
-__all__ = 'Memory',
+__all__ = (
+    'Memory', 'PagedMemory', 'PAGE_SHIFT', 'PAGE_SIZE', 'PAGE_WATCHED', 'PAGE_UNCOMMITTED', 'PAGE_CLEAN', 'PAGE_TRACED'
+)
+
+PAGE_SHIFT = 12
+PAGE_SIZE = 1 << PAGE_SHIFT
+ADDRESS_SPACE_SIZE = 1 << 32
+
+# Bits of `Memory.page_state`. A page with any bit set takes the slow write path (`Memory.page_write`).
+PAGE_WATCHED = 0b0001  # the page holds cached decoded instructions
+PAGE_UNCOMMITTED = 0b0010  # the page hasn't been written to yet (see `PagedMemory`)
+PAGE_CLEAN = 0b0100  # the page hasn't been written to since the last call to `Memory.mark_clean`
+PAGE_TRACED = 0b1000  # writes to the page are reported to `Memory.on_traced_write` (see `Memory.trace_writes`)
+
+# `struct` reads and writes integers in place, without creating ctypes objects or temporary `bytes`
+_U16, _U32 = struct.Struct('<H'), struct.Struct('<I')
+_S8, _S16, _S32 = struct.Struct('<b'), struct.Struct('<h'), struct.Struct('<i')
+
+_UNWATCH = bytes(bits & ~PAGE_WATCHED for bits in range(256))
+_MARK_CLEAN = bytes(bits | PAGE_CLEAN for bits in range(256))
+_TRACE = bytes(bits | PAGE_TRACED for bits in range(256))
+_UNTRACE = bytes(bits & ~PAGE_TRACED for bits in range(256))
 
 
 class Memory:
@@ -14,8 +37,13 @@ class Memory:
 
         self.__size = 0
         self.__segment_override_number = 3  # DS
-        self.mem = self.mem_ptr = None
+        self.mem = self.mem_ptr = self.view = None
         self.base = 0
+        self.page_state = bytearray()
+        self.committed = None  # numbers of the pages that have physical memory behind them, `None` if all pages do
+        self.dirty_pages = None  # pages written to since the last call to `mark_clean`, if it has been called
+        self.on_watched_write = None  # callable(address, size), called on writes to watched pages
+        self.on_traced_write = None  # callable(address, size), called on all writes, see `trace_writes`
         self.__segment_base = 0
 
         self.size = memsz
@@ -42,12 +70,43 @@ class Memory:
     def size(self, memsz: int):
         assert memsz > 0
 
-        self.mem = (ubyte * memsz)()
+        if self.on_watched_write is not None and self.__size:
+            # all the old contents are gone
+            self.on_watched_write(0, self.__size)
+
+        self.mem = self.allocate(memsz)
+        self.page_state = bytearray((memsz >> PAGE_SHIFT) + 1)
+        self.committed = None
+        self.dirty_pages = None
 
         self.base = addressof(self.mem)
         self.mem_ptr = pointer(self.mem)
+        self.view = memoryview(self.mem).cast('B')
         self.__size = memsz
 
+        if self.on_traced_write is not None:
+            self.trace_writes(self.on_traced_write)
+
+    def allocate(self, memsz: int):
+        """
+        Allocate `memsz` bytes of zero-filled memory.
+        :return: a ctypes array of unsigned bytes
+        """
+        return (ubyte * memsz)()
+
+    @property
+    def committed_pages(self) -> int:
+        return len(self.page_state) if self.committed is None else len(self.committed)
+
+    def committed_page_numbers(self):
+        """
+        :return: the numbers of the committed pages in ascending order
+        """
+        if self.committed is None:
+            return range((self.__size + PAGE_SIZE - 1) >> PAGE_SHIFT)
+
+        return sorted(self.committed)
+
     @property
     def segment_override(self) -> int:
         return self.__segment_override_number
@@ -58,6 +117,124 @@ class Memory:
 
         self.__segment_base = sreg.hidden.base
 
+    def watch_page(self, page: int) -> None:
+        self.page_state[page] |= PAGE_WATCHED
+
+    def unwatch_all(self) -> None:
+        self.page_state[:] = self.page_state.translate(_UNWATCH)
+
+    def trace_writes(self, callback) -> None:
+        """
+        Call `callback(address, size)` before every write to memory or stop doing so if `callback` is `None`.
+        """
+        self.on_traced_write = callback
+        state = self.page_state
+
+        # writes to uncommitted pages take the slow path anyway, `page_write` marks them as traced when they're committed
+        if self.committed is None:
+            state[:] = state.translate(_UNTRACE if callback is None else _TRACE)
+        elif callback is None:
+            for page in self.committed:
+                state[page] &= ~PAGE_TRACED
+        else:
+            for page in self.committed:
+                state[page] |= PAGE_TRACED
+
+    def mark_clean(self) -> None:
+        """
+        Start tracking writes: the first write to each page after this call adds its number to `dirty_pages`.
+        """
+        state = self.page_state
+
+        # uncommitted pages are added to `dirty_pages` by `page_write` when they're committed
+        if self.committed is None:
+            state[:] = state.translate(_MARK_CLEAN)
+        else:
+            for page in self.committed:
+                state[page] |= PAGE_CLEAN
+
+        self.dirty_pages = set()
+
+    def copy_pages(self) -> dict:
+        """
+        :return: {page number: contents} for all the committed pages
+        """
+        size = self.__size
+
+        return {
+            page: string_at(self.base + (page << PAGE_SHIFT), min(PAGE_SIZE, size - (page << PAGE_SHIFT)))
+            for page in self.committed_page_numbers()
+        }
+
+    def reset_page(self, page: int, data: bytes) -> None:
+        """
+        Overwrite page number `page` with `data` (or zeros if `data` is `None`) and mark it as clean.
+        """
+        addr = page << PAGE_SHIFT
+        size = min(PAGE_SIZE, self.__size - addr)
+        state = self.page_state
+
+        if state[page] & PAGE_WATCHED and self.on_watched_write is not None:
+            self.on_watched_write(addr, size)
+
+        if data is None:
+            memset(self.base + addr, 0, size)
+        else:
+            memmove(self.base + addr, data, size)
+
+        bits = state[page]
+        if bits & PAGE_UNCOMMITTED:
+            self.committed.add(page)
+
+            if self.on_traced_write is not None:
+                bits |= PAGE_TRACED
+
+        state[page] = (bits & ~PAGE_UNCOMMITTED) | PAGE_CLEAN
+
+    def pages_touched(self, addr: int, size: int) -> bool:
+        """
+        Check whether any of the pages in the absolute address range `addr`..`addr + size` has state bits set.
+        """
+        state = self.page_state
+        first, last = addr >> PAGE_SHIFT, (addr + size - 1) >> PAGE_SHIFT
+
+        return bool(state[first] or state[last] or (last - first > 1 and any(state[first + 1:last])))
+
+    def page_write(self, addr: int, size: int) -> None:
+        """
+        The slow write path: called _before_ `size` bytes at absolute address `addr` are written
+        and at least one of the pages involved has state bits set.
+        """
+        if size <= 0:
+            return
+
+        state = self.page_state
+        first, last = addr >> PAGE_SHIFT, (addr + size - 1) >> PAGE_SHIFT
+
+        pages = state[first:last + 1]
+
+        if self.on_traced_write is not None:
+            self.on_traced_write(addr, size)
+
+        if self.on_watched_write is not None and any(bits & PAGE_WATCHED for bits in pages):
+            self.on_watched_write(addr, size)
+
+        if any(bits & (PAGE_UNCOMMITTED | PAGE_CLEAN) for bits in pages):
+            for page in range(first, last + 1):
+                bits = state[page]
+
+                if bits & PAGE_UNCOMMITTED:
+                    self.committed.add(page)
+
+                    if self.on_traced_write is not None:
+                        bits |= PAGE_TRACED
+                    if self.dirty_pages is not None:
+                        bits |= PAGE_CLEAN
+                if bits & PAGE_CLEAN:
+                    self.dirty_pages.add(page)
+
+                state[page] = bits & ~(PAGE_UNCOMMITTED | PAGE_CLEAN)
+
     def asan_raw(self, offset: int, size: int):
         """
         Check if it is valid to access `size` bytes at address `offset` withing the current code segment.
@@ -105,15 +282,11 @@ class Memory:
         assert offset >= 0, f'Invalid memory address: {hex(offset)}'
 
         if size == 4:
-            ret = self.types[size].from_address(self.base + self.__segment_base + offset).value
-
-            return ret if not signed else (ret if ret < 2147483648 else ret - 4294967296)
+            return (_S32 if signed else _U32).unpack_from(self.view, self.__segment_base + offset)[0]
         elif size == 2:
-            ret = self.types[size].from_address(self.base + self.__segment_base + offset).value
-
-            return ret if not signed else (ret if ret < 32768 else ret - 65536)
+            return (_S16 if signed else _U16).unpack_from(self.view, self.__segment_base + offset)[0]
         elif size == 1:
-            ret = self.mem[self.__segment_base + offset]
+            ret = self.view[self.__segment_base + offset]
 
             return ret if not signed else (ret if ret < 128 else ret - 256)
 
@@ -121,6 +294,66 @@ class Memory:
             f'Memory.get(offset={offset:08x}, size={size}): invalid size, please use Memory.get_bytes instead'
         )
 
+    def get8(self, offset: int) -> int:
+        addr = self.__segment_base + offset
+        if addr >= self.__size:
+            raise self.bounds_error(offset, 1)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return self.view[addr]
+
+    def get16(self, offset: int) -> int:
+        addr = self.__segment_base + offset
+        if addr + 2 > self.__size:
+            raise self.bounds_error(offset, 2)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _U16.unpack_from(self.view, addr)[0]
+
+    def get32(self, offset: int) -> int:
+        addr = self.__segment_base + offset
+        if addr + 4 > self.__size:
+            raise self.bounds_error(offset, 4)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _U32.unpack_from(self.view, addr)[0]
+
+    def get8s(self, offset: int) -> int:
+        addr = self.__segment_base + offset
+        if addr >= self.__size:
+            raise self.bounds_error(offset, 1)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _S8.unpack_from(self.view, addr)[0]
+
+    def get16s(self, offset: int) -> int:
+        addr = self.__segment_base + offset
+        if addr + 2 > self.__size:
+            raise self.bounds_error(offset, 2)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _S16.unpack_from(self.view, addr)[0]
+
+    def get32s(self, offset: int) -> int:
+        addr = self.__segment_base + offset
+        if addr + 4 > self.__size:
+            raise self.bounds_error(offset, 4)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _S32.unpack_from(self.view, addr)[0]
+
+    def bounds_error(self, offset: int, size: int) -> MemoryError:
+        return MemoryError(
+            f'Not enough memory (tried to access address range 0x{offset:08x}-0x{offset + size:08x} '
+            f'({size} bytes), maximum address: 0x{self.size:08x} bytes)'
+        )
+
     def get_bytes(self, offset: int, size: int) -> bytes:
         # self.asan(offset, size) -> pasted here for speed
         if self.__segment_base + offset > self.__size or self.__segment_base + offset + size > self.__size:
@@ -147,20 +380,65 @@ class Memory:
         assert offset >= 0, f'Invalid memory address: {hex(offset)}'
 
         if size == 4:
-            ret = self.types[size].from_address(self.base + offset).value
-
-            return ret if not signed else (ret if ret < 2147483648 else ret - 4294967296)
+            return (_S32 if signed else _U32).unpack_from(self.view, offset)[0]
         elif size == 2:
-            ret = self.types[size].from_address(self.base + offset).value
-
-            return ret if not signed else (ret if ret < 32768 else ret - 65536)
+            return (_S16 if signed else _U16).unpack_from(self.view, offset)[0]
         elif size == 1:
-            ret = self.mem[offset]
+            ret = self.view[offset]
 
             return ret if not signed else (ret if ret < 128 else ret - 256)
 
         return bytes(self.mem[offset:offset + size])
 
+    # Like `get8`, `get16`, etc., but don't take segments into account, like `get_eip`
+    def get_eip8(self, offset: int) -> int:
+        if offset >= self.__size:
+            raise self.bounds_error(offset, 1)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return self.view[offset]
+
+    def get_eip16(self, offset: int) -> int:
+        if offset + 2 > self.__size:
+            raise self.bounds_error(offset, 2)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _U16.unpack_from(self.view, offset)[0]
+
+    def get_eip32(self, offset: int) -> int:
+        if offset + 4 > self.__size:
+            raise self.bounds_error(offset, 4)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _U32.unpack_from(self.view, offset)[0]
+
+    def get_eip8s(self, offset: int) -> int:
+        if offset >= self.__size:
+            raise self.bounds_error(offset, 1)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _S8.unpack_from(self.view, offset)[0]
+
+    def get_eip16s(self, offset: int) -> int:
+        if offset + 2 > self.__size:
+            raise self.bounds_error(offset, 2)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _S16.unpack_from(self.view, offset)[0]
+
+    def get_eip32s(self, offset: int) -> int:
+        if offset + 4 > self.__size:
+            raise self.bounds_error(offset, 4)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        return _S32.unpack_from(self.view, offset)[0]
+
     def get_float(self, offset: int, size: int) -> binary80:
         # self.asan(offset, size) -> pasted here for speed
         if self.__segment_base + offset > self.__size or self.__segment_base + offset + size // 8 > self.__size:
@@ -205,8 +483,76 @@ class Memory:
 
         assert offset >= 0, f'Invalid memory address: {hex(offset)}'
 
+        if size > 0 and self.pages_touched(offset, size):
+            self.page_write(offset, size)
+
         return memset(self.base + offset, value, size) - self.base
 
+    def memfill(self, offset: int, value: int, size: int, count: int) -> None:
+        """
+        Store `count` copies of the `size`-byte `value` starting at address `offset`.
+        Like `memset`, doesn't take segments into account.
+        """
+        total = size * count
+
+        # self.asan_raw(offset, total) -> pasted here for speed
+        if offset > self.__size or offset + total > self.__size:
+            raise MemoryError(
+                f'Not enough memory (tried to write to address range '
+                f'0x{offset:08x}-0x{offset + total:08x} ({total} bytes), maximum address: 0x{self.size:08x} bytes)'
+            )
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        if total > 0 and self.pages_touched(offset, total):
+            self.page_write(offset, total)
+
+        pattern = (value & ((1 << size * 8) - 1)).to_bytes(size, 'little')
+        if pattern.count(pattern[0]) == size:
+            memset(self.base + offset, pattern[0], total)
+        else:
+            self.mem[offset:offset + total] = pattern * count
+
+    def memmove(self, dst: int, src: int, size: int) -> None:
+        """
+        Copy `size` bytes from address `src` to address `dst`. The areas may overlap.
+        Like `memset`, doesn't take segments into account.
+        """
+        # self.asan_raw(...) -> pasted here for speed
+        if max(dst, src) > self.__size or max(dst, src) + size > self.__size:
+            raise MemoryError(
+                f'Not enough memory (tried to copy address range 0x{src:08x}-0x{src + size:08x} '
+                f'to 0x{dst:08x}-0x{dst + size:08x} ({size} bytes), maximum address: 0x{self.size:08x} bytes)'
+            )
+
+        assert dst >= 0 and src >= 0, f'Invalid memory address: {hex(min(dst, src))}'
+
+        if size > 0 and self.pages_touched(dst, size):
+            self.page_write(dst, size)
+
+        memmove(self.base + dst, self.base + src, size)
+
+    def find(self, offset: int, value: int, size: int) -> int:
+        """
+        Find the first byte equal to `value` in the range `offset`..`offset + size`.
+        Like `memset`, doesn't take segments into account.
+        :return: the address of the byte or -1 if there's no such byte
+        """
+        end = min(offset + size, self.__size)
+        chunk = 256  # most strings are short, so start small
+
+        while offset < end:
+            size = min(chunk, end - offset)
+            index = string_at(self.base + offset, size).find(value)
+
+            if index >= 0:
+                return offset + index
+
+            offset += size
+            chunk = min(chunk * 2, PAGE_SIZE * 16)
+
+        return -1
+
     # def set_addr(self, offset: int, size: int, addr: int) -> None:
     #     memmove(self.base + offset, addr, size)
 
@@ -221,7 +567,69 @@ class Memory:
         assert offset >= 0, f'Invalid memory address: {hex(offset)}'
 
         addr = self.__segment_base + offset
-        self.mem[addr:addr + size] = val
+        if size > 0 and self.pages_touched(addr, size):
+            self.page_write(addr, size)
+
+        self.view[addr:addr + size] = val  # a plain copy, `val` may be any bytes-like object
+
+    def write_from(self, offset: int, size: int, readinto) -> int:
+        """
+        Write at most `size` bytes at `offset` with `readinto(buffer)`, which fills the beginning of `buffer`
+        and returns the number of bytes it wrote, like `io.RawIOBase.readinto`. `size` is cut at the end of the memory.
+
+        The data is read straight into the memory unless some of the pages have state bits set:
+        then it's read into a temporary buffer first, so that only the bytes actually read go through `page_write`.
+        :return: the value returned by `readinto`
+        """
+        addr = self.__segment_base + offset
+        if addr > self.__size:
+            raise self.bounds_error(offset, size)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        size = min(size, self.__size - addr)
+        if size <= 0 or not self.pages_touched(addr, size):
+            return readinto(self.view[addr:addr + size])
+
+        buffer = bytearray(size)
+        l = readinto(buffer)
+
+        if l:
+            self.page_write(addr, l)
+            self.view[addr:addr + l] = memoryview(buffer)[:l]
+
+        return l
+
+    def map_file(self, offset: int, size: int, file, file_offset: int) -> None:
+        """
+        Load `size` bytes of `file` (a binary file object) starting at `file_offset` to absolute address `offset`.
+
+        The bytes are read straight into the memory. They're copied rather than mapped from the file,
+        so changing the file later (an assembler's output that's run in the same VM, say) doesn't affect the memory.
+        """
+        if offset + size > self.__size:
+            raise self.bounds_error(offset, size)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        if size > 0 and self.pages_touched(offset, size):
+            self.page_write(offset, size)
+
+        self.read_file(offset, size, file, file_offset)
+
+    def read_file(self, addr: int, size: int, file, file_offset: int) -> None:
+        if size <= 0:
+            return
+
+        file.seek(file_offset)
+        view = self.view[addr:addr + size]
+
+        while view:
+            count = file.readinto(view)
+            if not count:
+                raise ValueError(f'Unexpected end of file: {size - len(view)} of {size} bytes at 0x{file_offset:x} read')
+
+            view = view[count:]
 
     def set(self, offset: int, size: int, val: int) -> None:
         # self.asan(offset, size) -> pasted here for speed
@@ -234,17 +642,57 @@ class Memory:
         assert offset >= 0, f'Invalid memory address: {hex(offset)}'
 
         addr = self.__segment_base + offset
+        state = self.page_state
+        if state[addr >> 12] or state[(addr + size - 1) >> 12]:  # PAGE_SHIFT inlined for speed
+            self.page_write(addr, size)
+
         if size == 4:
-            # faster than byte unpacking with shifts
-            self.mem[addr:addr + 4] = (val & 0xFFFFFFFF).to_bytes(4, 'little')
+            _U32.pack_into(self.view, addr, val & 0xFFFFFFFF)
         elif size == 2:
-            # faster than `(val & 0xFFFF).to_bytes(2, 'little')`
-            self.mem[addr:addr + 2] = val & 0xFF, (val >> 8) & 0xFF  # (val & 0xFFFF).to_bytes(2, 'little')
+            _U16.pack_into(self.view, addr, val & 0xFFFF)
         elif size == 1:
-            self.mem[addr] = val
+            self.view[addr] = val & 0xFF
         else:
             raise RuntimeError(f'Memory.set: invalid size: {size} not in (1, 2, 4). Use Memory.set_bytes instead')
 
+    def set8(self, offset: int, val: int) -> None:
+        addr = self.__segment_base + offset
+        if addr >= self.__size:
+            raise self.bounds_error(offset, 1)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        if self.page_state[addr >> 12]:  # PAGE_SHIFT inlined for speed
+            self.page_write(addr, 1)
+
+        self.view[addr] = val & 0xFF
+
+    def set16(self, offset: int, val: int) -> None:
+        addr = self.__segment_base + offset
+        if addr + 2 > self.__size:
+            raise self.bounds_error(offset, 2)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        state = self.page_state
+        if state[addr >> 12] or state[(addr + 1) >> 12]:  # PAGE_SHIFT inlined for speed
+            self.page_write(addr, 2)
+
+        _U16.pack_into(self.view, addr, val & 0xFFFF)
+
+    def set32(self, offset: int, val: int) -> None:
+        addr = self.__segment_base + offset
+        if addr + 4 > self.__size:
+            raise self.bounds_error(offset, 4)
+
+        assert offset >= 0, f'Invalid memory address: {hex(offset)}'
+
+        state = self.page_state
+        if state[addr >> 12] or state[(addr + 3) >> 12]:  # PAGE_SHIFT inlined for speed
+            self.page_write(addr, 4)
+
+        _U32.pack_into(self.view, addr, val & 0xFFFFFFFF)
+
     def set_float(self, offset: int, size: int, val: binary80) -> None:
         # self.asan(offset, size) -> pasted here for speed
         if self.__segment_base + offset > self.__size or self.__segment_base + offset + size > self.__size:
@@ -258,6 +706,44 @@ class Memory:
         converted = {4: flt, 8: dbl}[size](float(val))
 
         addr = self.__segment_base + offset
+        if self.pages_touched(addr, size):
+            self.page_write(addr, size)
 
         self.mem[addr:addr + size] = {4: udword, 8: uqword}[size].from_buffer(converted).value.to_bytes(size, 'little')
 
+
+
+class PagedMemory(Memory):
+    """
+    Memory whose pages are allocated on first write. Its size is rounded up to a whole number of pages,
+    size 0 means the whole 32-bit address space.
+
+    It's backed by an anonymous private memory mapping, so the OS allocates each page
+    only when it's written to for the first time. Such pages are marked with `PAGE_UNCOMMITTED`,
+    so the first write to each of them takes the slow write path, which adds them to `committed`.
+    """
+
+    def __init__(self, memsz: int = ADDRESS_SPACE_SIZE, segment_registers=None):
+        self.mapping = None
+        super().__init__(memsz, segment_registers)
+
+    @Memory.size.setter
+    def size(self, memsz: int):
+        if memsz > ADDRESS_SPACE_SIZE:
+            raise MemoryError(f'Cannot allocate {memsz:,d} bytes: the address space is only {ADDRESS_SPACE_SIZE:,d} bytes')
+
+        Memory.size.fset(self, ((memsz + PAGE_SIZE - 1) & -PAGE_SIZE) or ADDRESS_SPACE_SIZE)
+
+        self.page_state = bytearray([PAGE_UNCOMMITTED]) * len(self.page_state)
+        self.committed = set()
+
+        if self.on_traced_write is not None:
+            self.trace_writes(self.on_traced_write)
+
+    def allocate(self, memsz: int):
+        if hasattr(mmap, 'MAP_PRIVATE'):
+            self.mapping = mmap.mmap(-1, memsz, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS)
+        else:
+            self.mapping = mmap.mmap(-1, memsz)
+
+        return (ubyte * memsz).from_buffer(self.mapping)
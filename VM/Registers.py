@@ -1,12 +1,18 @@
 import ctypes
 
 from .ctypes_types import ubyte, uword, udword
+from .misc import PARITY
 
-__all__ = 'Reg32',
+__all__ = 'Reg32', 'IntReg32', 'FLAGS_ADD', 'FLAGS_SUB', 'FLAGS_INC', 'FLAGS_DEC', 'FLAGS_LOGIC'
 
 REG_LETTERS = 'acdb'
 REG_TAILS = 'sp', 'bp', 'si', 'di'
 
+# Kinds of flag-producing operations that can be recorded in `Reg32.lazy_flags`
+FLAGS_ADD, FLAGS_SUB, FLAGS_INC, FLAGS_DEC, FLAGS_LOGIC = range(5)
+
+MAXVALS = [None, (1 << 8) - 1, (1 << 16) - 1, None, (1 << 32) - 1]  # MAXVALS[n] is the maximum value of an unsigned n-bit number
+
 
 def GenRegX(letter: str):
     assert letter in REG_LETTERS
@@ -172,7 +178,131 @@ class Sreg(ctypes.LittleEndianStructure):
         return self.__ptr[offset]
 
 
-class Reg32(_Reg32_base):
+class LazyFlags:
+    """
+    Lazy evaluation of the status flags, shared by the register files.
+
+    Status flags (CF, PF, AF, ZF, SF and OF) are evaluated lazily. Instructions that set all of them
+    (ADD, SUB, CMP, AND, INC, ...) record `(kind, a, b, c, size)` in `lazy_flags` instead, where
+    `kind` is one of `FLAGS_*`, `a` and `b` are the operands and `c` is the result before truncation to `size` bytes.
+    For `FLAGS_INC` and `FLAGS_DEC`, `b` holds the preserved value of CF since the second operand is always 1.
+
+    Single flags can be computed from the record with `get_CF`, `get_ZF`, etc. Accessing `eflags` stores the
+    recorded flags into the register and clears the record, so code that reads or writes `eflags` directly
+    always sees the correct values.
+
+    Subclasses provide `lazy_flags` and `raw_eflags`, the EFLAGS register itself.
+    """
+
+    __slots__ = ()
+
+    @property
+    def eflags(self):
+        if self.lazy_flags is not None:
+            self.materialize_flags()
+
+        return self.raw_eflags
+
+    def materialize_flags(self) -> None:
+        """
+        Store the flags recorded in `lazy_flags` into the EFLAGS register.
+        """
+        kind, a, b, c, sz = self.lazy_flags
+        self.lazy_flags = None
+
+        flags = self.raw_eflags
+        top = sz * 8 - 1
+        sign_a, sign_c = (a >> top) & 1, (c >> top) & 1
+
+        if kind == FLAGS_ADD:
+            flags.CF = c > MAXVALS[sz]
+            flags.AF = ((a & 255) + (b & 255)) > 255
+            flags.OF = (sign_a == (b >> top) & 1) and (sign_a != sign_c)
+        elif kind == FLAGS_SUB:
+            flags.CF = b > a
+            flags.AF = (b & 255) > (a & 255)
+            flags.OF = (sign_a != (b >> top) & 1) and (sign_a != sign_c)
+        elif kind == FLAGS_INC:
+            flags.CF = b
+            flags.AF = (a & 255) == 255
+            flags.OF = not sign_a and sign_c
+        elif kind == FLAGS_DEC:
+            flags.CF = b
+            flags.AF = (a & 255) == 0
+            flags.OF = sign_a and not sign_c
+        else:  # FLAGS_LOGIC
+            flags.CF = flags.AF = flags.OF = 0
+
+        flags.SF = sign_c
+        flags.ZF = (c & MAXVALS[sz]) == 0
+        flags.PF = PARITY[c & 255]
+
+    def get_CF(self) -> int:
+        pending = self.lazy_flags
+        if pending is None:
+            return self.raw_eflags.CF
+
+        kind, a, b, c, sz = pending
+        if kind == FLAGS_ADD:
+            return c > MAXVALS[sz]
+        if kind == FLAGS_SUB:
+            return b > a
+        if kind == FLAGS_LOGIC:
+            return 0
+        return b  # FLAGS_INC, FLAGS_DEC
+
+    def get_PF(self) -> int:
+        pending = self.lazy_flags
+        if pending is None:
+            return self.raw_eflags.PF
+
+        return PARITY[pending[3] & 255]
+
+    def get_AF(self) -> int:
+        if self.lazy_flags is not None:
+            self.materialize_flags()
+
+        return self.raw_eflags.AF
+
+    def get_ZF(self) -> int:
+        pending = self.lazy_flags
+        if pending is None:
+            return self.raw_eflags.ZF
+
+        return (pending[3] & MAXVALS[pending[4]]) == 0
+
+    def get_SF(self) -> int:
+        pending = self.lazy_flags
+        if pending is None:
+            return self.raw_eflags.SF
+
+        return (pending[3] >> (pending[4] * 8 - 1)) & 1
+
+    def get_OF(self) -> int:
+        pending = self.lazy_flags
+        if pending is None:
+            return self.raw_eflags.OF
+
+        kind, a, b, c, sz = pending
+        top = sz * 8 - 1
+        sign_a, sign_c = (a >> top) & 1, (c >> top) & 1
+
+        if kind == FLAGS_ADD:
+            return (sign_a == (b >> top) & 1) and (sign_a != sign_c)
+        if kind == FLAGS_SUB:
+            return (sign_a != (b >> top) & 1) and (sign_a != sign_c)
+        if kind == FLAGS_INC:
+            return not sign_a and sign_c
+        if kind == FLAGS_DEC:
+            return sign_a and not sign_c
+        return 0  # FLAGS_LOGIC
+
+
+class Reg32(LazyFlags, _Reg32_base):
+    """
+    General-purpose registers and EFLAGS stored in a ctypes structure.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -181,6 +311,22 @@ class Reg32(_Reg32_base):
         self.__ptr8 = ctypes.cast(ptr, ctypes.POINTER(ubyte))
         self.__ptr16 = ctypes.cast(ptr, ctypes.POINTER(uword))
         self.__ptr32 = ctypes.cast(ptr, ctypes.POINTER(udword))
+        self.raw_eflags = _Reg32_base.eflags.__get__(self, Reg32)
+
+        self.lazy_flags = None
+
+    def save(self) -> bytes:
+        """
+        :return: the values of all the registers. Flags recorded in `lazy_flags` are not included.
+        """
+        return ctypes.string_at(ctypes.addressof(self), ctypes.sizeof(self))
+
+    def load(self, state: bytes) -> None:
+        """
+        Restore the registers saved by `save`.
+        """
+        ctypes.memmove(ctypes.addressof(self), state, len(state))
+        self.lazy_flags = None
 
     def get(self, offset: int, size: int, signed=False) -> int:
         if size == 4:
@@ -213,3 +359,105 @@ class Reg32(_Reg32_base):
             self.__ptr8[4 * (offset % 4) + offset // 4] = value
         else:
             raise ValueError(f'Reg32.set_val(offset={offset}, size={size}, value={value}): unexpected size: {size}')
+
+
+def _flag(bit: int) -> property:
+    mask = 1 << bit
+
+    def get(self) -> int:
+        return (self.eflags >> bit) & 1
+
+    def set(self, value: int) -> None:
+        self.eflags = (self.eflags & ~mask) | ((value & 1) << bit)
+
+    return property(get, set)
+
+
+class IntEflags:
+    """
+    The EFLAGS register of `IntReg32`: the lower 16 bits as a Python integer, with the flags
+    at the bit positions defined by the architecture.
+    """
+    __slots__ = 'eflags',
+
+    CF, PF, AF, ZF, SF, TF, IF, DF, OF = (_flag(bit) for bit in (0, 2, 4, 6, 7, 8, 9, 10, 11))
+
+    def __init__(self):
+        self.eflags = 0
+
+
+def _register(offset: int, mask: int) -> property:
+    def get(self) -> int:
+        return self.regs[offset] & mask
+
+    def set(self, value: int) -> None:
+        self.regs[offset] = (self.regs[offset] & ~mask) | (value & mask)
+
+    return property(get, set)
+
+
+class IntReg32(LazyFlags):
+    """
+    General-purpose registers and EFLAGS stored as Python integers.
+
+    Has the same interface as `Reg32`, but `get` and `set` only index a list and mask the value
+    instead of going through ctypes pointers. 8- and 16-bit registers are computed by masking and shifting.
+    """
+    __slots__ = 'regs', 'raw_eflags', 'lazy_flags'
+
+    def __init__(self):
+        self.regs = [0] * 8
+        self.raw_eflags = IntEflags()
+        self.lazy_flags = None
+
+    def save(self) -> tuple:
+        """
+        :return: the values of all the registers. Flags recorded in `lazy_flags` are not included.
+        """
+        return tuple(self.regs), self.raw_eflags.eflags
+
+    def load(self, state: tuple) -> None:
+        """
+        Restore the registers saved by `save`.
+        """
+        regs, self.raw_eflags.eflags = state
+        self.regs[:] = regs
+        self.lazy_flags = None
+
+    def get(self, offset: int, size: int, signed=False) -> int:
+        if size == 4:
+            ret = self.regs[offset]
+
+            return ret if not signed or ret < 2147483648 else ret - 4294967296
+        elif size == 2:
+            ret = self.regs[offset] & 0xFFFF
+
+            return ret if not signed or ret < 32768 else ret - 65536
+        elif size == 1:
+            # AL, CL, DL, BL, AH, CH, DH, BH
+            ret = (self.regs[offset & 3] >> ((offset & 4) << 1)) & 0xFF
+
+            return ret if not signed or ret < 128 else ret - 256
+
+        raise ValueError(f'IntReg32.get(offset={offset}, size={size}): unexpected size: {size}')
+
+    def set(self, offset: int, size: int, value: int) -> None:
+        regs = self.regs
+
+        if size == 4:
+            regs[offset] = value & 0xFFFFFFFF
+        elif size == 2:
+            regs[offset] = (regs[offset] & 0xFFFF0000) | (value & 0xFFFF)
+        elif size == 1:
+            shift = (offset & 4) << 1
+            offset &= 3
+            regs[offset] = (regs[offset] & ~(0xFF << shift)) | ((value & 0xFF) << shift)
+        else:
+            raise ValueError(f'IntReg32.set(offset={offset}, size={size}, value={value}): unexpected size: {size}')
+
+
+for _offset, _name in enumerate([f'{letter}x' for letter in REG_LETTERS] + list(REG_TAILS)):
+    setattr(IntReg32, 'e' + _name, _register(_offset, 0xFFFFFFFF))
+    setattr(IntReg32, _name, _register(_offset, 0xFFFF))
+
+del _offset, _name
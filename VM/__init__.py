@@ -1,32 +1,58 @@
 import sys
 
 from .CPU import CPU32
-from .kernel import Kernel
+from .kernel import Kernel, DescriptorTable, HostFS, MemoryFS
 from .fetchLoop import FetchLoopMixin, ExecuteBytes, ExecuteFlat, ExecuteELF, ExecutionStrategy
+from .snapshot import Snapshot
+from .profiler import Profiler
+from .hooks import LibcHooks
+from .tracing import Tracing, DisassemblyTracer
 
 __author__ = '@ForceBru'
 __version__ = 0, 1, 0
 
 
 class VM(CPU32, FetchLoopMixin):
-    __slots__ = 'fmt', 'descriptors', 'GDT', 'running', 'RETCODE', 'kernel'
+    __slots__ = 'fmt', 'descriptors', 'GDT', 'running', 'RETCODE', 'kernel', 'profiler', 'instructions_retired', 'hooks', 'libc_hooks', 'tracing', 'elf_cache'
     from .misc import process_ModRM
 
-    def __init__(self, memsize: int, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr):
-        super().__init__(int(memsize))
-        self.kernel = Kernel(self)
+    def __init__(self, memsize: int, stdin=sys.stdin, stdout=sys.stdout, stderr=sys.stderr,
+                 paged=False, profile=False, libc_hooks=False, int_registers=False, elf_cache=None, fs=None):
+        super().__init__(int(memsize), paged, int_registers)
+        self.kernel = Kernel(self, fs)
+        self.profiler = Profiler(self) if profile else None
+        self.hooks = {}  # address -> function to call instead of executing the instruction there
+        self.libc_hooks = LibcHooks(self) if libc_hooks else None
+        self.tracing = Tracing(self)
+        self.elf_cache = elf_cache  # an `ELF.ELFCache` to load executables from or `None`
 
-        self.descriptors = [stdin, stdout, stderr]
+        self.descriptors = DescriptorTable([stdin, stdout, stderr])
         self.GDT = [
             b'\0' * 8  # 64-bit entry
         ] * 6  # TODO: how many entries are there?
         self.RETCODE = None
+        self.instructions_retired = 0  # counted by `run`
+
+    def snapshot(self) -> Snapshot:
+        """
+        Capture the current state of the VM. See `snapshot.Snapshot`.
+        """
+        return Snapshot(self)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        """
+        Return the VM to the state captured by `snapshot`.
+        """
+        snapshot.restore(self)
 
     def interrupt(self, code: int):
         if code == 0x80:  # syscall
             syscall_number = self.reg.eax
 
-            self.reg.eax = self.kernel[syscall_number]()
+            self.reg.eax = result = self.kernel[syscall_number]()
+
+            if self.tracing.syscall:
+                self.tracing.on_syscall(syscall_number, result)
         else:
             raise RuntimeError(f'Interrupt 0x{code:02x} is not supported yet')
 
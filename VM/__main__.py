@@ -4,6 +4,11 @@ import logging
 import sys
 
 from . import VMKernel, ExecutionStrategy
+from .profiler import format_report
+from .tracing import DisassemblyTracer
+from .traceRecorder import TraceRecorder
+from .sampler import SamplingProfiler
+from .ELF import SymbolIndex, ELFCache, DEFAULT_CACHE_DIRECTORY
 
 
 parser = argparse.ArgumentParser()
@@ -13,14 +18,64 @@ parser.add_argument(
     default=ExecutionStrategy.ELF, type=lambda s: ExecutionStrategy[s.upper()],
     help='Executable type (elf, flat)'
 )
-parser.add_argument('-m', '--memory', default=10_000, type=int, help='The amount of memory to give to the VM (bytes)')
+parser.add_argument(
+    '-m', '--memory', type=int,
+    help='The amount of memory to give to the VM (bytes, default: 10,000 or the whole address space with --paged)'
+)
+parser.add_argument(
+    '-p', '--paged', action='store_true', default=False,
+    help='Allocate memory pages on first write, so that the VM can have the whole 32-bit address space'
+)
+parser.add_argument(
+    '--profile', action='store_true', default=False,
+    help='Count the executed instructions and print the profile to stderr when the program exits'
+)
+parser.add_argument(
+    '--libc-hooks', action='store_true', default=False,
+    help='Execute memcpy, memset, strlen and other libc functions found in the symbol table natively'
+)
+parser.add_argument(
+    '--int-registers', action='store_true', default=False,
+    help='Store the registers as Python integers instead of a ctypes structure'
+)
+parser.add_argument(
+    '--elf-cache', metavar='DIR', nargs='?', const=DEFAULT_CACHE_DIRECTORY,
+    help=f'Cache the memory images of ELF executables in DIR for faster start-up (default: {DEFAULT_CACHE_DIRECTORY})'
+)
+parser.add_argument(
+    '--trace', action='store_true', default=False,
+    help='Print every executed instruction and system call to stderr (works with `python -O` as well)'
+)
+parser.add_argument(
+    '--record-trace', metavar='FILE',
+    help='Record the last executed instructions and write them to FILE when the program exits or crashes '
+         '(see `decode_trace.py`)'
+)
+parser.add_argument(
+    '--trace-size', type=int, default=1_000_000,
+    help='The number of instructions to keep with --record-trace (default: 1000000)'
+)
+parser.add_argument(
+    '--flamegraph', metavar='FILE',
+    help='Sample the guest call stack and write it to FILE in the collapsed stack format used by flame graph tools'
+)
+parser.add_argument(
+    '--sample-interval', type=int, default=1000,
+    help='The number of instructions between samples with --flamegraph (default: 1000)'
+)
 parser.add_argument('-d', '--debug', action='store_true', default=False, help='Enable debug output')
 parser.add_argument('-v', '--verbose', action='store_true', default=False)
 args = parser.parse_args()
 
 
+if args.memory is None:
+    args.memory = 0 if args.paged else 10_000
+
 if args.verbose:
-    print(f'Initializing VM with {args.memory:,d} bytes of memory...')
+    if args.paged and not args.memory:
+        print('Initializing VM with paged memory...')
+    else:
+        print(f'Initializing VM with {args.memory:,d} bytes of memory...')
 
 if args.debug:
     logging.basicConfig(
@@ -29,22 +84,57 @@ if args.debug:
         format='%(message)s'
     )
 
-vm = VMKernel(args.memory)
+vm = VMKernel(
+    args.memory,
+    paged=args.paged, profile=args.profile, libc_hooks=args.libc_hooks, int_registers=args.int_registers,
+    elf_cache=None if args.elf_cache is None else ELFCache(args.elf_cache)
+)
+
+if args.debug:
+    vm.tracing.attach(DisassemblyTracer(sys.stdout))
+elif args.trace:
+    vm.tracing.attach(DisassemblyTracer(sys.stderr))
+
+recorder = None
+if args.record_trace is not None:
+    recorder = TraceRecorder(args.trace_size)
+    vm.tracing.attach(recorder)
 
 cmd, *cmd_args = shlex.split(args.command)
 
-if args.type == ExecutionStrategy.ELF:
-    if args.verbose:
-        print(f'Running ELF executable {cmd!r} with arguments {cmd_args}...')
-    vm.execute(args.type, cmd, cmd_args)
-elif args.type == ExecutionStrategy.FLAT:
-    if cmd_args:
-        raise ValueError(f'Running flat binaries with arguments is not supported yet! Arguments: {cmd_args}')
-    if args.verbose:
-        print(f'Running flat executable {cmd!r}...')
-    vm.execute(args.type, cmd)
-else:
-    raise ValueError(f'Invalid executable type: {args.type}')
+sampler = None
+if args.flamegraph is not None:
+    symbols = SymbolIndex.from_file(cmd) if args.type == ExecutionStrategy.ELF else None
+    sampler = SamplingProfiler(symbols, args.sample_interval)
+    vm.tracing.attach(sampler)
+
+try:
+    if args.type == ExecutionStrategy.ELF:
+        if args.verbose:
+            print(f'Running ELF executable {cmd!r} with arguments {cmd_args}...')
+        vm.execute(args.type, cmd, cmd_args)
+    elif args.type == ExecutionStrategy.FLAT:
+        if cmd_args:
+            raise ValueError(f'Running flat binaries with arguments is not supported yet! Arguments: {cmd_args}')
+        if args.verbose:
+            print(f'Running flat executable {cmd!r}...')
+        vm.execute(args.type, cmd)
+    else:
+        raise ValueError(f'Invalid executable type: {args.type}')
+finally:
+    if recorder is not None:
+        recorder.dump(args.record_trace)
+
+    if sampler is not None:
+        with open(args.flamegraph, 'w') as file:
+            file.write(sampler.collapsed())
 
 if args.verbose:
     print(f'Command {args.command!r} executed!')
+    print(f'Memory pages committed: {vm.mem.committed_pages:,d}')
+
+    descriptors = vm.descriptors.stats()
+    print(f"File descriptors: {descriptors['opened']:,d} opened, at most {descriptors['peak']:,d} open at once")
+
+if args.profile:
+    print(format_report(vm.profiler.report()), file=sys.stderr)
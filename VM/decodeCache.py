@@ -0,0 +1,122 @@
+"""
+Cache of decoded instructions.
+
+Decoding an instruction (reading its prefixes and opcode and trying every implementation
+registered for that opcode until one of them accepts the ModRM byte) is done once per address.
+The result is stored as a `DecodedInstruction` tuple keyed by the address of the first byte
+of the instruction (including its prefixes), so that the fetch loop can jump right to the handler
+next time the same address is executed. Decoded ModRM operands (see `misc.decode_ModRM`)
+are cached as well, keyed by the address of the ModRM byte.
+
+Pages that contain cached instructions are marked as watched in `Memory.page_state`.
+Any write to such a page drops the entries that may overlap the written bytes, so self-modifying code
+and code loaded on top of an old program are handled correctly.
+"""
+
+from collections import namedtuple
+
+from .Memory import Memory, PAGE_SHIFT
+
+__all__ = 'DecodeCache', 'DecodedInstruction', 'MAX_INSTRUCTION_LENGTH', 'BRANCH_OPCODES', 'HOOK_OPCODE'
+
+MAX_INSTRUCTION_LENGTH = 15
+
+# Opcodes that (may) transfer control somewhere else than the next instruction.
+# The length of such instructions cannot be learned by looking at EIP after they've been executed.
+BRANCH_OPCODES = frozenset(
+    [
+        0xEB, 0xE9, 0xEA, 0xE3,  # jmp, jcxz
+        0xE8, 0x9A,  # call
+        0xC3, 0xCB, 0xC2, 0xCA,  # ret
+        0xCC, 0xCD,  # int
+        0xFF,  # call/jmp r/m (along with INC, DEC and PUSH)
+        0xF4,  # hlt
+    ] +
+    list(range(0x70, 0x80)) +  # jcc rel8
+    list(range(0x0F80, 0x0F90))  # jcc rel32
+)
+
+# The opcode of the entries that call a hook (see `VM.hooks`) instead of executing an instruction
+HOOK_OPCODE = -1
+
+# handler: the bound implementation that accepted the instruction
+# opcode: the full opcode the handler expects to find in `cpu.opcode`
+# eip: the value of EIP right before the handler is called
+# prefixes: the prefixes as a bit mask of `fetchLoop.PREFIX_*` flags (0 if there are none)
+# length: the total length of the instruction or `None` for branches
+DecodedInstruction = namedtuple('DecodedInstruction', 'handler opcode eip prefixes length')
+
+
+class DecodeCache:
+    def __init__(self, mem: Memory):
+        self.mem = mem
+        self.entries = {}  # address -> DecodedInstruction
+        self.operands = {}  # address of a ModRM byte -> the result of `misc.decode_ModRM`
+        self.pages = {}  # page number -> set of addresses of the cached instructions that start there
+        self.listeners = []  # objects with `invalidate(address, size)` and `flush()` methods, like `BlockTranslator`
+
+        mem.on_watched_write = self.invalidate
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, address: int):
+        return address in self.entries
+
+    def get(self, address: int):
+        return self.entries.get(address)
+
+    def add(self, address: int, entry: DecodedInstruction) -> None:
+        self.entries[address] = entry
+        self._watch(address, entry.length or MAX_INSTRUCTION_LENGTH)
+
+    def add_operands(self, address: int, operands: tuple) -> None:
+        self.operands[address] = operands
+        self._watch(address, operands[-1])
+
+    def _watch(self, address: int, length: int) -> None:
+        first_page = address >> PAGE_SHIFT
+        self.pages.setdefault(first_page, set()).add(address)
+        self.mem.watch_page(first_page)
+
+        # the instruction may cross a page boundary
+        last_page = (address + length - 1) >> PAGE_SHIFT
+        if last_page != first_page and last_page < len(self.mem.page_state):
+            self.mem.watch_page(last_page)
+
+    def invalidate(self, address: int, size: int) -> None:
+        """
+        Drop all the entries that might overlap the memory range `address`..`address + size`.
+        """
+        start = max(address - MAX_INSTRUCTION_LENGTH + 1, 0)
+        end = address + size
+
+        for listener in self.listeners:
+            listener.invalidate(address, size)
+
+        pages = range(start >> PAGE_SHIFT, ((end - 1) >> PAGE_SHIFT) + 1)
+        if len(pages) > len(self.pages):  # e.g. the whole memory is gone
+            pages = [page for page in self.pages if page in pages]
+
+        for page in pages:
+            addresses = self.pages.get(page)
+            if not addresses:
+                continue
+
+            stale = [addr for addr in addresses if start <= addr < end]
+            for addr in stale:
+                addresses.discard(addr)
+                self.entries.pop(addr, None)
+                self.operands.pop(addr, None)
+
+            if not addresses:
+                del self.pages[page]
+
+    def flush(self) -> None:
+        self.entries.clear()
+        self.operands.clear()
+        self.pages.clear()
+        self.mem.unwatch_all()
+
+        for listener in self.listeners:
+            listener.flush()
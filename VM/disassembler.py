@@ -0,0 +1,337 @@
+"""
+A disassembler for the instructions PyVM implements, used by `tracing.DisassemblyTracer`.
+
+It works on the raw bytes of the instruction, so it doesn't depend on how (or whether) the instruction
+has been decoded by the VM. Opcodes are described in the operand notation of the Intel manual (vol. 2, appendix A):
+
+    E: a register or memory operand (the R/M field of the ModRM byte)
+    G: a register (the REG field of the ModRM byte)
+    M: a memory operand without a size (`lea`)
+    S: a segment register (the REG field of the ModRM byte)
+    Z: a register encoded in the low three bits of the opcode
+    I: an immediate, J: a relative jump target, O: an absolute address, A: a far pointer
+followed by a size: b (byte), w (word), d (dword), v (word or dword, depending on the operand size prefix)
+or z (like v, but immediates are never longer than a dword); `Ibs` is a byte sign-extended to the operand size.
+Anything else, like `AL`, `CL` or `1`, is printed as is. `eAX` is `ax` or `eax`, depending on the operand size.
+"""
+
+from .misc import MODRM_TABLE, SIB_TABLE
+
+__all__ = 'disassemble',
+
+REGISTERS = {
+    1: ('al', 'cl', 'dl', 'bl', 'ah', 'ch', 'dh', 'bh'),
+    2: ('ax', 'cx', 'dx', 'bx', 'sp', 'bp', 'si', 'di'),
+    4: ('eax', 'ecx', 'edx', 'ebx', 'esp', 'ebp', 'esi', 'edi'),
+}
+SEGMENT_REGISTERS = 'es', 'cs', 'ss', 'ds', 'fs', 'gs', '?', '?'
+SIZE_NAMES = {1: 'byte', 2: 'word', 4: 'dword', 6: 'fword', 8: 'qword', 10: 'tword'}
+
+SEGMENT_PREFIXES = {0x26: 'es', 0x2E: 'cs', 0x36: 'ss', 0x3E: 'ds', 0x64: 'fs', 0x65: 'gs'}
+STRING_OPCODES = frozenset([0xA4, 0xA5, 0xA6, 0xA7, 0xAA, 0xAB, 0xAC, 0xAD, 0xAE, 0xAF])
+
+# the suffixes of jcc, setcc and cmovcc in the order of their encodings
+CONDITIONS = 'o', 'no', 'b', 'nb', 'z', 'nz', 'be', 'nbe', 's', 'ns', 'p', 'np', 'l', 'nl', 'le', 'nle'
+
+# opcode -> (mnemonic, operands) or (8 mnemonics indexed by the REG field, operands).
+# A mnemonic like `cbw|cwde` depends on the operand size.
+OPCODES = {
+    0x06: ('push', 'es'), 0x07: ('pop', 'es'), 0x0E: ('push', 'cs'), 0x16: ('push', 'ss'), 0x17: ('pop', 'ss'),
+    0x1E: ('push', 'ds'), 0x1F: ('pop', 'ds'),
+    0x60: ('pushaw|pushad', ''), 0x61: ('popaw|popad', ''), 0x63: ('movsxd', 'Gv,Ed'),
+    0x68: ('push', 'Iz'), 0x69: ('imul', 'Gv,Ev,Iz'), 0x6A: ('push', 'Ibs'), 0x6B: ('imul', 'Gv,Ev,Ibs'),
+    0x80: (('add', 'or', 'adc', 'sbb', 'and', 'sub', 'xor', 'cmp'), 'Eb,Ib'),
+    0x81: (('add', 'or', 'adc', 'sbb', 'and', 'sub', 'xor', 'cmp'), 'Ev,Iz'),
+    0x83: (('add', 'or', 'adc', 'sbb', 'and', 'sub', 'xor', 'cmp'), 'Ev,Ibs'),
+    0x84: ('test', 'Eb,Gb'), 0x85: ('test', 'Ev,Gv'), 0x86: ('xchg', 'Eb,Gb'), 0x87: ('xchg', 'Ev,Gv'),
+    0x88: ('mov', 'Eb,Gb'), 0x89: ('mov', 'Ev,Gv'), 0x8A: ('mov', 'Gb,Eb'), 0x8B: ('mov', 'Gv,Ev'),
+    0x8C: ('mov', 'Ew,Sw'), 0x8D: ('lea', 'Gv,M'), 0x8E: ('mov', 'Sw,Ew'), 0x8F: (('pop',) + ('?',) * 7, 'Ev'),
+    0x90: ('nop', ''), 0x98: ('cbw|cwde', ''), 0x99: ('cwd|cdq', ''), 0x9A: ('call', 'Ap'),
+    0x9C: ('pushfw|pushfd', ''), 0x9D: ('popfw|popfd', ''),
+    0xA0: ('mov', 'AL,Ob'), 0xA1: ('mov', 'eAX,Ov'), 0xA2: ('mov', 'Ob,AL'), 0xA3: ('mov', 'Ov,eAX'),
+    0xA4: ('movsb', ''), 0xA5: ('movsw|movsd', ''), 0xA6: ('cmpsb', ''), 0xA7: ('cmpsw|cmpsd', ''),
+    0xA8: ('test', 'AL,Ib'), 0xA9: ('test', 'eAX,Iz'), 0xAA: ('stosb', ''), 0xAB: ('stosw|stosd', ''),
+    0xAC: ('lodsb', ''), 0xAD: ('lodsw|lodsd', ''), 0xAE: ('scasb', ''), 0xAF: ('scasw|scasd', ''),
+    0xC0: (('rol', 'ror', 'rcl', 'rcr', 'shl', 'shr', 'sal', 'sar'), 'Eb,Ib'),
+    0xC1: (('rol', 'ror', 'rcl', 'rcr', 'shl', 'shr', 'sal', 'sar'), 'Ev,Ib'),
+    0xC2: ('ret', 'Iw'), 0xC3: ('ret', ''), 0xC6: (('mov',) + ('?',) * 7, 'Eb,Ib'), 0xC7: (('mov',) + ('?',) * 7, 'Ev,Iz'),
+    0xC8: ('enter', 'Iw,Ib'), 0xC9: ('leave', ''), 0xCA: ('retf', 'Iw'), 0xCB: ('retf', ''), 0xCC: ('int3', ''),
+    0xCD: ('int', 'Ib'),
+    0xD0: (('rol', 'ror', 'rcl', 'rcr', 'shl', 'shr', 'sal', 'sar'), 'Eb,1'),
+    0xD1: (('rol', 'ror', 'rcl', 'rcr', 'shl', 'shr', 'sal', 'sar'), 'Ev,1'),
+    0xD2: (('rol', 'ror', 'rcl', 'rcr', 'shl', 'shr', 'sal', 'sar'), 'Eb,CL'),
+    0xD3: (('rol', 'ror', 'rcl', 'rcr', 'shl', 'shr', 'sal', 'sar'), 'Ev,CL'),
+    0xE3: ('jecxz', 'Jb'), 0xE8: ('call', 'Jz'), 0xE9: ('jmp', 'Jz'), 0xEA: ('jmp', 'Ap'), 0xEB: ('jmp', 'Jb'),
+    0xF4: ('hlt', ''), 0xF5: ('cmc', ''),
+    0xF6: (('test', 'test', 'not', 'neg', 'mul', 'imul', 'div', 'idiv'), 'Eb'),
+    0xF7: (('test', 'test', 'not', 'neg', 'mul', 'imul', 'div', 'idiv'), 'Ev'),
+    0xF8: ('clc', ''), 0xF9: ('stc', ''), 0xFA: ('cli', ''), 0xFB: ('sti', ''), 0xFC: ('cld', ''), 0xFD: ('std', ''),
+    0xFE: (('inc', 'dec') + ('?',) * 6, 'Eb'),
+    0xFF: (('inc', 'dec', 'call', 'call', 'jmp', 'jmp', 'push', '?'), 'Ev'),
+
+    0x0F1F: ('nop', 'Ev'), 0x0FA0: ('push', 'fs'), 0x0FA1: ('pop', 'fs'), 0x0FA2: ('cpuid', ''),
+    0x0FA3: ('bt', 'Ev,Gv'), 0x0FA4: ('shld', 'Ev,Gv,Ib'), 0x0FA5: ('shld', 'Ev,Gv,CL'),
+    0x0FA8: ('push', 'gs'), 0x0FA9: ('pop', 'gs'), 0x0FAB: ('bts', 'Ev,Gv'),
+    0x0FAC: ('shrd', 'Ev,Gv,Ib'), 0x0FAD: ('shrd', 'Ev,Gv,CL'), 0x0FAF: ('imul', 'Gv,Ev'),
+    0x0FB0: ('cmpxchg', 'Eb,Gb'), 0x0FB1: ('cmpxchg', 'Ev,Gv'), 0x0FB3: ('btr', 'Ev,Gv'),
+    0x0FB6: ('movzx', 'Gv,Eb'), 0x0FB7: ('movzx', 'Gv,Ew'),
+    0x0FBA: (('?', '?', '?', '?', 'bt', 'bts', 'btr', 'btc'), 'Ev,Ib'), 0x0FBB: ('btc', 'Ev,Gv'),
+    0x0FBC: ('bsf', 'Gv,Ev'), 0x0FBD: ('bsr', 'Gv,Ev'), 0x0FBE: ('movsx', 'Gv,Eb'), 0x0FBF: ('movsx', 'Gv,Ew'),
+}
+
+for number, name in enumerate(('add', 'or', 'adc', 'sbb', 'and', 'sub', 'xor', 'cmp')):
+    for low, operands in enumerate(('Eb,Gb', 'Ev,Gv', 'Gb,Eb', 'Gv,Ev', 'AL,Ib', 'eAX,Iz')):
+        OPCODES[number * 8 + low] = name, operands
+
+for number in range(8):
+    OPCODES[0x40 + number] = 'inc', 'Zv'
+    OPCODES[0x48 + number] = 'dec', 'Zv'
+    OPCODES[0x50 + number] = 'push', 'Zv'
+    OPCODES[0x58 + number] = 'pop', 'Zv'
+    OPCODES[0xB0 + number] = 'mov', 'Zb,Ib'
+    OPCODES[0xB8 + number] = 'mov', 'Zv,Iv'
+    OPCODES[0x0FC8 + number] = 'bswap', 'Zd'
+
+    if number:
+        OPCODES[0x90 + number] = 'xchg', 'eAX,Zv'
+
+for number, condition in enumerate(CONDITIONS):
+    OPCODES[0x70 + number] = 'j' + condition, 'Jb'
+    OPCODES[0x0F40 + number] = 'cmov' + condition, 'Gv,Ev'
+    OPCODES[0x0F80 + number] = 'j' + condition, 'Jz'
+    OPCODES[0x0F90 + number] = 'set' + condition, 'Eb'
+
+# the extra operand of `test` in the groups of 0xF6 and 0xF7 and the far pointers of `call m` and `jmp m`
+GROUP_OPERANDS = {
+    (0xF6, 0): 'Eb,Ib', (0xF6, 1): 'Eb,Ib', (0xF7, 0): 'Ev,Iz', (0xF7, 1): 'Ev,Iz', (0xFF, 3): 'Ep', (0xFF, 5): 'Ep'
+}
+
+# x87 instructions with a memory operand: opcode -> 8 (mnemonic, size) indexed by the REG field
+X87_MEMORY = {
+    0xD8: tuple((name, 4) for name in ('fadd', 'fmul', 'fcom', 'fcomp', 'fsub', 'fsubr', 'fdiv', 'fdivr')),
+    0xD9: (('fld', 4), ('?', 0), ('fst', 4), ('fstp', 4), ('fldenv', 0), ('fldcw', 2), ('fnstenv', 0), ('fnstcw', 2)),
+    0xDA: tuple((name, 4) for name in ('fiadd', 'fimul', 'ficom', 'ficomp', 'fisub', 'fisubr', 'fidiv', 'fidivr')),
+    0xDB: (('fild', 4), ('fisttp', 4), ('fist', 4), ('fistp', 4), ('?', 0), ('fld', 10), ('?', 0), ('fstp', 10)),
+    0xDC: tuple((name, 8) for name in ('fadd', 'fmul', 'fcom', 'fcomp', 'fsub', 'fsubr', 'fdiv', 'fdivr')),
+    0xDD: (('fld', 8), ('fisttp', 8), ('fst', 8), ('fstp', 8), ('frstor', 0), ('?', 0), ('fnsave', 0), ('fnstsw', 2)),
+    0xDE: tuple((name, 2) for name in ('fiadd', 'fimul', 'ficom', 'ficomp', 'fisub', 'fisubr', 'fidiv', 'fidivr')),
+    0xDF: (('fild', 2), ('fisttp', 2), ('fist', 2), ('fistp', 2), ('fbld', 10), ('fild', 8), ('fbstp', 10), ('fistp', 8)),
+}
+
+# x87 instructions with register operands: opcode -> 8 (mnemonic, operands) indexed by the REG field.
+# `ST` is st0 and `STi` is the register from the R/M field.
+X87_REGISTERS = {
+    0xD8: tuple((name, 'ST,STi') for name in ('fadd', 'fmul', 'fcom', 'fcomp', 'fsub', 'fsubr', 'fdiv', 'fdivr')),
+    0xD9: (('fld', 'STi'), ('fxch', 'STi')) + (None,) * 6,
+    0xDA: tuple((name, 'ST,STi') for name in ('fcmovb', 'fcmove', 'fcmovbe', 'fcmovu')) + (None,) * 4,
+    0xDB: tuple((name, 'ST,STi') for name in ('fcmovnb', 'fcmovne', 'fcmovnbe', 'fcmovnu')) + (
+        None, ('fucomi', 'ST,STi'), ('fcomi', 'ST,STi'), None
+    ),
+    0xDC: (
+        ('fadd', 'STi,ST'), ('fmul', 'STi,ST'), ('fcom', 'STi'), ('fcomp', 'STi'),
+        ('fsubr', 'STi,ST'), ('fsub', 'STi,ST'), ('fdivr', 'STi,ST'), ('fdiv', 'STi,ST')
+    ),
+    0xDD: (('ffree', 'STi'), None, ('fst', 'STi'), ('fstp', 'STi'), ('fucom', 'STi'), ('fucomp', 'STi'), None, None),
+    0xDE: (
+        ('faddp', 'STi,ST'), ('fmulp', 'STi,ST'), None, None,
+        ('fsubrp', 'STi,ST'), ('fsubp', 'STi,ST'), ('fdivrp', 'STi,ST'), ('fdivp', 'STi,ST')
+    ),
+    0xDF: (None,) * 5 + (('fucomip', 'ST,STi'), ('fcomip', 'ST,STi'), None),
+}
+
+# x87 instructions encoded by the whole ModRM byte: (opcode, ModRM) -> (mnemonic, operands)
+X87_SPECIAL = {
+    (0xD9, 0xD0): ('fnop', ''), (0xD9, 0xE0): ('fchs', ''), (0xD9, 0xE1): ('fabs', ''), (0xD9, 0xE4): ('ftst', ''),
+    (0xD9, 0xE5): ('fxam', ''), (0xD9, 0xE8): ('fld1', ''), (0xD9, 0xEE): ('fldz', ''), (0xD9, 0xFA): ('fsqrt', ''),
+    (0xD9, 0xFC): ('frndint', ''), (0xD9, 0xFE): ('fsin', ''), (0xD9, 0xFF): ('fcos', ''),
+    (0xDA, 0xE9): ('fucompp', ''), (0xDB, 0xE2): ('fnclex', ''), (0xDB, 0xE3): ('fninit', ''),
+    (0xDE, 0xD9): ('fcompp', ''), (0xDF, 0xE0): ('fnstsw', 'ax'),
+}
+
+
+class _Decoder:
+    def __init__(self, code: bytes, address: int):
+        self.code, self.address = code, address
+        self.position = 0
+        self.operand_size = 4
+        self.segment = None
+        self.ModRM = None
+        self.memory = None  # the address part of the memory operand, like `[ebx+0x4]`
+
+    def byte(self) -> int:
+        value = self.code[self.position]
+        self.position += 1
+        return value
+
+    def immediate(self, size: int, signed=False) -> int:
+        data = self.code[self.position:self.position + size]
+        if len(data) < size:
+            raise IndexError('The instruction is incomplete')
+
+        self.position += size
+        return int.from_bytes(data, 'little', signed=signed)
+
+    def read_ModRM(self) -> None:
+        self.ModRM = ModRM = self.byte()
+        form = MODRM_TABLE[ModRM]
+
+        if form.is_register:
+            return
+
+        if form.sib:
+            base, index, scale, disp_size = SIB_TABLE[ModRM >> 6][self.byte()]
+        else:
+            base, index, scale, disp_size = form.base, None, 0, form.disp_size
+
+        disp = self.immediate(disp_size, signed=True)
+
+        parts = []
+        if base is not None:
+            parts.append(REGISTERS[4][base])
+        if index is not None:
+            parts.append(REGISTERS[4][index] + (f'*{1 << scale}' if scale else ''))
+
+        if not parts:
+            address = f'0x{disp & 0xFFFFFFFF:x}'
+        elif disp:
+            address = '+'.join(parts) + ('-' if disp < 0 else '+') + f'0x{abs(disp):x}'
+        else:
+            address = '+'.join(parts)
+
+        self.memory = f'{self.segment}:[{address}]' if self.segment else f'[{address}]'
+
+    def size(self, letter: str) -> int:
+        return {'b': 1, 'w': 2, 'd': 4, 'v': self.operand_size, 'z': self.operand_size, 'p': self.operand_size + 2}[letter]
+
+    def rm(self, size: int) -> str:
+        if self.memory is None:
+            return REGISTERS.get(size, REGISTERS[4])[self.ModRM & 7]
+
+        return f'{SIZE_NAMES[size]} {self.memory}'
+
+    def operand(self, spec: str, opcode: int) -> str:
+        kind, letters = spec[0], spec[1:]
+
+        if spec == 'eAX':
+            return REGISTERS[self.operand_size][0]
+        if spec == 'M':
+            return self.memory or '?'
+        if spec in ('ST', 'STi'):
+            return 'st0' if spec == 'ST' else f'st{self.ModRM & 7}'
+        if spec == 'Ap':
+            offset = self.immediate(self.operand_size)
+            return f'0x{self.immediate(2):x}:0x{offset:x}'
+        if kind not in 'EGSZIJO' or letters not in ('b', 'w', 'd', 'v', 'z', 'p', 'bs'):
+            return spec.lower()
+
+        if kind == 'E':
+            return self.rm(self.size(letters))
+        if kind == 'G':
+            return REGISTERS[self.size(letters)][(self.ModRM >> 3) & 7]
+        if kind == 'S':
+            return SEGMENT_REGISTERS[(self.ModRM >> 3) & 7]
+        if kind == 'Z':
+            return REGISTERS[self.size(letters)][opcode & 7]
+
+        if kind == 'I':
+            if letters == 'bs':
+                mask = (1 << self.operand_size * 8) - 1
+                return f'0x{self.immediate(1, signed=True) & mask:x}'
+
+            return f'0x{self.immediate(min(self.size(letters), 4)):x}'
+
+        if kind == 'J':
+            relative = self.immediate(min(self.size(letters), 4), signed=True)
+            return f'0x{(self.address + self.position + relative) & 0xFFFFFFFF:08x}'
+
+        # O: an absolute address
+        address = f'0x{self.immediate(4):x}'
+        return f'{SIZE_NAMES[self.size(letters)]} {self.segment + ":" if self.segment else ""}[{address}]'
+
+    def x87(self, opcode: int) -> tuple:
+        self.read_ModRM()
+        REG = (self.ModRM >> 3) & 7
+
+        if self.memory is not None:
+            name, size = X87_MEMORY[opcode][REG]
+            return name, (f'{SIZE_NAMES[size]} {self.memory}' if size else self.memory,)
+
+        special = X87_SPECIAL.get((opcode, self.ModRM))
+        if special is None:
+            special = X87_REGISTERS[opcode][REG] or ('?', '')
+
+        name, operands = special
+        return name, tuple(self.operand(spec, opcode) for spec in operands.split(',') if spec)
+
+    def decode(self) -> tuple:
+        prefixes = []
+
+        while True:
+            byte = self.code[self.position]
+
+            if byte == 0x66:
+                self.operand_size = 2
+            elif byte in SEGMENT_PREFIXES:
+                self.segment = SEGMENT_PREFIXES[byte]
+            elif byte in (0xF0, 0xF2, 0xF3, 0x67):
+                prefixes.append(byte)
+            elif byte == 0x9B and self.code[self.position + 1:self.position + 2] in (b'\xd9', b'\xdd', b'\xdf'):
+                prefixes.append(byte)  # `wait` merged with the next instruction, like `fstcw`
+            else:
+                break
+
+            self.position += 1
+
+        opcode = self.byte()
+        if opcode == 0x0F:
+            opcode = 0x0F00 | self.byte()
+
+        if 0xD8 <= opcode <= 0xDF:
+            name, operands = self.x87(opcode)
+
+            if 0x9B in prefixes and name.startswith('fn'):
+                name = 'f' + name[2:]
+        else:
+            try:
+                name, specs = OPCODES[opcode]
+            except KeyError:
+                return self.position, f'(unknown opcode 0x{opcode:02x})'
+
+            if any(spec[0] in 'EGSM' for spec in specs.split(',') if spec) or isinstance(name, tuple):
+                self.read_ModRM()
+
+            if isinstance(name, tuple):
+                REG = (self.ModRM >> 3) & 7
+                specs = GROUP_OPERANDS.get((opcode, REG), specs)
+                name = name[REG]
+
+            if '|' in name:
+                name = name.split('|')[self.operand_size == 4]
+
+            operands = tuple(self.operand(spec, opcode) for spec in specs.split(',') if spec)
+
+            if opcode in STRING_OPCODES:
+                if 0xF3 in prefixes:
+                    name = ('repe ' if opcode in (0xA6, 0xA7, 0xAE, 0xAF) else 'rep ') + name
+                elif 0xF2 in prefixes:
+                    name = 'repne ' + name
+
+        if 0xF0 in prefixes:
+            name = 'lock ' + name
+
+        return self.position, f'{name} {", ".join(operands)}' if operands else name
+
+
+def disassemble(code: bytes, address: int) -> tuple:
+    """
+    Disassemble the instruction at the start of `code`, whose first byte is at `address` (used for jump targets).
+
+    :return: (length, text), like (5, 'mov eax, 0x1'); the text of opcodes the disassembler doesn't know
+    or of truncated instructions says so
+    """
+    decoder = _Decoder(code, address)
+
+    try:
+        return decoder.decode()
+    except IndexError:
+        return max(decoder.position, 1), '(truncated)'
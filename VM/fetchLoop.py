@@ -1,57 +1,188 @@
 import enum
+import os
 
-from .ELF import ELF32, enums
-from .util import SegmentRegs, MissingOpcodeError
+from .ELF import ELF32, build_image
+from .util import SegmentRegs, MissingOpcodeError, DispatchTable, DispatchGroup
 from .CPU import CPU32
+from .decodeCache import DecodedInstruction, BRANCH_OPCODES, HOOK_OPCODE
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# opcode prefixes
+PREFIX_SEGMENTS = {
+    0x2E: SegmentRegs.CS,
+    0x36: SegmentRegs.SS,
+    0x3E: SegmentRegs.DS,
+    0x26: SegmentRegs.ES,
+    0x64: SegmentRegs.FS,
+    0x65: SegmentRegs.GS
+}
+PREFIX_SIZE_OVERRIDE = {0x66, 0x67}
+PREFIX_LOCK = {0xf0}
+PREFIX_REP = {0xf3}
+
+# The prefixes of an instruction are stored as a bit mask of `PREFIX_*` flags.
+# The number of the segment register for `PREFIX_SEGMENT` is stored in the bits starting at `SEGMENT_SHIFT`.
+PREFIX_OPERAND_SIZE = 1 << 0
+PREFIX_ADDRESS_SIZE = 1 << 1
+PREFIX_SEGMENT      = 1 << 2
+PREFIX_LOCK_FLAG    = 1 << 3
+PREFIX_REP_FLAG     = 1 << 4
+PREFIX_SIZE = PREFIX_OPERAND_SIZE | PREFIX_ADDRESS_SIZE
+
+SEGMENT_SHIFT = 8
+SEGMENT_MASK = 0b111 << SEGMENT_SHIFT
+
+
+def _classify_prefix(byte: int) -> int:
+    if byte == 0x66:
+        return PREFIX_OPERAND_SIZE
+    if byte == 0x67:
+        return PREFIX_ADDRESS_SIZE
+    if byte in PREFIX_SEGMENTS:
+        return PREFIX_SEGMENT | (PREFIX_SEGMENTS[byte] << SEGMENT_SHIFT)
+    if byte in PREFIX_LOCK:
+        return PREFIX_LOCK_FLAG
+    if byte in PREFIX_REP:
+        return PREFIX_REP_FLAG
+
+    return 0
+
+
+# PREFIX_TABLE[byte] is the prefix state `byte` contributes or 0 if it's not a prefix
+PREFIX_TABLE = tuple(_classify_prefix(byte) for byte in range(256))
+
+
 class FetchLoopMixin:
-    _attrs_ = 'eip', 'mem', 'reg.ebx', 'fmt', 'instr', 'sizes', 'default_mode'
+    _attrs_ = 'eip', 'mem', 'reg.ebx', 'fmt', 'dispatch', 'sizes', 'default_mode', 'decode_cache'
 
-    def execute_opcode(self: CPU32) -> None:
+    def execute_opcode(self: CPU32) -> tuple:
+        """
+        Execute the instruction whose opcode has already been read into `self.opcode`.
+        :return: the implementation that executed the instruction, the full opcode and the value of EIP
+            the implementation was called with
+        """
+        start = self.eip
         self.eip += 1
 
-        off = 1
-        if self.opcode == 0x0F:
-            op = self.mem.get_eip(self.eip, 1)
+        impl = self.dispatch[self.opcode]
+
+        while isinstance(impl, DispatchTable):  # escape byte: read one more byte
+            op = self.mem.get_eip8(self.eip)
             self.eip += 1
 
             self.opcode = (self.opcode << 8) | op
-            off += 1
+            impl = impl[op]
 
-        if __debug__:
-            logger.debug(self.fmt, self.eip - off, self.opcode)
+        if isinstance(impl, DispatchGroup):
+            ModRM = self.mem.get_eip8(self.eip)
 
-        try:
-            impls = self.instr[self.opcode]
-        except KeyError:
-            ...  # could not find opcode
-        else:
-            for impl in impls:
-                if impl():
-                    return  # opcode executed
-            # could not find suitable implementation
+            if impl.by_modrm[ModRM] is not None:
+                impl = impl.by_modrm[ModRM]
 
-        # read one more byte
-        op = self.mem.get_eip(self.eip, 1)
-        self.eip += 1
+                self.eip += 1
+                self.opcode = (self.opcode << 8) | ModRM
+            else:
+                impl = impl.by_reg[(ModRM & 0b00111000) >> 3]
 
-        self.opcode = (self.opcode << 8) | op
+        if impl is None:
+            raise MissingOpcodeError(f'Opcode {self.opcode:x} is not recognized yet (at 0x{start:08x})')
 
-        try:
-            impls = self.instr[self.opcode]
-        except KeyError:
-            raise MissingOpcodeError(f'Opcode {self.opcode:x} is not recognized yet (at 0x{self.eip - off - 1:08x})')
+        opcode, eip = self.opcode, self.eip
+        if not impl():
+            raise NotImplementedError(f'No suitable implementation found for opcode {opcode:x} (@0x{start:02x})')
+
+        return impl, opcode, eip
+
+    def apply_prefixes(self: CPU32, prefixes: int) -> None:
+        """
+        Apply the overrides encoded in `prefixes` (see `PREFIX_TABLE`).
+        """
+        if prefixes & PREFIX_SIZE:
+            self.current_mode = not self.current_mode
+
+            if prefixes & PREFIX_OPERAND_SIZE:
+                if __debug__:
+                    logger.debug(
+                        'Operand size override: %d -> %d',
+                        self.operand_size, self.sizes[self.current_mode]
+                    )
+                self.operand_size = self.sizes[self.current_mode]
+
+            if prefixes & PREFIX_ADDRESS_SIZE:
+                if __debug__:
+                    logger.debug(
+                        'Address size override: %d -> %d',
+                        self.address_size, self.sizes[self.current_mode]
+                    )
+                self.address_size = self.sizes[self.current_mode]
+
+        if prefixes & PREFIX_SEGMENT:
+            self.mem.segment_override = prefixes >> SEGMENT_SHIFT
+
+            if __debug__:
+                logger.debug('Segment override: %s', self.mem.segment_override)
+
+        if __debug__ and prefixes & PREFIX_LOCK_FLAG:
+            logger.debug('LOCK prefix')  # do nothing; all operations are atomic anyway. Right?
+        # the REP prefix is handled by the decoder: it's executed as an instruction
+
+    def undo_prefixes(self: CPU32, prefixes: int) -> None:
+        if prefixes & PREFIX_SIZE:
+            self.current_mode = self.default_mode
+
+            if prefixes & PREFIX_OPERAND_SIZE:
+                self.operand_size = self.sizes[self.current_mode]
+            if prefixes & PREFIX_ADDRESS_SIZE:
+                self.address_size = self.sizes[self.current_mode]
+
+        if prefixes & PREFIX_SEGMENT:
+            self.mem.segment_override = SegmentRegs.DS
+
+    def decode_and_execute(self: CPU32) -> None:
+        """
+        The slow path of the fetch loop: decode the instruction at EIP, execute it
+        and store the decoded instruction in the decode cache.
+        """
+        start = self.eip
+
+        hook = self.hooks.get(start)
+        if hook is not None:
+            self.opcode = HOOK_OPCODE
+            hook()
+            self.decode_cache.add(start, DecodedInstruction(hook, HOOK_OPCODE, start, 0, None))
+            return
+
+        self.opcode = self.mem.get_eip8(self.eip)
+        prefixes = PREFIX_TABLE[self.opcode]
+
+        if not prefixes:
+            impl, opcode, eip = self.execute_opcode()
         else:
-            for impl in impls:
-                if impl():
-                    return  # opcode executed
-            # could not find suitable implementation
+            prefix = prefixes
+            while prefix:
+                if prefix & PREFIX_SEGMENT:  # the last segment override wins
+                    prefixes = (prefixes & ~SEGMENT_MASK) | prefix
+
+                prefixes |= prefix
+                self.eip += 1
+                self.opcode = self.mem.get_eip8(self.eip)
+                prefix = PREFIX_TABLE[self.opcode]
+
+            self.apply_prefixes(prefixes)
+
+            if prefixes & PREFIX_REP_FLAG:
+                self.opcode = 0xf3
+                self.eip -= 1  # repeat the previous opcode
 
-        raise NotImplementedError(f'No suitable implementation found for opcode {self.opcode:x} (@0x{self.eip - off - 1:02x})')
+            impl, opcode, eip = self.execute_opcode()
+
+            self.undo_prefixes(prefixes)
+
+        length = None if opcode in BRANCH_OPCODES else self.eip - start
+        self.decode_cache.add(start, DecodedInstruction(impl, opcode, eip, prefixes, length))
 
     def run(self: CPU32) -> int:
         """
@@ -61,82 +192,72 @@ class FetchLoopMixin:
         :return: None
         """
 
-        # opcode perfixes
-        pref_segments = {
-            0x2E: SegmentRegs.CS,
-            0x36: SegmentRegs.SS,
-            0x3E: SegmentRegs.DS,
-            0x26: SegmentRegs.ES,
-            0x64: SegmentRegs.FS,
-            0x65: SegmentRegs.GS
-        }
-        pref_op_size_override = {0x66, 0x67}
-        pref_lock = {0xf0}
-        rep = {0xf3}
-
-        prefixes = set(pref_segments) | pref_op_size_override | pref_lock | rep
+        try:
+            if self.profiler is not None:
+                return self.profiler.run()
+
+            tracing = self.tracing
+
+            while True:
+                tracing.switch = False
+
+                if tracing.instruction:
+                    tracing.run()
+                else:
+                    self.fetch_loop()
+
+                if not tracing.switch:  # instruction hooks were (un)registered while running, see `Tracing.update`
+                    return self.reg.eax
+        finally:
+            self.kernel.output.flush()  # even if the program has crashed
+
+    def fetch_loop(self: CPU32) -> None:
+        """
+        Execute instructions until the VM stops, using compiled blocks where possible.
+        """
+        entries = self.decode_cache.entries
+
+        # Compiled blocks bypass the per-instruction logging, so don't use them while debugging
+        if __debug__ and logger.isEnabledFor(logging.DEBUG):
+            blocks, translate = {}, False
+        else:
+            blocks, translate = self.translator.blocks, True
+        hit = self.translator.hit
+
         self.running = True
+        leader = True  # whether EIP may point to the start of a basic block
+        retired = 0
 
-        while self.running and self.eip + 1 < self.mem.size:
-            overrides = []
-            self.opcode = self.mem.get(self.eip, 1)
+        try:
+            while self.running and self.eip + 1 < self.mem.size:
+                if leader:
+                    block = blocks.get(self.eip)
+                    if block is not None:
+                        retired += block()
+                        continue
+
+                    if translate:
+                        hit(self.eip)
+
+                try:
+                    impl, self.opcode, self.eip, overrides, length = entries[self.eip]
+                except KeyError:
+                    self.decode_and_execute()
+                    retired += 1
+                    leader = True
+                    continue
 
-            while self.opcode in prefixes:
-                overrides.append(self.opcode)
-                self.eip += 1
-                self.opcode = self.mem.get(self.eip, 1)
-
-            # apply overrides
-            size_override_active = False
-            for ov in overrides:
-                if ov == 0x66:
-                    if not size_override_active:
-                        self.current_mode = not self.current_mode
-                        size_override_active = True
-                    old_operand_size = self.operand_size
-                    self.operand_size = self.sizes[self.current_mode]
-                    logger.debug(
-                        'Operand size override: %d -> %d',
-                        old_operand_size, self.operand_size
-                    )
-                elif ov == 0x67:
-                    if not size_override_active:
-                        self.current_mode = not self.current_mode
-                        size_override_active = True
-                    old_address_size = self.address_size
-                    self.address_size = self.sizes[self.current_mode]
-                    logger.debug(
-                        'Address size override: %d -> %d',
-                        old_address_size, self.address_size
-                    )
-                elif ov in pref_segments:
-                    is_special = ov >> 6
-                    if is_special:
-                        sreg_number = 4 + (ov & 1)  # FS or GS
-                    else:
-                        sreg_number = (ov >> 3) & 0b11
-                    self.mem.segment_override = sreg_number
-                    logger.debug('Segment override: %s', self.mem.segment_override)
-                elif ov == 0xf0:  # LOCK prefix
-                    logger.debug('LOCK prefix')  # do nothing; all operations are atomic anyway. Right?
-                elif ov == 0xf3:  # REP prefix
-                    self.opcode = ov
-                    self.eip -= 1  # repeat the previous opcode
-
-            self.execute_opcode()
-
-            # undo all overrides
-            for ov in overrides:
-                if ov == 0x66:
-                    self.current_mode = self.default_mode
-                    self.operand_size = self.sizes[self.current_mode]
-                elif ov == 0x67:
-                    self.current_mode = self.default_mode
-                    self.address_size = self.sizes[self.current_mode]
-                elif ov in pref_segments:
-                    self.mem.segment_override = SegmentRegs.DS
-
-        return self.reg.eax
+                if overrides:
+                    self.apply_prefixes(overrides)
+                    impl()
+                    self.undo_prefixes(overrides)
+                else:
+                    impl()
+
+                retired += 1
+                leader = length is None
+        finally:
+            self.instructions_retired += retired
 
 
 class ExecutionStrategy(enum.Enum):
@@ -171,9 +292,8 @@ class ExecuteFlat(ExecutionMixin):
 
     def execute(self: CPU32, fname: str, offset=0):
         with open(fname, 'rb') as f:
-            data = f.read()
-            l = len(data)
-            self.mem.set_bytes(offset, l, data)
+            l = os.fstat(f.fileno()).st_size
+            self.mem.map_file(offset, l, f, 0)
 
         self.eip = offset
         self.code_segment_end = self.eip + l - 1
@@ -183,36 +303,32 @@ class ExecuteFlat(ExecutionMixin):
     
 
 class ExecuteELF(ExecutionMixin):
-    _attrs_ = 'eip', 'mem', 'reg', 'code_segment_end'
+    _attrs_ = 'eip', 'mem', 'reg', 'code_segment_end', 'libc_hooks', 'elf_cache'
     _funcs_ = 'run', 'stack_init', 'stack_push'
 
     def execute(self: CPU32, fname: str, args=()):
-        with ELF32(fname) as elf:
-            if elf.hdr.e_type != enums.e_type.ET_EXEC:
-                raise ValueError(f'ELF file {elf.fname!r} is not executable (type: {elf.hdr.e_type})')
-
-            max_memsz = max(
-                phdr.p_vaddr + phdr.p_memsz
-                for phdr in elf.phdrs
-                if phdr.p_type == enums.p_type.PT_LOAD
-            )
-
-            if self.mem.size < max_memsz * 2:
-                self.mem.size = max_memsz * 2
-                self.stack_init()
-
-            for phdr in elf.phdrs:
-                if phdr.p_type not in (enums.p_type.PT_LOAD, enums.p_type.PT_GNU_EH_FRAME):
-                    continue
+        if self.elf_cache is not None:
+            image = self.elf_cache.get(fname)
+        else:
+            with ELF32(fname) as elf:
+                image = build_image(elf)
+
+        max_memsz = image.end
+
+        if self.mem.size < max_memsz * 2:
+            self.mem.size = max_memsz * 2
+            self.stack_init()
 
-                logger.info(f'LOAD {phdr.p_memsz:10,d} bytes at address 0x{phdr.p_vaddr:09_x}')
-                elf.file.seek(phdr.p_offset)
+        with open(image.source, 'rb') as f:
+            for segment in image.segments:
+                logger.info(f'LOAD {segment.memsz:10,d} bytes at address 0x{segment.address:09_x}')
+                self.mem.map_file(segment.address, segment.filesz, f, segment.offset)
+                self.mem.memset(segment.address + segment.filesz, 0, segment.memsz - segment.filesz)  # BSS
 
-                data = elf.file.read(phdr.p_filesz)
-                self.mem.set_bytes(phdr.p_vaddr, len(data), data)
-                self.mem.set_bytes(phdr.p_vaddr + phdr.p_filesz, phdr.p_memsz - phdr.p_filesz, bytearray(phdr.p_memsz - phdr.p_filesz))
+        if self.libc_hooks is not None:
+            self.libc_hooks.install(image.functions)
 
-        self.eip = elf.hdr.e_entry
+        self.eip = image.entry
         self.code_segment_end = self.eip + max_memsz - 1
         self.mem.program_break = self.code_segment_end
 
@@ -0,0 +1,138 @@
+"""
+Native implementations of hot libc functions.
+
+Statically linked programs spend a lot of time in functions like `memcpy` and `strlen`,
+which the VM would otherwise interpret one instruction at a time. When a VM is created with `libc_hooks=True`,
+`LibcHooks.install` looks these functions up in the symbol table of the ELF file being executed
+and registers their entry points in `VM.hooks`. When the fetch loop decodes an instruction at such an address,
+it executes the hook instead: the hook reads the arguments from the stack (cdecl), does the whole job
+on the guest memory at once, stores the result in EAX and returns to the caller, like `ret` would.
+
+Stripped executables have no symbol table, so nothing is hooked.
+"""
+
+if __debug__:
+    import logging
+    logger = logging.getLogger(__name__)
+
+__all__ = 'LibcHooks',
+
+
+class LibcHooks:
+    FUNCTIONS = 'memcpy', 'memmove', 'memset', 'memcmp', 'strlen', 'strcmp', 'strchr'
+
+    def __init__(self, vm):
+        self.vm = vm
+        self.installed = {}  # address -> name
+
+    def install(self, functions: dict) -> None:
+        """
+        Hook the functions from `FUNCTIONS` found in `functions`.
+        :param functions: {name: address}, see `ELF32.functions`
+        """
+        self.uninstall()
+
+        for name in self.FUNCTIONS:
+            address = functions.get(name)
+            if not address:
+                continue
+
+            if __debug__:
+                logger.debug('Hooking %s at 0x%08x', name, address)
+
+            self.vm.hooks[address] = getattr(self, name)
+            self.vm.decode_cache.invalidate(address, 1)
+            self.installed[address] = name
+
+    def uninstall(self) -> None:
+        for address in self.installed:
+            self.vm.hooks.pop(address, None)
+            self.vm.decode_cache.invalidate(address, 1)
+
+        self.installed.clear()
+
+    def args(self, count: int) -> list:
+        esp = self.vm.reg.esp
+
+        # [esp] is the return address
+        return [self.vm.mem.get32(esp + 4 * i) for i in range(1, count + 1)]
+
+    def ret(self, value: int) -> True:
+        vm = self.vm
+
+        vm.reg.eax = value & 0xFFFFFFFF
+        vm.eip = vm.stack_pop(4)
+
+        return True
+
+    def strlen_raw(self, address: int) -> int:
+        mem = self.vm.mem
+        end = mem.find(address, 0, mem.size - address)
+
+        if end < 0:
+            raise MemoryError(f'Unterminated string at 0x{address:08x}')
+
+        return end - address
+
+    def memcpy(self) -> True:
+        dst, src, size = self.args(3)
+        self.vm.mem.memmove(dst, src, size)
+
+        return self.ret(dst)
+
+    memmove = memcpy
+
+    def memset(self) -> True:
+        dst, value, size = self.args(3)
+        self.vm.mem.memset(dst, value & 0xFF, size)
+
+        return self.ret(dst)
+
+    def memcmp(self) -> True:
+        a, b, size = self.args(3)
+        mem = self.vm.mem
+
+        mem.asan_raw(a, size)
+        mem.asan_raw(b, size)
+        return self.ret(compare(mem.kernel_read_string(a, size), mem.kernel_read_string(b, size)))
+
+    def strlen(self) -> True:
+        address, = self.args(1)
+
+        return self.ret(self.strlen_raw(address))
+
+    def strcmp(self) -> True:
+        a, b = self.args(2)
+        mem = self.vm.mem
+
+        # include the terminating zeros
+        return self.ret(compare(
+            mem.kernel_read_string(a, self.strlen_raw(a) + 1),
+            mem.kernel_read_string(b, self.strlen_raw(b) + 1)
+        ))
+
+    def strchr(self) -> True:
+        address, char = self.args(2)
+        char &= 0xFF
+
+        length = self.strlen_raw(address)
+        if char == 0:
+            return self.ret(address + length)
+
+        index = self.vm.mem.kernel_read_string(address, length).find(char)
+
+        return self.ret(0 if index < 0 else address + index)
+
+
+def compare(a: bytes, b: bytes) -> int:
+    """
+    :return: the difference between the first pair of bytes that differ (like musl's `memcmp`) or 0
+    """
+    if a == b:
+        return 0
+
+    for x, y in zip(a, b):
+        if x != y:
+            return x - y
+
+    return 0
@@ -1,14 +1,10 @@
-from ..util import Instruction, is_signed_out_of_range
+from ..util import Instruction
+from ..Registers import FLAGS_SUB, FLAGS_LOGIC
 from ..misc import parity, Shift, MSB, LSB
 
 from functools import partialmethod as P
 import operator
 
-if __debug__:
-    from ..debug import debug_operand, debug_register_operand
-    import logging
-    logger = logging.getLogger(__name__)
-
 MAXVALS = [None, (1 << 8) - 1, (1 << 16) - 1, None, (1 << 32) - 1]  # MAXVALS[n] is the maximum value of an unsigned n-bit number
 SIGNS   = [None, 1 << 8 - 1, 1 << 16 - 1, None, 1 << 32 - 1]  # SIGNS[n] is the maximum absolute value of a signed n-bit number
 
@@ -22,7 +18,7 @@ class BITWISE(Instruction):
     Flags:
         OF, CF cleared
         SF, ZF, PF set according to the result
-        AF undefined
+        AF undefined (cleared)
 
     Operation: c <- a [op] b
 
@@ -95,38 +91,16 @@ class BITWISE(Instruction):
 
         a = vm.reg.get(0, sz)
 
-        vm.reg.eflags.OF = vm.reg.eflags.CF = 0
-
-        c = operation(a, b)
-
-        vm.reg.eflags.SF = (c >> (sz * 8 - 1)) & 1
-
-        c &= MAXVALS[sz]
-
-        vm.reg.eflags.ZF = c == 0
+        c = operation(a, b) & MAXVALS[sz]
 
-        vm.reg.eflags.PF = parity(c & 0xFF)
+        vm.reg.lazy_flags = FLAGS_LOGIC, a, b, c, sz
 
         if not test:
-            if __debug__:
-                name = operation.__name__
             vm.reg.set(0, sz, c)
-        else:
-            if __debug__:
-                name = 'test'
-
-        if __debug__:
-            logger.debug('%s %s=%d, imm%d=%d', name, debug_register_operand(0, sz), a, sz * 8, b)
 
         return True
 
-    def rm_imm(vm, _8bit, _8bit_imm, operation, test: bool, REG: int) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def rm_imm(vm, _8bit, _8bit_imm, operation, test: bool, REG: int) -> True:
         sz = 1 if _8bit else vm.operand_size
         imm_sz = 1 if _8bit_imm else vm.operand_size
 
@@ -136,28 +110,13 @@ class BITWISE(Instruction):
         b = vm.mem.get(vm.eip, imm_sz, True)
         vm.eip += imm_sz
 
-        vm.reg.eflags.OF = vm.reg.eflags.CF = 0
-
         a = type.get(loc, sz)
-        c = operation(a, b)
-
-        vm.reg.eflags.SF = (c >> (sz * 8 - 1)) & 1
+        c = operation(a, b) & MAXVALS[sz]
 
-        c &= MAXVALS[sz]
-
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
+        vm.reg.lazy_flags = FLAGS_LOGIC, a, b, c, sz
 
         if not test:
-            if __debug__:
-                name = operation.__name__
             type.set(loc, sz, c)
-        else:
-            if __debug__:
-                name = 'test'
-
-        if __debug__:
-            logger.debug('%s %s=%d, imm%d=%d', name, debug_operand(RM, sz), a, sz * 8, b)
 
         return True
 
@@ -166,35 +125,15 @@ class BITWISE(Instruction):
         RM, R = vm.process_ModRM()
         type, loc = RM
 
-        vm.reg.eflags.OF = vm.reg.eflags.CF = 0
-
         a = type.get(loc, sz)
         b = vm.reg.get(R[1], sz)
 
-        c = operation(a, b)
-
-        vm.reg.eflags.SF = (c >> (sz * 8 - 1)) & 1
-
-        c &= MAXVALS[sz]
+        c = operation(a, b) & MAXVALS[sz]
 
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c & 0xFF)
+        vm.reg.lazy_flags = FLAGS_LOGIC, a, b, c, sz
 
         if not test:
-            if __debug__:
-                name = operation.__name__
             type.set(loc, sz, c)
-        else:
-            if __debug__:
-                name = 'test'
-
-        if __debug__:
-            logger.debug(
-                '%s %s=%d, %s=%d',
-                name,
-                debug_operand(RM, sz), a,
-                debug_operand(R, sz), b
-            )
 
         return True
 
@@ -203,35 +142,15 @@ class BITWISE(Instruction):
         RM, R = vm.process_ModRM()
         type, loc = RM
 
-        vm.reg.eflags.OF = vm.reg.eflags.CF = 0
-
         a = (type).get(loc, sz)
         b = vm.reg.get(R[1], sz)
 
-        c = operation(a, b)
-
-        vm.reg.eflags.SF = (c >> (sz * 8 - 1)) & 1
-
-        c &= MAXVALS[sz]
+        c = operation(a, b) & MAXVALS[sz]
 
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c & 0xFF)
+        vm.reg.lazy_flags = FLAGS_LOGIC, a, b, c, sz
 
         if not test:
-            if __debug__:
-                name = operation.__name__
             vm.reg.set(R[1], sz, c)
-        else:
-            if __debug__:
-                name = 'test'
-
-        if __debug__:
-            logger.debug(
-                '%s %s=%d, %s=%d',
-                name,
-                debug_operand(R, sz), a,
-                debug_operand(RM, sz), b
-            )
 
         return True
 
@@ -272,13 +191,7 @@ class NEGNOT(Instruction):
     def operation_neg(a, off):
         return NEGNOT.operation_not(a, off) + 1
 
-    def rm(vm, _8bit, REG: int) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def rm(vm, _8bit, REG: int) -> True:
         operation = {2: NEGNOT.operation_not, 3: NEGNOT.operation_neg}[REG]
 
         sz = 1 if _8bit else vm.operand_size
@@ -290,27 +203,11 @@ class NEGNOT(Instruction):
         b = operation(a, sz)
 
         if operation == NEGNOT.operation_neg:
-            sign_b = (b >> (sz * 8 - 1)) & 1
-            vm.reg.eflags.CF = a != 0
-            vm.reg.eflags.SF = sign_b
-            vm.reg.eflags.ZF = b == 0
-            vm.reg.eflags.PF = parity(b)
-            vm.reg.eflags.OF = is_signed_out_of_range(b, sz)
-            # TODO: deal with AF
-            # vm.reg.efags.AF = ??
+            vm.reg.lazy_flags = FLAGS_SUB, 0, a, b, sz  # 0 - a
 
         b &= MAXVALS[sz]
         (type).set(loc, sz, b)
 
-        if __debug__:
-            dbg = debug_operand(RM, sz)
-            logger.debug(
-                '%s %s=%d (%s := %d)',
-                operation.__name__,
-                dbg, a,
-                dbg, b
-            )
-
         return True
 
 
@@ -322,63 +219,50 @@ class SHIFT(Instruction):
         self.opcodes = {
             # SHL, SHR, SAR
             0xD0: [
-                P(self.shift, operation=Shift.SHL, cnt=Shift.C_ONE, _8bit=True),
-                P(self.shift, operation=Shift.SHR, cnt=Shift.C_ONE, _8bit=True),
-                P(self.shift, operation=Shift.SAR, cnt=Shift.C_ONE, _8bit=True),
+                P(self.shift, operation=Shift.SHL, cnt=Shift.C_ONE, _8bit=True, REG=4),
+                P(self.shift, operation=Shift.SHR, cnt=Shift.C_ONE, _8bit=True, REG=5),
+                P(self.shift, operation=Shift.SAR, cnt=Shift.C_ONE, _8bit=True, REG=7),
                 ],
             0xD2: [
-                P(self.shift, operation=Shift.SHL, cnt=Shift.C_CL, _8bit=True),
-                P(self.shift, operation=Shift.SHR, cnt=Shift.C_CL, _8bit=True),
-                P(self.shift, operation=Shift.SAR, cnt=Shift.C_CL, _8bit=True),
+                P(self.shift, operation=Shift.SHL, cnt=Shift.C_CL, _8bit=True, REG=4),
+                P(self.shift, operation=Shift.SHR, cnt=Shift.C_CL, _8bit=True, REG=5),
+                P(self.shift, operation=Shift.SAR, cnt=Shift.C_CL, _8bit=True, REG=7),
                 ],
             0xC0: [
-                P(self.shift, operation=Shift.SHL, cnt=Shift.C_imm8, _8bit=True),
-                P(self.shift, operation=Shift.SHR, cnt=Shift.C_imm8, _8bit=True),
-                P(self.shift, operation=Shift.SAR, cnt=Shift.C_imm8, _8bit=True),
+                P(self.shift, operation=Shift.SHL, cnt=Shift.C_imm8, _8bit=True, REG=4),
+                P(self.shift, operation=Shift.SHR, cnt=Shift.C_imm8, _8bit=True, REG=5),
+                P(self.shift, operation=Shift.SAR, cnt=Shift.C_imm8, _8bit=True, REG=7),
                 ],
 
             0xD1: [
-                P(self.shift, operation=Shift.SHL, cnt=Shift.C_ONE, _8bit=False),
-                P(self.shift, operation=Shift.SHR, cnt=Shift.C_ONE, _8bit=False),
-                P(self.shift, operation=Shift.SAR, cnt=Shift.C_ONE, _8bit=False),
+                P(self.shift, operation=Shift.SHL, cnt=Shift.C_ONE, _8bit=False, REG=4),
+                P(self.shift, operation=Shift.SHR, cnt=Shift.C_ONE, _8bit=False, REG=5),
+                P(self.shift, operation=Shift.SAR, cnt=Shift.C_ONE, _8bit=False, REG=7),
                 ],
             0xD3: [
-                P(self.shift, operation=Shift.SHL, cnt=Shift.C_CL, _8bit=False),
-                P(self.shift, operation=Shift.SAR, cnt=Shift.C_CL, _8bit=False),
-                P(self.shift, operation=Shift.SHR, cnt=Shift.C_CL, _8bit=False),
+                P(self.shift, operation=Shift.SHL, cnt=Shift.C_CL, _8bit=False, REG=4),
+                P(self.shift, operation=Shift.SAR, cnt=Shift.C_CL, _8bit=False, REG=7),
+                P(self.shift, operation=Shift.SHR, cnt=Shift.C_CL, _8bit=False, REG=5),
                 ],
             0xC1: [
-                P(self.shift, operation=Shift.SHL, cnt=Shift.C_imm8, _8bit=False),
-                P(self.shift, operation=Shift.SHR, cnt=Shift.C_imm8, _8bit=False),
-                P(self.shift, operation=Shift.SAR, cnt=Shift.C_imm8, _8bit=False)
+                P(self.shift, operation=Shift.SHL, cnt=Shift.C_imm8, _8bit=False, REG=4),
+                P(self.shift, operation=Shift.SHR, cnt=Shift.C_imm8, _8bit=False, REG=5),
+                P(self.shift, operation=Shift.SAR, cnt=Shift.C_imm8, _8bit=False, REG=7)
                 ]
             }
 
-    def shift(vm, operation, cnt, _8bit) -> True:
+    def shift(vm, operation, cnt, _8bit, REG: int) -> True:
         sz = 1 if _8bit else vm.operand_size
-        old_eip = vm.eip
 
         sz = vm.operand_size  # WTF?!
         RM, R = vm.process_ModRM()
 
-        if (operation == Shift.SHL) and (R[1] != 4):
-            vm.eip = old_eip
-            return False
-        elif (operation == Shift.SHR) and (R[1] != 5):
-            vm.eip = old_eip
-            return False
-        elif (operation == Shift.SAR) and (R[1] != 7):
-            vm.eip = old_eip
-            return False
-
-        _cnt = cnt
-
         if cnt == Shift.C_ONE:
             cnt = 1
         elif cnt == Shift.C_CL:
             cnt = vm.reg.get(1, 1)
         elif cnt == Shift.C_imm8:
-            cnt = vm.mem.get(vm.eip, 1)
+            cnt = vm.mem.get8(vm.eip)
             vm.eip += 1
         else:
             raise RuntimeError('Invalid count')
@@ -425,19 +309,6 @@ class SHIFT(Instruction):
 
         (type).set(loc, sz, dst)
 
-        if __debug__:
-            name = operation.name.lower()
-            op = {Shift.C_ONE: '', Shift.C_CL: 'cl', Shift.C_imm8: 'imm8'}[_cnt]
-
-            dbg = debug_operand(RM, sz)
-            logger.debug(
-                '%s %s=%s, %s=%s (%s := %d)',
-                name,
-                dbg,
-                tmp_dst, op, cnt,
-                dbg, dst
-            )
-
         return True
 
 
@@ -463,10 +334,8 @@ class SHIFTD(Instruction):
         dst = (type).get(loc, sz)
         src = vm.reg.get(R[1], sz)
 
-        dst_init = dst
-
         if cnt == Shift.C_imm8:
-            cnt = vm.mem.get(vm.eip, 1)
+            cnt = vm.mem.get8(vm.eip)
             vm.eip += 1
         else:
             cnt = vm.reg.get(1, 1)
@@ -505,17 +374,6 @@ class SHIFTD(Instruction):
 
         (type).set(loc, sz, dst)
 
-        if __debug__:
-            dbg = debug_operand(RM, sz)
-            logger.debug(
-                'sh%sd %s=0x%x, %s=0x%x, 0x%x (%s := 0x%x)',
-                'l' if operation == Shift.SHL else 'r',
-                dbg, dst_init,
-                debug_operand(R, sz), src,
-                cnt,
-                dbg, dst,
-            )
-
         return True
 
 
@@ -538,6 +396,4 @@ class BSWAP(Instruction):
         dest = int.from_bytes(src.to_bytes(sz, 'big'), 'little')
         vm.reg.set(reg32, sz, dest)
 
-        logger.debug('bswap %s', debug_register_operand(reg32, sz))
-
         return True
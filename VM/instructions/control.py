@@ -4,11 +4,6 @@ from unittest.mock import MagicMock
 from ..CPU import CPU32
 from ..util import Instruction, to_int, to_signed, byteorder
 
-if __debug__:
-    from ..debug import debug_operand, debug_register_operand
-    import logging
-    logger = logging.getLogger(__name__)
-
 MAXVALS = [None, (1 << 8) - 1, (1 << 16) - 1, None, (1 << 32) - 1]  # MAXVALS[n] is the maximum value of an unsigned n-byte number
 SIGNS   = [None, 1 << 8 - 1, 1 << 16 - 1, None, 1 << 32 - 1]  # SIGNS[n] is the maximum absolute value of a signed n-byte number
 
@@ -21,44 +16,97 @@ class NOP(Instruction):
         }
 
     def nop(vm: CPU32) -> True:
-        if __debug__:
-            logger.debug('nop')
-
         return True
 
     def rm(vm: CPU32) -> True:
         vm.process_ModRM()
 
-        if __debug__:
-            logger.debug('nop')
-
         return True
 
 
 ####################
 # JMP
 ####################
-JO   = compile('vm.reg.eflags.OF', 'o', 'eval')
-JNO  = compile('not vm.reg.eflags.OF', 'no', 'eval')
-JB   = compile('vm.reg.eflags.CF', 'b', 'eval')
-JNB  = compile('not vm.reg.eflags.CF', 'nb', 'eval')
-JZ   = compile('vm.reg.eflags.ZF', 'z', 'eval')
-JNZ  = compile('not vm.reg.eflags.ZF', 'nz', 'eval')
-JBE  = compile('vm.reg.eflags.CF or vm.reg.eflags.ZF', 'be', 'eval')
-JNBE = compile('not vm.reg.eflags.CF and not vm.reg.eflags.ZF', 'nbe', 'eval')
-JS   = compile('vm.reg.eflags.SF', 's', 'eval')
-JNS  = compile('not vm.reg.eflags.SF', 'ns', 'eval')
-JP   = compile('vm.reg.eflags.PF', 'p', 'eval')
-JNP  = compile('not vm.reg.eflags.PF', 'np', 'eval')
-JL   = compile('vm.reg.eflags.SF != vm.reg.eflags.OF', 'l', 'eval')
-JNL  = compile('vm.reg.eflags.SF == vm.reg.eflags.OF', 'nl', 'eval')
-JLE  = compile('vm.reg.eflags.ZF or vm.reg.eflags.SF != vm.reg.eflags.OF', 'le', 'eval')
-JNLE = compile('not vm.reg.eflags.ZF and vm.reg.eflags.SF == vm.reg.eflags.OF', 'nle', 'eval')
+# Conditions of jcc, setcc and cmovcc. Each one is a function of the VM that returns a true value
+# if the condition holds.
+def JO(vm: CPU32):
+    return vm.reg.get_OF()
+
+
+def JNO(vm: CPU32):
+    return not vm.reg.get_OF()
+
+
+def JB(vm: CPU32):
+    return vm.reg.get_CF()
+
+
+def JNB(vm: CPU32):
+    return not vm.reg.get_CF()
+
+
+def JZ(vm: CPU32):
+    return vm.reg.get_ZF()
+
+
+def JNZ(vm: CPU32):
+    return not vm.reg.get_ZF()
+
+
+def JBE(vm: CPU32):
+    return vm.reg.get_CF() or vm.reg.get_ZF()
+
+
+def JNBE(vm: CPU32):
+    return not vm.reg.get_CF() and not vm.reg.get_ZF()
+
+
+def JS(vm: CPU32):
+    return vm.reg.get_SF()
+
+
+def JNS(vm: CPU32):
+    return not vm.reg.get_SF()
+
+
+def JP(vm: CPU32):
+    return vm.reg.get_PF()
+
+
+def JNP(vm: CPU32):
+    return not vm.reg.get_PF()
+
+
+def JL(vm: CPU32):
+    return vm.reg.get_SF() != vm.reg.get_OF()
+
+
+def JNL(vm: CPU32):
+    return vm.reg.get_SF() == vm.reg.get_OF()
+
+
+def JLE(vm: CPU32):
+    return vm.reg.get_ZF() or vm.reg.get_SF() != vm.reg.get_OF()
+
+
+def JNLE(vm: CPU32):
+    return not vm.reg.get_ZF() and vm.reg.get_SF() == vm.reg.get_OF()
+
 
 JUMPS = [JO, JNO, JB, JNB, JZ, JNZ, JBE, JNBE, JS, JNS, JP, JNP, JL, JNL, JLE, JNLE]
 
-_JMP = compile('True', 'mp', 'eval')
-JCXZ = compile('not vm.reg.get(0, sz)', 'cxz', 'eval')
+
+def _JMP(vm: CPU32):
+    return True
+
+
+def JCXZ(vm: CPU32):
+    return not vm.reg.get(1, vm.address_size)
+
+
+# condition -> the suffix of the mnemonic, for debug output
+CONDITION_NAMES = {cond: cond.__name__[1:].lower() for cond in JUMPS + [JCXZ]}
+CONDITION_NAMES[_JMP] = 'mp'
 
 
 class JMP(Instruction):
@@ -74,7 +122,10 @@ class JMP(Instruction):
             0xEB: P(self.rel, _8bit=True, jump=_JMP),
             0xE9: P(self.rel, _8bit=False, jump=_JMP),
 
-            0xFF: self.rm_m,
+            0xFF: [
+                P(self.rm_m, REG=4),  # JMP r/m
+                P(self.rm_m, REG=5),  # JMP m
+                ],
             0xEA: P(self.ptr, _8bit=False),
 
             0xE3: P(self.rel, _8bit=True, jump=JCXZ),
@@ -96,7 +147,7 @@ class JMP(Instruction):
         d = vm.mem.get(vm.eip, sz, True)
         vm.eip += sz
 
-        if not eval(jump):
+        if not jump(vm):
             return True
             
         tmpEIP = vm.eip + d
@@ -107,18 +158,13 @@ class JMP(Instruction):
 
         vm.eip = tmpEIP
 
-        if __debug__:
-            logger.debug('j%s rel%d 0x%08x', jump.co_filename, sz * 8, vm.eip)
-        
         return True
 
-    def rm_m(vm: CPU32) -> bool:
-        old_eip = vm.eip
-
+    def rm_m(vm: CPU32, REG: int) -> True:
         sz = vm.operand_size
         RM, R = vm.process_ModRM()
 
-        if R[1] == 4:  # this is jmp r/m
+        if REG == 4:  # this is jmp r/m
             type, loc = RM
 
             tmpEIP = (type).get(loc, vm.address_size) 
@@ -127,11 +173,8 @@ class JMP(Instruction):
 
             assert vm.eip < vm.mem.size
 
-            if __debug__:
-                logger.debug('jmp rm%d 0x%x', sz * 8, vm.eip)
-
             return True
-        elif R[1] == 5:  # this is jmp m
+        else:  # this is jmp m
             segment_selector_address = to_int(vm.mem.get(vm.eip, vm.address_size), True)
             vm.eip += vm.address_size
             offset_address = to_int(vm.mem.get(vm.eip, vm.address_size), True)
@@ -153,14 +196,8 @@ class JMP(Instruction):
             else:
                 vm.eip = tempEIP & 0x0000FFFF
 
-            if __debug__:
-                logger.debug('jmp m%d 0x%x', sz * 8, vm.eip)
-
             return True
 
-        vm.eip = old_eip
-        return False
-
     def ptr(vm: CPU32) -> True:
         segment_selector = to_int(vm.mem.get(vm.eip, 2), True)
         vm.eip += 2
@@ -180,9 +217,6 @@ class JMP(Instruction):
         else:
             vm.eip = tempEIP & 0x0000FFFF
 
-        if __debug__:
-            logger.debug('jmp m%d 0x%x', sz * 8, vm.eip)
-
         return True
 
 
@@ -202,12 +236,9 @@ class SETcc(Instruction):
 
         type, loc = RM
 
-        byte = eval(cond)
+        byte = cond(vm)
         (type).set(loc, sz, byte)
 
-        if __debug__:
-            logger.debug('set%s %s := %d', cond.co_filename, debug_operand(RM, sz), byte)
-
         return True
 
 
@@ -226,7 +257,7 @@ class CMOVCC(Instruction):
 
         RM, R = vm.process_ModRM()
 
-        if not eval(cond):
+        if not cond(vm):
             return True
 
         type, loc = RM
@@ -235,14 +266,6 @@ class CMOVCC(Instruction):
 
         vm.reg.set(R[1], sz, data)
 
-        if __debug__:
-            logger.debug(
-                'cmov%s %s, %s=0x%x',
-                cond.co_filename,
-                debug_operand(R, sz), debug_operand(RM, sz),
-                data
-            )
-
         return True
 
 
@@ -252,7 +275,7 @@ class CMOVCC(Instruction):
 class BT(Instruction):
     def __init__(self):
         self.opcodes = {
-            0x0FBA: self.rm_imm,
+            0x0FBA: P(self.rm_imm, REG=4),
             0x0FA3: self.rm_r
         }
 
@@ -270,30 +293,20 @@ class BT(Instruction):
 
         vm.reg.eflags.CF = (base >> offset) & 1
 
-        if __debug__:
-            logger.debug(
-                'bt %s, 0x%02x',
-                debug_operand(RM, sz),
-                offset
-            )
-
         return True
 
-    def rm_imm(vm: CPU32) -> bool:
+    def rm_imm(vm: CPU32, REG: int) -> True:
         sz = vm.operand_size
 
         RM, R = vm.process_ModRM()
         _type, loc = RM
 
-        if R[1] != 4:  # this is not bt
-            return False
-
         if isinstance(_type, type(vm.mem)):
-            base = vm.mem.get(loc, 1)  # read ONE BYTE
+            base = vm.mem.get8(loc)  # read ONE BYTE
         else:
             base = vm.reg.get(loc, sz)
 
-        offset = vm.mem.get_eip(vm.eip, 1)  # always 8 bits
+        offset = vm.mem.get_eip8(vm.eip)  # always 8 bits
         vm.eip += 1
 
         if isinstance(_type, type(vm.reg)):  # first arg is a register
@@ -301,13 +314,6 @@ class BT(Instruction):
 
         vm.reg.eflags.CF = (base >> offset) & 1
 
-        if __debug__:
-            logger.debug(
-                'bt %s, 0x%02x',
-                debug_operand(RM, sz),
-                offset
-            )
-
         return True
 
 
@@ -326,19 +332,17 @@ class INT(Instruction):
             }
 
     def _3(vm: CPU32) -> True:
+        vm.kernel.output.flush()
         vm.descriptors[2].write("[!] It's a trap! (literally)")
 
         return True
 
     def imm(vm: CPU32) -> True:
-        imm = vm.mem.get_eip(vm.eip, 1)  # always 8 bits
+        imm = vm.mem.get_eip8(vm.eip)  # always 8 bits
         vm.eip += 1
 
         vm.interrupt(imm)
 
-        if __debug__:
-            logger.debug('int 0x%x', imm)
-
         return True
 
 
@@ -352,7 +356,7 @@ class CALL(Instruction):
     def __init__(self):
         self.opcodes = {
             0xE8: self.rel,
-            0xFF: self.rm_m,
+            0xFF: P(self.rm_m, REG=2),  # `call m` (REG=3) is not supported, so it raises MissingOpcodeError
             0x9A: self.ptr
             }
 
@@ -360,39 +364,24 @@ class CALL(Instruction):
     # rm_m = MagicMock(return_value=False)
     ptr = MagicMock(return_value=False)
     
-    def rm_m(vm: CPU32) -> bool:
-        old_eip = vm.eip
-        
+    def rm_m(vm: CPU32, REG: int) -> True:
         sz = vm.operand_size
         RM, R = vm.process_ModRM()
-        
-        if R[1] == 2:  # this is call r/m
-            type, loc = RM
 
-            data = (type).get(loc, sz)
-          
-            tmpEIP = data & MAXVALS[sz]
-          
-            # TODO: check whether tmpEIP is OK
-          
-            vm.stack_push(vm.eip)
-          
-            vm.eip = tmpEIP
+        # this is call r/m
+        type, loc = RM
 
-            if __debug__:
-                logger.debug(
-                    'call %s=0x%08x => 0x%08x',
-                    debug_operand(RM, sz),
-                    data, vm.eip
-                )
+        data = (type).get(loc, sz)
 
-            return True
-        elif R[1] == 3:  # this is call m
-            vm.eip = old_eip
-            return False
+        tmpEIP = data & MAXVALS[sz]
 
-        vm.eip = old_eip
-        return False
+        # TODO: check whether tmpEIP is OK
+
+        vm.stack_push(vm.eip)
+
+        vm.eip = tmpEIP
+
+        return True
 
     def rel(vm: CPU32) -> True:
         sz = vm.operand_size
@@ -404,9 +393,6 @@ class CALL(Instruction):
         vm.stack_push(vm.eip)
         vm.eip = tmpEIP
 
-        if __debug__:
-            logger.debug('call 0x%08x => 0x%08x', dest, vm.eip)
-
         return True
 
 
@@ -434,23 +420,17 @@ class RET(Instruction):
         sz = vm.operand_size
         vm.eip = to_signed(vm.stack_pop(sz), sz)
 
-        if __debug__:
-            logger.debug('ret 0x%08x', vm.eip)
-
         return True
 
     def near_imm(vm: CPU32) -> True:
         sz = vm.operand_size
 
-        imm = vm.mem.get(vm.eip, 2)
+        imm = vm.mem.get16(vm.eip)
         vm.eip = to_signed(vm.stack_pop(sz), sz)
 
         esp = 4
         vm.reg.set(esp, vm.stack_address_size, vm.reg.get(esp, vm.stack_address_size) + imm)
 
-        if __debug__:
-            logger.debug('ret 0x%08x', vm.eip)
-
         return True
 
 
@@ -464,10 +444,10 @@ class ENTER(Instruction):
         }
 
     def enter(vm: CPU32):
-        AllocSize = vm.mem.get_eip(vm.eip, 2)
+        AllocSize = vm.mem.get_eip16(vm.eip)
         vm.eip += 2
 
-        NestingLevel = vm.mem.get_eip(vm.eip, 1) % 32
+        NestingLevel = vm.mem.get_eip8(vm.eip) % 32
         vm.eip += 1
 
         ebp = vm.reg.get(5, vm.operand_size)
@@ -484,9 +464,6 @@ class ENTER(Instruction):
         vm.reg.ebp = FrameTemp & MAXVALS[vm.operand_size]
         vm.reg.esp = vm.reg.get(4, vm.operand_size) - AllocSize
 
-        if __debug__:
-            logger.debug('enter 0x%04x, 0x%02x', AllocSize, NestingLevel)
-
         return True
 
 
@@ -512,9 +489,6 @@ class LEAVE(Instruction):
         vm.reg.set(ESP, vm.address_size, vm.reg.get(EBP, vm.address_size))
         vm.reg.set(EBP, vm.operand_size, vm.stack_pop(vm.operand_size))
 
-        if __debug__:
-            logger.debug('leave')
-
         return True
 
 
@@ -558,9 +532,6 @@ class CPUID(Instruction):
         else:
             raise RuntimeError(f'Unsupported EAX value for CPUID: 0x{EAX_val:08X}')
 
-        if __debug__:
-            logger.debug('cpuid')
-
         return True
 
 
@@ -1,19 +1,12 @@
 from functools import partialmethod as P
-from unittest.mock import MagicMock
 from ..CPU import CPU32
 from ..FPU import binary80
 
 from ..util import Instruction
 
-if __debug__:
-    import logging
-    logger = logging.getLogger(__name__)
-
 
 # FLD
 class FLD(Instruction):
-    m_st = MagicMock(return_value=False)
-
     def __init__(self):
         self.opcodes = {
             # FLD
@@ -27,12 +20,6 @@ class FLD(Instruction):
         }
 
     def m_fp(vm: CPU32, bits: int, REG: int):
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
         # sz = vm.operand_size
         RM, R = vm.process_ModRM()
         _, loc = RM
@@ -40,7 +27,11 @@ class FLD(Instruction):
         flt80 = vm.mem.get_float(loc, bits)
         vm.fpu.push(flt80)
 
-        logger.debug('fld%d 0x%08x = %s', bits // 8, loc, flt80)
+        return True
+
+    def m_st(vm: CPU32, i: int) -> True:
+        flt80 = vm.fpu.ST(i)
+        vm.fpu.push(flt80)
 
         return True
 
@@ -57,12 +48,6 @@ class FILD(Instruction):
         }
 
     def m_int(vm: CPU32, is32bit: bool, REG: int) -> True:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
         sz = {
             (False, 0): 2,
             (True, 0): 4,
@@ -77,15 +62,11 @@ class FILD(Instruction):
         flt80 = binary80.from_int(imm)
         vm.fpu.push(flt80)
 
-        logger.debug('fild%d %d', sz * 8, imm)
-
         return True
 
 
 # FST / FSTP
 class FST(Instruction):
-    st = MagicMock(return_value=False)
-
     def __init__(self):
         self.opcodes = {
             0xD9: [
@@ -109,12 +90,6 @@ class FST(Instruction):
         }
 
     def m_fp(vm, bits: int, REG: int):
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
         RM, R = vm.process_ModRM()
         _, loc = RM
 
@@ -122,11 +97,17 @@ class FST(Instruction):
 
         vm.mem.set_float(loc, bits // 8, data)
 
-        if R[1] == 2:
-            logger.debug('fst 0x%08x := %s', loc, data)
-        else:
+        if REG != 2:
+            vm.fpu.pop()
+
+        return True
+
+    def st(vm, i: int, pop: bool) -> True:
+        data = vm.fpu.ST(0)
+        vm.fpu.store(i, data)
+
+        if pop:
             vm.fpu.pop()
-            logger.debug('fstp 0x%08x := %s', loc, data)
 
         return True
 
@@ -146,13 +127,7 @@ class FIST(Instruction):
             ]
         }
 
-    def fist(vm, size: int, REG: int) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def fist(vm, size: int, REG: int) -> True:
         RM, R = vm.process_ModRM()
         _, loc = RM
 
@@ -162,9 +137,6 @@ class FIST(Instruction):
 
         if REG != 2:
             vm.fpu.pop()
-            logger.debug('fistp 0x%08x := %d', loc, SRC)
-        else:
-            logger.debug('fist 0x%08x := %d', loc, SRC)
 
         return True
 
@@ -180,11 +152,9 @@ class FMUL(Instruction):
         }
 
     def fmulp(vm, i: int) -> True:
-        res = vm.fpu.mul(i, 0)
+        vm.fpu.mul(i, 0)
         vm.fpu.pop()
 
-        logger.debug('fmulp (ST(%d) = %s)', i + 1, res)
-
         return True
 
 
@@ -199,9 +169,7 @@ class FADDP(Instruction):
         }
 
     def faddp(vm, i: int) -> True:
-        res = vm.fpu.add(i, 0)
-
-        logger.debug('faddp ST(%d), ST(0) (ST(%d) := %s)', i, i + 1, res)
+        vm.fpu.add(i, 0)
 
         vm.fpu.pop()
 
@@ -235,20 +203,16 @@ class FDIV(Instruction):
         :return:
         """
         if reverse:
-            res = vm.fpu.div(0, i)
-            logger.debug('fdiv ST(0), ST(%d) (ST(0) := %s)', i, res)
+            vm.fpu.div(0, i)
         else:
-            res = vm.fpu.div(i, 0)
-            logger.debug('fdiv ST(%d), ST(0) (ST(%d) := %s)', i, i, res)
+            vm.fpu.div(i, 0)
 
         return True
 
     def fdivp(vm, i: int) -> True:
-        res = vm.fpu.div(i, 0)
+        vm.fpu.div(i, 0)
         vm.fpu.pop()
 
-        logger.debug('fdivp ST(%d), ST(0) (ST(%d) := %s)', i, i + 1, res)
-
         return True
 
 
@@ -258,7 +222,7 @@ class FCOMP(Instruction):
         self.opcodes = {
             # F*COM*
             **{
-                0xD0E0 + i: P(self.fucom, pop=0, i=i, set_eflags=False)
+                0xDDE0 + i: P(self.fucom, pop=0, i=i, set_eflags=False)
                 for i in range(8)
             },
             **{
@@ -346,24 +310,16 @@ class FCOMP(Instruction):
 class FLDCW(Instruction):
     def __init__(self):
         self.opcodes = {
-            0xD9: self.m2byte
+            0xD9: P(self.m2byte, REG=5)
         }
 
-    def m2byte(vm, REG=5) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def m2byte(vm, REG: int) -> True:
         RM, R = vm.process_ModRM()
         _, loc = RM
 
-        control = vm.mem.get(loc, 2)
+        control = vm.mem.get16(loc)
         vm.fpu.control.value = control
 
-        logger.debug('fldcw 0x%08x := %04x', loc, control)
-
         return True
 
 
@@ -371,27 +327,16 @@ class FLDCW(Instruction):
 class FSTCW(Instruction):
     def __init__(self):
         self.opcodes = {
-            0xD9: P(self.m2byte, check=False),
-            0x9BD9: P(self.m2byte, check=True)
+            0xD9: P(self.m2byte, check=False, REG=7),
+            0x9BD9: P(self.m2byte, check=True, REG=7)
         }
 
-    def m2byte(vm, check: bool, REG=7) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def m2byte(vm, check: bool, REG: int) -> True:
         RM, R = vm.process_ModRM()
 
         _, loc = RM
-        vm.mem.set(loc, 2, vm.fpu.control.value)
+        vm.mem.set16(loc, vm.fpu.control.value)
 
-        if check:
-            # TODO: add check? WTF?
-            logger.debug('fstcw 0x%08x := %02x', loc, vm.fpu.control.value)
-        else:
-            logger.debug('fnstcw 0x%08x := %02x', loc,  vm.fpu.control.value)
 
         return True
 
@@ -411,6 +356,4 @@ class FXCH(Instruction):
 
         vm.fpu.status.C1 = 0
 
-        logger.debug('fxch ST(%d)', i)
-
         return True
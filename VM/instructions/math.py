@@ -1,15 +1,11 @@
 import enum
 
 from ..util import Instruction
-from ..misc import parity, sign_extend
+from ..misc import sign_extend
+from ..Registers import FLAGS_ADD, FLAGS_SUB, FLAGS_INC, FLAGS_DEC
 
 from functools import partialmethod as P
 
-if __debug__:
-    from ..debug import debug_operand, debug_register_operand
-    import logging
-    logger = logging.getLogger(__name__)
-
 MAXVALS = [None, (1 << 8) - 1, (1 << 16) - 1, None, (1 << 32) - 1]  # MAXVALS[n] is the maximum value of an unsigned n-bit number
 SIGNS   = [None, 1 << 8 - 1, 1 << 16 - 1, None, 1 << 32 - 1]  # SIGNS[n] is the maximum absolute value of a signed n-bit number
 
@@ -115,53 +111,25 @@ class ADDSUB(Instruction):
         vm.eip += sz
 
         if carry:
-            b += vm.reg.eflags.CF
+            b += vm.reg.get_CF()
 
         a = vm.reg.get(0, sz)
 
-        c = a + (b if not sub else MAXVALS[sz] + 1 - b)
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
-
         if not sub:
-            vm.reg.eflags.OF = (sign_a == sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = c > MAXVALS[sz]
-            vm.reg.eflags.AF = ((a & 255) + (b & 255)) > MAXVALS[1]
+            c = a + b
+            vm.reg.lazy_flags = FLAGS_ADD, a, b, c, sz
         else:
-            vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = b > a
-            vm.reg.eflags.AF = (b & 255) > (a & 255)
+            c = a + MAXVALS[sz] + 1 - b
+            vm.reg.lazy_flags = FLAGS_SUB, a, b, c, sz
 
         c &= MAXVALS[sz]
 
-        vm.reg.eflags.SF = sign_c
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
-
         if not cmp:
             vm.reg.set(0, sz, c)
 
-        if __debug__:
-            dbg = debug_register_operand(0, sz)
-            logger.debug(
-                '%s %s=%d, imm%d=%d (%s := %d)',
-                ('sbb' if sub else 'adc') if carry else ('cmp' if cmp else ('sub' if sub else 'add')),
-                dbg, a,
-                sz * 8, b,
-                dbg, c
-            )
-
         return True
 
-    def rm_imm(vm, _8bit_op: bool, _8bit_imm: bool, REG: int) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def rm_imm(vm, _8bit_op: bool, _8bit_imm: bool, REG: int) -> True:
         operation = ADDSUB_operation(REG)
 
         sz = 1 if _8bit_op else vm.operand_size
@@ -176,44 +144,22 @@ class ADDSUB(Instruction):
         b &= MAXVALS[sz]  # convert to an unsigned number; ATTENTION!
 
         if operation == operation.ADC or operation == operation.SBB:
-            b += vm.reg.eflags.CF
+            b += vm.reg.get_CF()
 
         a = (type).get(loc, sz)
 
-        c = a + (b if operation == operation.ADD or operation == operation.ADC else MAXVALS[sz] + 1 - b)
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
-
-        if operation == operation.ADD or operation == operation.ADC:  # not in (operation.SBB, operation.SUB, operation.CMP):
-            vm.reg.eflags.OF = (sign_a == sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = c > MAXVALS[sz]
-            vm.reg.eflags.AF = ((a & 255) + (b & 255)) > MAXVALS[1]
+        if operation == operation.ADD or operation == operation.ADC:
+            c = a + b
+            vm.reg.lazy_flags = FLAGS_ADD, a, b, c, sz
         else:
-            vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = b > a
-            vm.reg.eflags.AF = (b & 255) > (a & 255)
+            c = a + MAXVALS[sz] + 1 - b
+            vm.reg.lazy_flags = FLAGS_SUB, a, b, c, sz
 
         c &= MAXVALS[sz]
 
-        vm.reg.eflags.SF = sign_c
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
-
         if operation != operation.CMP:
             (type).set(loc, sz, c)
 
-        if __debug__:
-            dbg = debug_operand(RM, sz)
-            logger.debug(
-                '%s %s=%d, imm%d=%d (%s := %d)',
-                operation.name,
-                dbg, a,
-                sz * 8, b,
-                dbg, c
-            )
-        
         return True
 
     def rm_r(vm, _8bit, sub: bool, cmp: bool, carry: bool) -> True:
@@ -226,42 +172,20 @@ class ADDSUB(Instruction):
         b = vm.reg.get(R[1], sz)
 
         if carry:
-            b += vm.reg.eflags.CF
-
-        c = a + (b if not sub else MAXVALS[sz] + 1 - b)
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
+            b += vm.reg.get_CF()
 
         if not sub:
-            vm.reg.eflags.OF = (sign_a == sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = c > MAXVALS[sz]
-            vm.reg.eflags.AF = ((a & 255) + (b & 255)) > MAXVALS[1]
+            c = a + b
+            vm.reg.lazy_flags = FLAGS_ADD, a, b, c, sz
         else:
-            vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = b > a
-            vm.reg.eflags.AF = (b & 255) > (a & 255)
+            c = a + MAXVALS[sz] + 1 - b
+            vm.reg.lazy_flags = FLAGS_SUB, a, b, c, sz
 
         c &= MAXVALS[sz]
 
-        vm.reg.eflags.SF = sign_c
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
-
         if not cmp:
             (type).set(loc, sz, c)
 
-        if __debug__:
-            dbg = debug_operand(RM, sz)
-            logger.debug(
-                '%s %s=%d, %s=%d (%s := %d)',
-                ('sbb' if sub else 'adc') if carry else ('cmp' if cmp else ('sub' if sub else 'add')),
-                dbg, a,
-                debug_operand(R, sz), b,
-                dbg, c
-            )
-
         return True
 
     def r_rm(vm, _8bit, sub=False, cmp=False, carry=False) -> True:
@@ -274,42 +198,20 @@ class ADDSUB(Instruction):
         a = vm.reg.get(R[1], sz)
 
         if carry:
-            b += vm.reg.eflags.CF
-
-        c = a + (b if not sub else MAXVALS[sz] + 1 - b)
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
+            b += vm.reg.get_CF()
 
         if not sub:
-            vm.reg.eflags.OF = (sign_a == sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = c > MAXVALS[sz]
-            vm.reg.eflags.AF = ((a & 255) + (b & 255)) > MAXVALS[1]
+            c = a + b
+            vm.reg.lazy_flags = FLAGS_ADD, a, b, c, sz
         else:
-            vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.CF = b > a
-            vm.reg.eflags.AF = (b & 255) > (a & 255)
+            c = a + MAXVALS[sz] + 1 - b
+            vm.reg.lazy_flags = FLAGS_SUB, a, b, c, sz
 
         c &= MAXVALS[sz]
 
-        vm.reg.eflags.SF = sign_c
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
-
         if not cmp:
             vm.reg.set(R[1], sz, c)
 
-        if __debug__:
-            dbg = debug_operand(R, sz)
-            logger.debug(
-                '%s %s=%d, %s=%d (%s := %d)',
-                ('sbb' if sub else 'adc') if carry else ('cmp' if cmp else ('sub' if sub else 'add')),
-                dbg, a,
-                debug_operand(RM, sz), b,
-                dbg, c
-            )
-
         return True
 
 
@@ -352,13 +254,7 @@ class INCDEC(Instruction):
                 }
             }
 
-    def rm(vm, _8bit: bool, REG: int) -> bool:
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
+    def rm(vm, _8bit: bool, REG: int) -> True:
         dec = REG
         sz = 1 if _8bit else vm.operand_size
 
@@ -366,36 +262,18 @@ class INCDEC(Instruction):
         type, loc = RM
 
         a = (type).get(loc, sz)
-        b = 1
-
-        c = a + (b if not dec else MAXVALS[sz] - 1 + b)
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
 
         if not dec:
-            vm.reg.eflags.OF = (sign_a == sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.AF = ((a & 255) + (b & 255)) > MAXVALS[1]
+            c = a + 1
+            vm.reg.lazy_flags = FLAGS_INC, a, vm.reg.get_CF(), c, sz
         else:
-            vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.AF = (b & 255) > (a & 255)
+            c = a + MAXVALS[sz]
+            vm.reg.lazy_flags = FLAGS_DEC, a, vm.reg.get_CF(), c, sz
 
         c &= MAXVALS[sz]
 
-        vm.reg.eflags.SF = sign_c
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
-
         (type).set(loc, sz, c)
 
-        if __debug__:
-            logger.debug(
-                '%s %s=%d',
-                'dec' if dec else 'inc',
-                debug_operand(RM, sz), a
-            )
-
         return True
 
     def r(vm, _8bit, dec=False) -> True:
@@ -403,32 +281,18 @@ class INCDEC(Instruction):
         loc = vm.opcode & 0b111
 
         a = vm.reg.get(loc, sz)
-        b = 1
-
-        c = a + (b if not dec else MAXVALS[sz] - 1 + b)
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
 
         if not dec:
-            vm.reg.eflags.OF = (sign_a == sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.AF = ((a & 255) + (b & 255)) > MAXVALS[1]
+            c = a + 1
+            vm.reg.lazy_flags = FLAGS_INC, a, vm.reg.get_CF(), c, sz
         else:
-            vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-            vm.reg.eflags.AF = (b & 255) > (a & 255)
+            c = a + MAXVALS[sz]
+            vm.reg.lazy_flags = FLAGS_DEC, a, vm.reg.get_CF(), c, sz
 
         c &= MAXVALS[sz]
 
-        vm.reg.eflags.SF = sign_c
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF = parity(c)
-
         vm.reg.set(loc, sz, c)
 
-        if __debug__:
-            logger.debug('%s %s := %d', 'dec' if dec else 'inc', debug_register_operand(loc, sz), c)
-
         return True
 
 
@@ -438,11 +302,11 @@ class INCDEC(Instruction):
 class MUL(Instruction):
     def __init__(self):
         self.opcodes = {
-            0xF6: P(self.mul, _8bit=True),
-            0xF7: P(self.mul, _8bit=False)
+            0xF6: P(self.mul, _8bit=True, REG=4),
+            0xF7: P(self.mul, _8bit=False, REG=4)
             }
 
-    def mul(vm, _8bit) -> bool:
+    def mul(vm, _8bit, REG: int) -> True:
         """
         Unsigned multiply.
         AX      <-  AL * r/m8
@@ -451,14 +315,8 @@ class MUL(Instruction):
         """
         sz = 1 if _8bit else vm.operand_size
 
-        old_eip = vm.eip
-
         RM, R = vm.process_ModRM()
 
-        if R[1] != 4:
-            vm.eip = old_eip
-            return False  # This is not MUL
-
         type, loc = RM
 
         a = (type).get(loc, sz)
@@ -478,14 +336,6 @@ class MUL(Instruction):
         if sz != 1:
             vm.reg.set(2, _sz, hi)  # (E)DX
 
-        if __debug__:
-            logger.debug(
-                'mul %s=%d, %s=%d (edx := 0x%x; eax := 0x%x)',
-                debug_register_operand(0, sz), b,
-                debug_operand(RM, sz), a,
-                hi, lo
-            )
-
         return True
 
 
@@ -505,19 +355,13 @@ class DIV(Instruction):
                 ]
             }
 
-    def div(vm, _8bit, REG: int) -> bool:
+    def div(vm, _8bit, REG: int) -> True:
         """
         Unsigned divide.
         AL, AH = divmod(AX, r/m8)
         AX, DX = divmod(DX:AX, r/m16)
         EAX, EDX = divmod(EDX:EAX, r/m32)
         """
-        ModRM = vm.mem.get_eip(vm.eip, 1)
-        _REG = (ModRM & 0b00111000) >> 3
-
-        if _REG != REG:
-            return False
-
         idiv = REG == 7
 
         sz = 1 if _8bit else vm.operand_size
@@ -551,14 +395,6 @@ class DIV(Instruction):
         else:
             vm.reg.set(2, sz, rem)  # DX/EDX
 
-        if __debug__:
-            logger.debug(
-                '%sdiv %s=%d, %s=%d',
-                'i' if idiv else '',
-                debug_register_operand(0, sz), dividend,
-                debug_operand(RM, sz), divisor
-            )
-
         return True
 
 
@@ -568,8 +404,8 @@ class DIV(Instruction):
 class IMUL(Instruction):
     def __init__(self):
         self.opcodes = {
-            0xF6  : P(self.rm, _8bit=True),
-            0xF7  : P(self.rm, _8bit=False),
+            0xF6  : P(self.rm, _8bit=True, REG=5),
+            0xF7  : P(self.rm, _8bit=False, REG=5),
 
             0x0FAF: self.r_rm,
 
@@ -577,17 +413,11 @@ class IMUL(Instruction):
             0x69  : P(self.r_rm_imm, _8bit_imm=False)
             }
 
-    def rm(vm, _8bit: int) -> bool:
+    def rm(vm, _8bit: int, REG: int) -> True:
         sz = 1 if _8bit else vm.operand_size
 
-        old_eip = vm.eip
-
         RM, R = vm.process_ModRM()
 
-        if R[1] != 5:
-            vm.eip = old_eip
-            return False  # This is not IMUL
-
         type, loc = RM
 
         src = (type).get(loc, sz, True)
@@ -608,15 +438,6 @@ class IMUL(Instruction):
 
         vm.reg.eflags.OF = vm.reg.eflags.CF = set_flags
 
-        if __debug__:
-            logger.debug(
-                'imul %s=%d, %s=%d (%s := %d; %s := %d)',
-                debug_register_operand(0, sz), dst,
-                debug_operand(RM, sz), src,
-                debug_register_operand(2, _sz), hi,
-                debug_register_operand(0, _sz), lo
-            )
-
         return True
 
     def r_rm(vm) -> True:
@@ -637,13 +458,6 @@ class IMUL(Instruction):
 
         vm.reg.eflags.OF = vm.reg.eflags.CF = set_flags
 
-        if __debug__:
-            logger.debug(
-                'imul %s=%d, %s=%d',
-                debug_operand(R, sz), dst,
-                debug_operand(RM, sz), src
-            )
-
         return True
 
     def r_rm_imm(vm, _8bit_imm: int) -> True:
@@ -667,12 +481,4 @@ class IMUL(Instruction):
 
         vm.reg.set(R[1], sz, DEST)
 
-        if __debug__:
-            logger.debug(
-                'imul %s := %d, %s=%d, imm%d=%d',
-                debug_operand(R, sz), DEST,
-                debug_operand(RM, sz), src2,
-                sz * 8, src1
-            )
-
         return True
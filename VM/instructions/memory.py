@@ -1,14 +1,10 @@
 from ..util import Instruction, to_int, byteorder, SegmentRegs
-from ..misc import sign_extend, parity
+from ..misc import sign_extend
+from ..Registers import FLAGS_SUB
 from ..CPU import CPU32
 
 from functools import partialmethod as P
 
-if __debug__:
-    from ..debug import debug_operand, debug_register_operand
-    import logging
-    logger = logging.getLogger(__name__)
-
 MAXVALS = [None, (1 << 8) - 1, (1 << 16) - 1, None, (1 << 32) - 1]  # MAXVALS[n] is the maximum value of an unsigned n-bit number
 SIGNS   = [None, 1 << 8 - 1, 1 << 16 - 1, None, 1 << 32 - 1]  # SIGNS[n] is the maximum absolute value of a signed n-bit number
 
@@ -39,8 +35,8 @@ class MOV(Instruction):
                 o: P(self.r_imm, _8bit=False)
                 for o in range(0xB8, 0xC0)
                 },
-            0xC6: P(self.rm_imm, _8bit=True),
-            0xC7: P(self.rm_imm, _8bit=False),
+            0xC6: P(self.rm_imm, _8bit=True, REG=0),
+            0xC7: P(self.rm_imm, _8bit=False, REG=0),
 
             0x88: P(self.rm_r, _8bit=True, reverse=False),
             0x89: P(self.rm_r, _8bit=False, reverse=False),
@@ -68,21 +64,13 @@ class MOV(Instruction):
         r = vm.opcode & 0b111
         vm.reg.set(r, sz, imm)
 
-        if __debug__:
-            logger.debug('mov %s, %x', debug_operand((vm.reg, r), sz), imm)
-
         return True
 
-    def rm_imm(vm: CPU32, _8bit) -> bool:
+    def rm_imm(vm: CPU32, _8bit, REG: int) -> True:
         sz = 1 if _8bit else vm.operand_size
-        old_eip = vm.eip
 
         RM, R = vm.process_ModRM()
 
-        if R[1] != 0:
-            vm.eip = old_eip
-            return False  # this is not MOV
-
         type, loc = RM
 
         imm = vm.mem.get_eip(vm.eip, sz)
@@ -90,9 +78,6 @@ class MOV(Instruction):
 
         (type).set(loc, sz, imm)
 
-        if __debug__:
-            logger.debug('mov %s, 0x%x', debug_operand(RM, sz), imm)
-
         return True
 
     def rm_r(vm: CPU32, _8bit, reverse=False) -> True:
@@ -107,26 +92,11 @@ class MOV(Instruction):
             
             vm.reg.set(R[1], sz, data)
 
-            if __debug__:
-                logger.debug(
-                    'mov %s, %s=0x%x',
-                    debug_operand(R, sz),
-                    debug_operand(RM, sz),
-                    data
-                )
         else:
             data = vm.reg.get(R[1], sz)
             
             (type).set(loc, sz, data)
 
-            if __debug__:
-                logger.debug(
-                    'mov %s, %s=0x%x',
-                    debug_operand(RM, sz),
-                    debug_operand(R, sz),
-                    data
-                )
-
         return True
 
     def r_moffs(vm: CPU32, _8bit, reverse=False) -> True:
@@ -139,21 +109,10 @@ class MOV(Instruction):
             data = vm.reg.get(0, sz)
             vm.mem.set(loc, sz, data)
 
-            if __debug__:
-                logger.debug(
-                    'mov moffs 0x%08x, %s=0x%x',
-                    loc, debug_register_operand(0, sz), data
-                )
         else:
             data = vm.mem.get(loc, sz)
             vm.reg.set(0, sz, data)
 
-            if __debug__:
-                logger.debug(
-                    'mov %s, moffs 0x%08x=0x%x',
-                    debug_register_operand(0, sz), loc, data
-                )
-
         return True
 
     def sreg_rm(vm: CPU32, reverse: bool) -> True:
@@ -165,12 +124,9 @@ class MOV(Instruction):
 
         SRC = (type).get(From, sz)
 
-        index, TI, RPL = SRC >> 3, (SRC >> 2) & 1, SRC & 0b11
+        index, TI = SRC >> 3, (SRC >> 2) & 1
 
         if not reverse:
-            if __debug__:
-                logger.debug(f'About to move to sreg({SegmentRegs(R[1]).name}) from index={index}, table={["GDT", "LDT"][TI]}, privilege={RPL}')
-
             if TI == 0:  # move from GDT
                 descr = vm.GDT[index]
             else:  # move from LDT
@@ -216,14 +172,6 @@ class MOVSX(Instruction):
 
         vm.reg.set(R[1], sz_R, SRC)
 
-        if __debug__:
-            logger.debug(
-                'movzx %s, %s=0x%x',
-                debug_operand(R, sz_R),
-                debug_operand(RM, sz_R),
-                SRC
-            )
-
         return True
 
     def r_rm(vm: CPU32, _8bit: bool, movsxd: bool) -> True:
@@ -240,13 +188,6 @@ class MOVSX(Instruction):
 
         vm.reg.set(R[1], sz_R, SRC)
 
-        if __debug__:
-            logger.debug(
-                'movsx%s %s, %s=0x%x',
-                'd' if movsxd else '',
-                debug_operand(R, sz_R), debug_operand(RM, sz_RM), SRC
-            )
-
         return True
     
 
@@ -264,7 +205,7 @@ class PUSH(Instruction):
                 o: self.r
                 for o in range(0x50, 0x58)
                 },
-            0xFF  : self.rm,
+            0xFF  : P(self.rm, REG=6),
 
             0x6A  : P(self.imm, _8bit=True),
             0x68  : P(self.imm, _8bit=False),
@@ -286,29 +227,18 @@ class PUSH(Instruction):
 
         vm.stack_push(data)
 
-        if __debug__:
-            logger.debug('push %s=0x%x', debug_register_operand(loc, sz), data)
-
         return True
 
-    def rm(vm: CPU32) -> bool:
-        old_eip = vm.eip
+    def rm(vm: CPU32, REG: int) -> True:
         sz = vm.operand_size
 
         RM, R = vm.process_ModRM()
 
-        if R[1] != 6:
-            vm.eip = old_eip
-            return False  # this is not PUSH rm
-
         type, loc = RM
 
         data = (type).get(loc, sz)
         vm.stack_push(data)
 
-        if __debug__:
-            logger.debug('push %s=0x%x', debug_operand(RM, sz), data)
-
         return True
 
     def imm(vm: CPU32, _8bit: bool) -> True:
@@ -319,9 +249,6 @@ class PUSH(Instruction):
 
         vm.stack_push(data)
 
-        if __debug__:
-            logger.debug('push 0x%x', data)
-
         return True
 
     def sreg(vm: CPU32, reg) -> bool:
@@ -357,9 +284,6 @@ class PUSHF(Instruction):
 
         vm.stack_push(tmpEFLAGS)
 
-        if __debug__:
-            logger.debug('pushf%s', 'd' if vm.operand_size == 4 else '')
-
         return True
 
 
@@ -386,9 +310,6 @@ class PUSHA(Instruction):
         for reg in regs_to_push_2:
             vm.stack_push(vm.reg.get(reg, vm.operand_size))
 
-        if __debug__:
-            logger.debug('pusha%s', 'd' if vm.operand_size == 4 else '')
-
         return True
 
 
@@ -414,9 +335,6 @@ class POPA(Instruction):
         for reg in regs_to_pop_2:
             vm.reg.set(reg, vm.stack_pop(vm.operand_size))
 
-        if __debug__:
-            logger.debug('popa%s', 'd' if vm.operand_size == 4 else '')
-
         return True
 
 
@@ -442,9 +360,6 @@ class POPF(Instruction):
 
         vm.reg.eflags.eflags = tmpEFLAGS
 
-        if __debug__:
-            logger.debug('popf%s', 'd' if vm.operand_size == 4 else '')
-
         return True
 
 
@@ -462,7 +377,7 @@ class POP(Instruction):
                 o: self.r
                 for o in range(0x58, 0x60)
                 },
-            0x8F  : self.rm,
+            0x8F  : P(self.rm, REG=0),
 
             0x1F  : P(self.sreg, 'DS'),
             0x07  : P(self.sreg, 'ES'),
@@ -479,30 +394,19 @@ class POP(Instruction):
         data = vm.stack_pop(sz)
         vm.reg.set(loc, sz, data)
 
-        if __debug__:
-            logger.debug('pop %s := %x', debug_register_operand(loc, sz), data)
-
         return True
 
-    def rm(vm: CPU32) -> bool:
+    def rm(vm: CPU32, REG: int) -> True:
         sz = vm.operand_size
-        old_eip = vm.eip
 
         RM, R = vm.process_ModRM()
 
-        if R[1] != 0:
-            vm.eip = old_eip
-            return False  # this is not POP rm
-
         type, loc, _ = RM
 
         data = vm.stack_pop(sz)
 
         (type).set(loc, sz, data)
 
-        if __debug__:
-            logger.debug('pop %s := 0x%x', debug_operand(RM, sz), data)
-
         return True
 
     def sreg(vm: CPU32, reg: str, _32bit=False) -> True:
@@ -514,8 +418,6 @@ class POP(Instruction):
 
         setattr(vm.reg, reg, to_int(data, False))
 
-        logger.debug('pop %s := %s', reg, data.hex())
-
         return True
 
 
@@ -529,7 +431,6 @@ class LEA(Instruction):
             }
 
     def r_rm(vm: CPU32) -> True:
-        sz_RM, sz_R = vm.address_size, vm.operand_size
         RM, R = vm.process_ModRM()
 
         type, loc = RM
@@ -550,13 +451,6 @@ class LEA(Instruction):
         data = tmp
         vm.reg.set(R[1], vm.operand_size, data)
 
-        if __debug__:
-            logger.debug(
-                'lea %s, %s == 0x%08x',
-                debug_operand(R, sz_R), debug_operand(RM, sz_RM),
-                data
-            )
-
         return True
 
 
@@ -568,7 +462,7 @@ class XCHG(Instruction):
         self.opcodes = {
             **{
                 o: self.eax_r
-                for o in range(0x90, 0x98)
+                for o in range(0x91, 0x98)  # 0x90 (xchg eax, eax) is NOP
                 },
             0x86: P(self.rm_r, _8bit=True),
             0x87: P(self.rm_r, _8bit=False)
@@ -584,12 +478,6 @@ class XCHG(Instruction):
             vm.reg.set(0, sz, other_val)
             vm.reg.set(loc, sz, eax_val)
 
-            if __debug__:
-                logger.debug('xchg eax=0x%x, %s=0x%x', eax_val, debug_register_operand(loc, sz), other_val)
-        else:
-            if __debug__:
-                logger.debug('xchg eax, eax')
-
         return True
 
     def rm_r(vm: CPU32, _8bit: bool) -> True:
@@ -604,17 +492,6 @@ class XCHG(Instruction):
             (type).set(loc, b_val)
             vm.reg.set(R[1], a_val)
 
-            if __debug__:
-                logger.debug(
-                    'xchg %s=%s, %s=%s',
-                    debug_operand(RM, sz), a_val,
-                    debug_operand(R, sz), b_val
-                )
-        else:
-            if __debug__:
-                dbg = debug_operand(RM, sz)
-                logger.debug('xchg %s, %s', dbg, dbg)
-
         return True
 
 
@@ -637,39 +514,17 @@ class CMPXCHG(Instruction):
         a = vm.reg.get(0, sz)  # AL/AX/EAX
         b = (type).get(loc, sz)
 
-        # BEGIN compare a and b
-        c = a + MAXVALS[sz] + 1 - b
-
-        sign_a = (a >> (sz * 8 - 1)) & 1
-        sign_b = (b >> (sz * 8 - 1)) & 1
-        sign_c = (c >> (sz * 8 - 1)) & 1
-
-        vm.reg.eflags.OF = (sign_a != sign_b) and (sign_a != sign_c)
-        vm.reg.eflags.CF = b > a
-        vm.reg.eflags.AF = (b & 255) > (a & 255)
-        vm.reg.eflags.SF = sign_c
-
-        c &= MAXVALS[sz]
-
-        vm.reg.eflags.ZF = c == 0
-        vm.reg.eflags.PF, parity(c)
-        # END compare a and b
+        c = a + MAXVALS[sz] + 1 - b  # compare a and b
+        vm.reg.lazy_flags = FLAGS_SUB, a, b, c, sz
 
         accumulator, temp = a, b
 
-        if vm.reg.eflags.ZF:
+        if a == b:  # ZF is set
             (type).set(loc, sz, vm.reg.get(R[1], sz))
         else:
             vm.reg.set(0, sz, temp)
             (type).set(loc, sz, temp)
 
-        if __debug__:
-            logger.debug(
-                'cmpxchg %s, %s',
-                debug_register_operand(0, sz),
-                debug_operand(RM, sz)
-            )
-
         return True
 
 
@@ -685,9 +540,6 @@ class CBW(Instruction):
     def cbwcwde(vm: CPU32) -> True:
         vm.reg.set(0, sign_extend(vm.reg.get(0, vm.operand_size // 2), vm.operand_size))
 
-        if __debug__:
-            logger.debug('cbw' if vm.operand_size == 2 else 'cwde')
-
         return True
 
 
@@ -703,9 +555,6 @@ class CMC(Instruction):
     def cmc(vm: CPU32) -> True:
         vm.reg.eflags.CF = not vm.reg.eflags.CF
 
-        if __debug__:
-            logger.debug('cmc')
-
         return True
 
 
@@ -725,8 +574,6 @@ class MOVS(Instruction):
         esi = vm.reg.get(6, vm.address_size)
         edi = vm.reg.get(7, vm.address_size)
 
-        esi_init = esi
-
         old_override = vm.mem.segment_override
         vm.mem.segment_override = SegmentRegs.DS
         esi_mem = vm.mem.get(esi, sz)
@@ -749,13 +596,6 @@ class MOVS(Instruction):
         vm.reg.set(6, vm.address_size, esi)
         vm.reg.set(7, vm.address_size, edi)
 
-        if __debug__:
-            logger.debug(
-                'movs%s [edi]:=0x%x, [esi=0x%x]',
-                'b' if sz == 1 else ('w' if sz == 2 else 'd'),
-                esi_mem, esi_init
-            )
-
         return True
 
 
@@ -776,9 +616,6 @@ class CWD(Instruction):
         vm.reg.set(2, sz, tmp >> (sz * 8))  # DX/EDX
         vm.reg.set(0, sz, tmp & MAXVALS[sz])  # AX/EAX
 
-        if __debug__:
-            logger.debug('cwd' if sz == 2 else 'cdq')
-
         return True
 
 
@@ -797,9 +634,6 @@ class CLC(Instruction):
     def set_stuff(vm: CPU32, flag: str, val: int) -> True:
         setattr(vm.reg.eflags, flag, val)
 
-        if __debug__:
-            logger.debug('%s%s', ('cl', 'st')[val], flag[0])
-
         return True
 
 
@@ -827,18 +661,9 @@ class BitScan(Instruction):
 
         SRC = (type).get(loc, sz)
 
-        if __debug__:
-            SRC_orig = SRC
-
         if SRC == 0:
             vm.reg.eflags.ZF = 1
 
-            if __debug__:
-                logger.debug(
-                    'bsf %s, %s=%08x',
-                    debug_operand(RM, sz), debug_register_operand(loc, sz), SRC_orig
-                )
-
             return True
 
         vm.reg.eflags.ZF = 0
@@ -850,10 +675,4 @@ class BitScan(Instruction):
 
         vm.reg.set(R[1], sz, temp)
 
-        if __debug__:
-            logger.debug(
-                'bsf %s, %s=%08x',
-                debug_operand(RM, sz), debug_register_operand(loc, sz), SRC_orig
-            )
-
         return True
@@ -2,10 +2,6 @@ from ..util import Instruction, SegmentRegs
 
 from functools import partialmethod as P
 
-if __debug__:
-    import logging
-    logger = logging.getLogger(__name__)
-
 MAXVALS = [None, (1 << 8) - 1, (1 << 16) - 1, None, (1 << 32) - 1]  # MAXVALS[n] is the maximum value of an unsigned n-bit number
 SIGNS   = [None, 1 << 8 - 1, 1 << 16 - 1, None, 1 << 32 - 1]  # SIGNS[n] is the maximum absolute value of a signed n-bit number
 
@@ -39,15 +35,54 @@ class STOS(Instruction):
 
         vm.reg.set(7, vm.address_size, edi)
 
-        if __debug__:
-            logger.debug(
-                'stos%s [0x%x], eax=0x%x',
-                'b' if sz == 1 else ('w' if sz == 2 else 'd'), edi, eax
-            )
-
         return True
 
 
+def rep_bulk(vm, opcode: int, count: int) -> bool:
+    """
+    Execute `count` iterations of STOS or MOVS as one memory operation and update (E)SI and (E)DI accordingly.
+    :return: False if this can't be done in one step (16-bit addressing, the operation wraps around
+        the address space or the source and destination of MOVS overlap); nothing is changed then
+    """
+    if vm.address_size != 4:
+        return False
+
+    sz = 1 if opcode in (0xAA, 0xA4) else vm.operand_size
+    total = count * sz
+    step = -sz if vm.reg.eflags.DF else sz
+
+    edi = vm.reg.get(7, 4)
+    dst = edi if step > 0 else edi - total + sz  # the lowest address to be written
+    if dst < 0 or dst + total > MAXVALS[4] + 1:
+        return False
+
+    mem = vm.mem
+
+    mem.segment_override = SegmentRegs.ES
+    dst = mem.calc_address(dst) - mem.base
+    mem.segment_override = SegmentRegs.DS
+
+    if opcode in (0xAA, 0xAB):  # STOS
+        mem.memfill(dst, vm.reg.get(0, sz), sz, count)
+    else:  # MOVS
+        esi = vm.reg.get(6, 4)
+        src = esi if step > 0 else esi - total + sz
+        if src < 0 or src + total > MAXVALS[4] + 1:
+            return False
+
+        src = mem.calc_address(src) - mem.base
+        if src < dst + total and dst < src + total:
+            # element-by-element copying of overlapping areas isn't the same as `memmove`
+            return False
+
+        mem.memmove(dst, src, total)
+        vm.reg.set(6, 4, (esi + step * count) & MAXVALS[4])
+
+    vm.reg.set(7, 4, (edi + step * count) & MAXVALS[4])
+
+    return True
+
+
 class REP(Instruction):
     def __init__(self):
         self.opcodes = {
@@ -55,7 +90,7 @@ class REP(Instruction):
         }
 
     def m(vm) -> True:
-        opcode = vm.mem.get(vm.eip, 1)
+        opcode = vm.mem.get8(vm.eip)
         orig_eip = vm.eip
 
         sz = vm.address_size
@@ -71,8 +106,11 @@ class REP(Instruction):
 
             return True
 
-        if __debug__:
-            logger.debug('rep ecx=%d, opcode=0x%02x', ecx, opcode)
+        if opcode in {0xa4, 0xa5, 0xaa, 0xab} and rep_bulk(vm, opcode, ecx):
+            vm.eip += 1
+            vm.reg.set(1, sz, 0)
+
+            return True
 
         while ecx != 0:
             ecx -= 1
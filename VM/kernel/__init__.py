@@ -1,4 +1,6 @@
 from . import kernel_filesystem, kernel_memory, kernel_sys
 from .kernel import Kernel, Int, Uint
+from .descriptorTable import DescriptorTable
+from .vfs import HostFS, MemoryFS
 
-__all__ = 'Kernel', 'Int', 'Uint'
+__all__ = 'Kernel', 'Int', 'Uint', 'DescriptorTable', 'HostFS', 'MemoryFS'
@@ -0,0 +1,79 @@
+"""
+The guest's file descriptor table.
+"""
+
+from heapq import heappush, heappop
+
+__all__ = 'DescriptorTable',
+
+
+class DescriptorTable(list):
+    """
+    File objects indexed by the guest's file descriptors; closed descriptors hold `None`.
+
+    `open` reuses the lowest closed descriptor, like POSIX requires, which is found in a min-heap
+    of closed descriptors instead of by scanning the table. The table can be changed like a list as well,
+    but such changes aren't seen by `open` and the statistics.
+    """
+    __slots__ = 'closed_descriptors', 'open_count', 'opened', 'peak'
+
+    def __init__(self, files=()):
+        super().__init__(files)
+
+        self.closed_descriptors = [fd for fd, file in enumerate(self) if file is None]  # sorted, so it's a heap
+        self.open_count = len(self) - len(self.closed_descriptors)
+        self.opened = 0  # the number of calls to `open`
+        self.peak = self.open_count
+
+    def get(self, fd: int):
+        """
+        :return: the file object of `fd` or `None` if there's no such open descriptor
+        """
+        if 0 <= fd < len(self):
+            return self[fd]
+
+        return None
+
+    def open(self, file) -> int:
+        """
+        Give `file` the lowest free descriptor.
+        :return: the descriptor
+        """
+        closed = self.closed_descriptors
+
+        while closed:
+            fd = heappop(closed)
+            if fd < len(self) and self[fd] is None:  # it might have been reused by assigning to it
+                self[fd] = file
+                break
+        else:
+            fd = len(self)
+            self.append(file)
+
+        self.open_count += 1
+        self.opened += 1
+        if self.open_count > self.peak:
+            self.peak = self.open_count
+
+        return fd
+
+    def close(self, fd: int):
+        """
+        Free the descriptor `fd`. The file itself isn't closed.
+        :return: the file object of `fd` or `None` if it wasn't open
+        """
+        file = self.get(fd)
+
+        if file is not None:
+            self[fd] = None
+            heappush(self.closed_descriptors, fd)
+            self.open_count -= 1
+
+        return file
+
+    def stats(self) -> dict:
+        """
+        :return: the number of open descriptors, the largest number of them open at once
+        and the number of descriptors opened with `open`
+        """
+        return {'open': self.open_count, 'peak': self.peak, 'opened': self.opened}
@@ -0,0 +1,207 @@
+"""
+Free blocks of the guest address space below the program break.
+
+`sys_munmap` gives the blocks it can't return to the program break to `FreeBlocks`, `sys_mmap` takes
+the smallest block that's large enough (best fit) and `sys_brk` drops the blocks above the new break.
+
+The blocks are kept in two sorted containers: by address (`starts`, with the ends in the `ends` dictionary),
+to find the neighbours a freed block is coalesced with, and by size (`sizes`, `(size, start)` pairs),
+to find the best fit. The containers are split into short lists, so that adding and removing a block
+doesn't move all the blocks after it, like a single list would.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+
+__all__ = 'FreeBlocks',
+
+
+class SortedList:
+    """
+    A sorted list of unique items split into buckets of at most `2 * LOAD` items.
+    `maxes` holds the last item of each bucket, so a bucket is found by bisecting it and then bisecting the bucket.
+    """
+    LOAD = 256
+
+    def __init__(self, items=()):
+        self.buckets, self.maxes = [], []
+
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def __bool__(self):
+        return bool(self.maxes)
+
+    def __iter__(self):
+        return chain.from_iterable(self.buckets)
+
+    def copy(self) -> 'SortedList':
+        copy = type(self)()
+        copy.buckets, copy.maxes = [list(bucket) for bucket in self.buckets], list(self.maxes)
+
+        return copy
+
+    def add(self, item) -> None:
+        buckets, maxes = self.buckets, self.maxes
+
+        if not maxes:
+            buckets.append([item])
+            maxes.append(item)
+            return
+
+        index = bisect_left(maxes, item)
+        if index == len(maxes):
+            index -= 1
+            bucket = buckets[index]
+            bucket.append(item)
+            maxes[index] = item
+        else:
+            bucket = buckets[index]
+            insort(bucket, item)
+
+        if len(bucket) > 2 * self.LOAD:
+            buckets.insert(index + 1, bucket[self.LOAD:])
+            del bucket[self.LOAD:]
+            maxes.insert(index, bucket[-1])
+
+    def remove(self, item) -> None:
+        buckets, maxes = self.buckets, self.maxes
+
+        index = bisect_left(maxes, item)
+        bucket = buckets[index]
+        position = bisect_left(bucket, item)
+        del bucket[position]
+
+        if not bucket:
+            del buckets[index], maxes[index]
+        elif position == len(bucket):
+            maxes[index] = bucket[-1]
+
+    def floor(self, item):
+        """
+        :return: the largest item that's less than or equal to `item` or `None` if there's no such item
+        """
+        index = bisect_left(self.maxes, item)
+
+        if index < len(self.maxes):
+            bucket = self.buckets[index]
+            position = bisect_right(bucket, item)
+            if position:
+                return bucket[position - 1]
+
+        return self.maxes[index - 1] if index else None
+
+    def ceiling(self, item):
+        """
+        :return: the smallest item that's greater than or equal to `item` or `None` if there's no such item
+        """
+        index = bisect_left(self.maxes, item)
+        if index == len(self.maxes):
+            return None
+
+        bucket = self.buckets[index]
+        return bucket[bisect_left(bucket, item)]
+
+    def last(self):
+        return self.maxes[-1]
+
+
+class FreeBlocks:
+    def __init__(self, blocks=()):
+        """
+        :param blocks: `(start, end)` pairs, `end` not included
+        """
+        self.starts, self.sizes = SortedList(), SortedList()
+        self.ends = {}  # start -> end
+
+        for start, end in blocks:
+            self.free(start, end)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def __iter__(self):
+        return ((start, self.ends[start]) for start in self.starts)
+
+    def __repr__(self):
+        blocks = ', '.join(f'0x{start:08x}-0x{end:08x}' for start, end in self)
+        return f'{type(self).__name__}([{blocks}])'
+
+    def copy(self) -> 'FreeBlocks':
+        copy = type(self)()
+        copy.starts, copy.sizes, copy.ends = self.starts.copy(), self.sizes.copy(), dict(self.ends)
+
+        return copy
+
+    def insert(self, start: int, end: int) -> None:
+        self.ends[start] = end
+        self.starts.add(start)
+        self.sizes.add((end - start, start))
+
+    def remove(self, start: int) -> tuple:
+        end = self.ends.pop(start)
+        self.starts.remove(start)
+        self.sizes.remove((end - start, start))
+
+        return start, end
+
+    def allocate(self, size: int):
+        """
+        Take `size` bytes from the smallest block that has enough of them.
+        :return: the address of the allocated memory or `None` if there's no such block
+        """
+        best = self.sizes.ceiling((size,))
+        if best is None:
+            return None
+
+        available, start = best
+        _, end = self.remove(start)
+
+        if available > size:
+            self.insert(start + size, end)
+
+        return start
+
+    def free(self, start: int, end: int) -> None:
+        """
+        Add the block `start`-`end` and merge it with the blocks it touches or overlaps.
+        """
+        if start >= end:
+            return
+
+        previous = self.starts.floor(start)
+        if previous is not None and self.ends[previous] >= start:
+            _, previous_end = self.remove(previous)
+            start, end = previous, max(end, previous_end)
+
+        following = self.starts.ceiling(start)
+        while following is not None and following <= end:
+            _, next_end = self.remove(following)
+            end = max(end, next_end)
+            following = self.starts.ceiling(following)
+
+        self.insert(start, end)
+
+    def truncate(self, limit: int) -> None:
+        """
+        Drop the free memory at `limit` and above.
+        """
+        starts = self.starts
+
+        while starts and starts.last() >= limit:
+            self.remove(starts.last())
+
+        if starts and self.ends[starts.last()] > limit:
+            start, _ = self.remove(starts.last())
+            self.insert(start, limit)
+
+    def last(self) -> tuple:
+        """
+        :return: `(start, end)` of the block with the highest address
+        """
+        start = self.starts.last()
+
+        return start, self.ends[start]
@@ -1,6 +1,10 @@
+import weakref
 from typing import Callable
 
 from ..ctypes_types import dword as Int, udword as Uint
+from .freeBlocks import FreeBlocks
+from .outputBuffer import OutputBuffer
+from .vfs import HostFS
 
 
 import logging
@@ -33,9 +37,12 @@ class Kernel(metaclass=KernelMeta):
     reg_numbers = [3, 1, 2, 6, 7]  # ebx, ecx, edx, esi, edi
     syscalls = {}
 
-    def __init__(self, cpu):
+    def __init__(self, cpu, fs=None):
         self.cpu = cpu
-        self.free_memory_blocks = []
+        self.free_memory_blocks = FreeBlocks()
+        self.output = OutputBuffer(cpu)
+        self.fs = HostFS() if fs is None else fs  # the filesystem the guest opens files in, see `vfs`
+        self.opened_files = weakref.WeakKeyDictionary()  # file object -> (path, mode) it was opened with by `sys_open`
         
     def __getitem__(self, syscall_number: int):
         try:
@@ -1,5 +1,6 @@
+import enum
 import os
-from io import UnsupportedOperation
+from io import TextIOBase, UnsupportedOperation
 
 from ..ctypes_types import udword, ctypes
 from .kernel import Kernel, Int, Uint
@@ -7,6 +8,9 @@ from .kernel import Kernel, Int, Uint
 import logging
 logger = logging.getLogger(__name__)
 
+# `os.readv` isn't available on Windows
+_readv = getattr(os, 'readv', None)
+
 
 class StructIovec(ctypes.LittleEndianStructure):
     """
@@ -23,66 +27,58 @@ class StructIovec(ctypes.LittleEndianStructure):
     ]
 
 
+class O_MODE(enum.IntFlag):
+    """
+    File access modes.
+    See: https://github.com/torvalds/linux/blob/master/include/uapi/asm-generic/fcntl.h
+    """
+    O_ACCMODE = 0o00000003
+    O_RDONLY = 0o00000000
+    O_WRONLY = 0o00000001
+    O_RDWR = 0o00000002
+    O_CREAT = 0o00000100  # not fcntl
+    O_EXCL = 0o00000200  # not fcntl
+    O_NOCTTY = 0o00000400  # not fcntl
+    O_TRUNC = 0o00001000  # not fcntl
+    O_APPEND = 0o00002000
+    O_NONBLOCK = 0o00004000
+    O_DSYNC = 0o00010000  # used to be O_SYNC, see below
+    FASYNC = 0o00020000  # fcntl, for BSD compatibility
+    O_DIRECT = 0o00040000  # direct disk access hint
+    O_LARGEFILE = 0o00100000
+    O_DIRECTORY = 0o00200000  # must be a directory
+    O_NOFOLLOW = 0o00400000  # don't follow links
+    O_NOATIME = 0o01000000
+    O_CLOEXEC = 0o02000000  # set close_on_exec
+
+    _O_SYNC = 0o04000000
+    O_SYNC = (_O_SYNC | O_DSYNC)
+    O_PATH = 0o010000000
+
+    _O_TMPFILE = 0o020000000
+    # a horrid kludge trying to make sure that this will fail on old kernels
+    O_TMPFILE = (_O_TMPFILE | O_DIRECTORY)
+    O_TMPFILE_MASK = (_O_TMPFILE | O_DIRECTORY | O_CREAT)
+
+
 @Kernel.register(0x05)
 def sys_open(kernel: Kernel, pathname_addr: Uint, flags: Int, mode: Uint):
     """
     int open(const char *pathname, int flags, mode_t mode);
     """
 
-    import enum
-
-    class O_MODE(enum.IntFlag):
-        """
-        File access modes.
-        See: https://github.com/torvalds/linux/blob/master/include/uapi/asm-generic/fcntl.h
-        """
-        O_ACCMODE = 0o00000003
-        O_RDONLY = 0o00000000
-        O_WRONLY = 0o00000001
-        O_RDWR = 0o00000002
-        O_CREAT = 0o00000100  # not fcntl
-        O_EXCL = 0o00000200  # not fcntl
-        O_NOCTTY = 0o00000400  # not fcntl
-        O_TRUNC = 0o00001000  # not fcntl
-        O_APPEND = 0o00002000
-        O_NONBLOCK = 0o00004000
-        O_DSYNC = 0o00010000  # used to be O_SYNC, see below
-        FASYNC = 0o00020000  # fcntl, for BSD compatibility
-        O_DIRECT = 0o00040000  # direct disk access hint
-        O_LARGEFILE = 0o00100000
-        O_DIRECTORY = 0o00200000  # must be a directory
-        O_NOFOLLOW = 0o00400000  # don't follow links
-        O_NOATIME = 0o01000000
-        O_CLOEXEC = 0o02000000  # set close_on_exec
-
-        _O_SYNC = 0o04000000
-        O_SYNC = (_O_SYNC | O_DSYNC)
-        O_PATH = 0o010000000
-
-        _O_TMPFILE = 0o020000000
-        # a horrid kludge trying to make sure that this will fail on old kernels
-        O_TMPFILE = (_O_TMPFILE | O_DIRECTORY)
-        O_TMPFILE_MASK = (_O_TMPFILE | O_DIRECTORY | O_CREAT)
-
     def open_file(name: str, mode: str):
-        # find empty descriptor, starting from 3
-        descriptor = -1
-        for descr, file in enumerate(kernel.cpu.descriptors):
-            if file is None:
-                # found empty descriptor
-                # print('found empty descriptor')
-                descriptor = descr
-                break
-
-        if descriptor == -1:  # no empty descriptors found
-            descriptor = len(kernel.cpu.descriptors)
-            # print(f'opening new descriptor: {descriptor}')
-            kernel.cpu.descriptors.append(open(name, mode))
-        else:
-            # print(f'reusing existing descriptor: {descriptor}')
-            kernel.cpu.descriptors[descriptor] = open(name, mode)
+        try:
+            file = kernel.fs.open(name, mode)
+        except OSError:
+            logger.info('\tsys_open: [ERR] failed to open %r with mode %r', name, mode)
+            return -1
+
+        kernel.opened_files[file] = name, mode
+
+        return kernel.cpu.descriptors.open(file)
 
-        return descriptor
+    kernel.output.flush()
 
     pathname = kernel.kernel_read_string(pathname_addr).decode()
     flags = O_MODE(flags)
@@ -90,7 +86,7 @@ def sys_open(kernel: Kernel, pathname_addr: Uint, flags: Int, mode: Uint):
     logger.info('sys_open(const char *pathname=%r, int flags=%s, mode_t mode=%s)', pathname, flags, mode)
 
     if flags & O_MODE.O_RDONLY:
-        if not os.path.exists(pathname):
+        if not kernel.fs.exists(pathname):
             return -1
 
         descr = open_file(pathname, 'r')
@@ -138,16 +134,17 @@ def sys_close(kernel: Kernel, fd: Uint):
 
     logger.info('sys_close(unsigned int fd = %u)', fd)
 
-    if fd >= len(kernel.cpu.descriptors):
-        logger.info('\tsys_close: [ERR] descriptor %u not found', fd)
+    if kernel.cpu.descriptors.get(fd) is None:
+        logger.info('\tsys_close: [ERR] descriptor %u not open', fd)
         return -1  # error
 
-    if kernel.cpu.descriptors[fd] is None:  # kernel.cpu.descriptors[fd].closed:
-        logger.info('\tsys_close: [ERR] descriptor %u already closed', fd)
-        return -1  # error
+    kernel.output.flush(fd)
+    kernel.cpu.descriptors.close(fd).close()
 
-    kernel.cpu.descriptors[fd].close()
-    kernel.cpu.descriptors[fd] = None
+    error = kernel.output.error(fd)
+    if error:
+        logger.info('\tsys_close: [ERR] buffered output of descriptor %u was lost', fd)
+        return error
 
     logger.info('\tsys_close: [SUCC] descriptor %u closed', fd)
 
@@ -164,8 +161,10 @@ def sys_unlink(kernel: Kernel, pathname_addr: Uint):
 
     logger.info('sys_unlink(const char * pathname = %r)', pathname)
 
+    kernel.output.flush()
+
     try:
-        os.unlink(pathname)
+        kernel.fs.unlink(pathname)
     except OSError:
         ret = -1
         logger.info('\tsys_unlink: [ERR] failed to unlink %r', pathname)
@@ -178,21 +177,55 @@ def sys_unlink(kernel: Kernel, pathname_addr: Uint):
 
 @Kernel.register(0x03)
 def sys_read(kernel: Kernel, fd: Uint, data_addr: Uint, count: Uint):
+    """
+    ssize_t read(int fd, void *buf, size_t count);
+
+    The data is read straight into the guest's memory.
+    """
+
     logger.info('sys_read(unsigned int fd = %u, char *dest = 0x%08x, size_t count = %u)', fd, data_addr, count)
 
+    kernel.output.flush()  # the prompt must be visible before reading the answer
+
+    file = kernel.cpu.descriptors.get(fd)
+    if file is None:
+        logger.info('\tsys_read: [ERR] descriptor %u not found', fd)
+        return -1
+
     try:
-        data = os.read(kernel.cpu.descriptors[fd].fileno(), count)
+        fileno = file.fileno()
     except (AttributeError, UnsupportedOperation):
-        data = (kernel.cpu.descriptors[fd].read(count) + '\n').encode('ascii')
-    except:
+        fileno = None
+
+    if fileno is None and isinstance(file, TextIOBase):
+        data = file.read(count).encode('ascii')  # an empty string at the end of the stream
+
+        l = len(data)
+        if l:
+            kernel.cpu.mem.set_bytes(data_addr, l, data)
+        logger.info('\tsys_read: [SUCC] read %r from fd %u', data, fd)
+
+        return l
+
+    def readinto(buffer) -> int:
+        if fileno is None:
+            return file.readinto(buffer)  # binary file objects, like `io.BytesIO`
+
+        if _readv is not None:
+            return _readv(fileno, [buffer])
+
+        data = os.read(fileno, len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    try:
+        l = kernel.cpu.mem.write_from(data_addr, count, readinto)
+    except (OSError, ValueError):
         logger.error('\tsys_read: [ERR] failed to read %u bytes from descriptor %u', count, fd)
 
         return -1
 
-    logger.info('\tsys_read: [SUCC] read %r from fd %u', data, fd)
-
-    l = len(data)
-    kernel.cpu.mem.set_bytes(data_addr, l, data)
+    logger.info('\tsys_read: [SUCC] read %d bytes from fd %u', l, fd)
 
     return l
 
@@ -201,20 +234,19 @@ def sys_read(kernel: Kernel, fd: Uint, data_addr: Uint, count: Uint):
 def sys_write(kernel: Kernel, fd: Uint, buf_addr: Uint, count: Uint):
     """
     Arguments: (unsigned int fd, const char * buf, size_t count)
+
+    The data is buffered, see `OutputBuffer`.
     """
 
     buf = kernel.cpu.mem.get_bytes(buf_addr, count)
 
     logger.info('sys_write(%d, 0x%08x(%s), %d)', fd, buf_addr, buf, count)
-    try:
-        fileno = kernel.cpu.descriptors[fd].fileno()
-        ret = os.write(fileno, buf)
-        # os.fsync(fileno)
-    except (AttributeError, UnsupportedOperation):
-        ret = kernel.cpu.descriptors[fd].write(buf.decode('ascii'))
-        kernel.cpu.descriptors[fd].flush()
 
-    return ret if ret is not None else count
+    if kernel.cpu.descriptors.get(fd) is None:
+        logger.info('\tsys_write: [ERR] descriptor %u not found', fd)
+        return -1
+
+    return kernel.output.write(fd, [buf])
 
 
 @Kernel.register(0x92)
@@ -234,7 +266,11 @@ def sys_writev(kernel: Kernel, fd: Int, iov_addr: Uint, iovcnt: Int):
 
     logger.info('sys_writev(fd=%d, iov=0x%x, iovcnt=%d)', fd, iov_addr, iovcnt)
 
-    size = 0
+    if kernel.cpu.descriptors.get(fd) is None:
+        logger.info('\tsys_writev: [ERR] descriptor %d not found', fd)
+        return -1
+
+    chunks = []
     for x in range(iovcnt):
         iovec = StructIovec.from_address(kernel.cpu.mem.calc_address(iov_addr))
 
@@ -243,24 +279,47 @@ def sys_writev(kernel: Kernel, fd: Int, iov_addr: Uint, iovcnt: Int):
             iovec.iov_base, iovec.iov_len
         )
 
-        if not iovec.iov_len:
-            iov_addr += ctypes.sizeof(StructIovec)
-            continue
+        if iovec.iov_len:
+            buf = kernel.cpu.mem.get_bytes(iovec.iov_base, iovec.iov_len)
+            logger.info('iov_%d=0x%08x; iov_len=%d, buf=%s', x, iovec.iov_base, iovec.iov_len, buf)
 
-        buf = kernel.cpu.mem.get_bytes(iovec.iov_base, iovec.iov_len)
+            chunks.append(buf)
 
-        logger.info('iov_%d=0x%08x; iov_len=%d, buf=%s', x, iovec.iov_base, iovec.iov_len, buf)
+        iov_addr += ctypes.sizeof(StructIovec)  # address of the next struct!
 
-        try:
-            ret = os.write(kernel.cpu.descriptors[fd].fileno(), buf)
-        except (AttributeError, UnsupportedOperation):
-            ret = kernel.cpu.descriptors[fd].write(buf.decode('ascii'))
-            kernel.cpu.descriptors[fd].flush()
+    return kernel.output.write(fd, chunks)
 
-        size += ret if ret is not None else iovec.iov_len
-        iov_addr += ctypes.sizeof(StructIovec)  # address of the next struct!
 
-    return size
+@Kernel.register(0x76)
+def sys_fsync(kernel: Kernel, fd: Uint):
+    """
+    int fsync(int fd);
+
+    Writes the buffered output of `fd` to the host file and the host file to disk.
+    """
+
+    logger.info('sys_fsync(int fd = %u)', fd)
+
+    if kernel.cpu.descriptors.get(fd) is None:
+        logger.info('\tsys_fsync: [ERR] descriptor %u not found', fd)
+        return -1
+
+    kernel.output.flush(fd)
+
+    error = kernel.output.error(fd)
+    if error:
+        logger.info('\tsys_fsync: [ERR] buffered output of descriptor %u was lost', fd)
+        return error
+
+    try:
+        os.fsync(kernel.cpu.descriptors[fd].fileno())
+    except (AttributeError, UnsupportedOperation):
+        pass  # not a host file, nothing to sync
+    except OSError:  # pipes, terminals
+        logger.info('\tsys_fsync: [ERR] descriptor %u can\'t be synced', fd)
+        return -1
+
+    return 0
 
 
 @Kernel.register(0x8c)
@@ -279,20 +338,28 @@ def sys_llseek(kernel: Kernel, fd: Uint, offset_high: Uint, offset_low: Uint, re
 
     offset = (offset_high << 32) | offset_low
 
+    kernel.output.flush()
+
+    file = kernel.cpu.descriptors[fd]
+
     try:
-        descriptor = kernel.cpu.descriptors[fd].fileno()
+        descriptor = file.fileno()
     except AttributeError:
-        kernel.cpu.mem.set(result_addr, 4, 0)
+        kernel.cpu.mem.set32(result_addr, 0)
         return 0
+    except UnsupportedOperation:  # not a host file, like the files of `vfs.MemoryFS`
+        seek = file.seek
+    else:
+        seek = lambda offset, whence: os.lseek(descriptor, offset, whence)
 
     try:
-        os.lseek(descriptor, offset & 0xFFFFFFFF, whence)
+        seek(offset & 0xFFFFFFFF, whence)
         ret = 0
     except OSError:
-        kernel.cpu.mem.set(result_addr, 4, -1)
+        kernel.cpu.mem.set32(result_addr, -1)
         return -1
     else:
-        kernel.cpu.mem.set(result_addr, 4, ret)
+        kernel.cpu.mem.set32(result_addr, ret)
 
     # return success
     return ret
@@ -1,5 +1,6 @@
 from .kernel import Kernel, Int, Uint
 
+import enum
 from ctypes import LittleEndianStructure, c_uint32, sizeof
 
 import logging
@@ -9,6 +10,23 @@ logger = logging.getLogger(__name__)
 udword = c_uint32.__ctype_le__
 
 
+class MAP_FLAGS(enum.Flag):
+    # see http://people.seas.harvard.edu/~apw/sreplay/src/linux/mmap.c
+    MAP_SHARED    = 0x01   # Share changes
+    MAP_PRIVATE   = 0x02   # Changes are private.
+    MAP_FIXED     = 0x10   # Interpret addr exactly.
+    MAP_FILE      = 0
+    MAP_ANONYMOUS = 0x20   # Don't use a file.
+
+
+class MAP_PROT(enum.Flag):
+    # see above
+    PROT_READ  = 0x1  # Page can be read.
+    PROT_WRITE = 0x2  # Page can be written.
+    PROT_EXEC  = 0x4  # Page can be executed.
+    PROT_NONE  = 0x0  # Page can not be accessed.
+
+
 class structUserDesc(LittleEndianStructure):
     _pack_ = 1
     _fields_ = [
@@ -110,7 +128,7 @@ def sys_set_thread_area(kernel: Kernel, u_info_addr: Uint):
 
             break
 
-    kernel.cpu.mem.set(u_info_addr, 4, selector_index)  # set address of new selector
+    kernel.cpu.mem.set32(u_info_addr, selector_index)  # set address of new selector
     # return success (0) or error (-1)
     return 0
 
@@ -126,7 +144,7 @@ def sys_set_tid_address(kernel: Kernel, tidptr: Uint):
     :return: always returns the caller's thread ID.
     """
 
-    tid = kernel.cpu.mem.get(tidptr, 4)
+    tid = kernel.cpu.mem.get32(tidptr)
 
     logger.info('sys_set_tid_address(tidptr=0x%08x (tid=%d))', tidptr, tid)
 
@@ -163,19 +181,8 @@ def sys_brk(kernel: Kernel, brk: Uint):
         return kernel.cpu.mem.program_break
 
     if oldbrk > newbrk:
-        # Remove invalid free blocks, if any.
-        # A block is invalid if its starting address is greater or equal to the new BRK.
-        cutoff = len(kernel.free_memory_blocks)
-        for cutoff in range(cutoff - 1, -1, -1):
-            s, e = kernel.free_memory_blocks[cutoff]
-
-            if s < newbrk <= e:
-                kernel.free_memory_blocks[cutoff] = s, newbrk
-                cutoff -= 1
-                break
-
-        # `kernel.free_memory_blocks` is sorted, so `cutoff` chops off the invalid blocks
-        kernel.free_memory_blocks = kernel.free_memory_blocks[:cutoff]
+        # Free blocks at and above the new break don't exist anymore
+        kernel.free_memory_blocks.truncate(newbrk)
 
     kernel.cpu.mem.program_break = brk
 
@@ -196,50 +203,23 @@ def sys_mmap(kernel: Kernel, addr: Uint, length: Uint, prot: Int, flags: Int, fd
     See: http://www.man7.org/linux/man-pages/man2/mmap2.2.html
     """
 
-    import enum
-
-    class MAP_FLAGS(enum.Flag):
-        # see http://people.seas.harvard.edu/~apw/sreplay/src/linux/mmap.c
-        MAP_SHARED    = 0x01   # Share changes
-        MAP_PRIVATE   = 0x02   # Changes are private.
-        MAP_FIXED     = 0x10   # Interpret addr exactly.
-        MAP_FILE      = 0
-        MAP_ANONYMOUS = 0x20   # Don't use a file.
-
-    class MAP_PROT(enum.Flag):
-        # see above
-        PROT_READ  = 0x1  # Page can be read.
-        PROT_WRITE = 0x2  # Page can be written.
-        PROT_EXEC  = 0x4  # Page can be executed.
-        PROT_NONE  = 0x0  # Page can not be accessed.
-
     flags = MAP_FLAGS(flags)
     prot = MAP_PROT(prot)
 
     logger.info(
         'mmap(void *addr=0x%08x, size_t length=%d, int prot=%s, int flags=%s, int fd=%d, off_t offset=%d)',
-        addr, length, str(prot), str(flags), fd, -1
+        addr, length, prot, flags, fd, -1
     )
 
     if flags & MAP_FLAGS.MAP_ANONYMOUS:
         # TODO: Do something with protection?
 
-        for i, (start, end) in enumerate(kernel.free_memory_blocks):
-            assert end >= start
-
-            if end - start == length:
-                kernel.free_memory_blocks.pop(i)
+        start = kernel.free_memory_blocks.allocate(length)
 
-                logger.info('\tmmap: [SUCC] found exactly %d bytes of free space', length)
-                return kernel.cpu.mem.memset(start, 0, length)
+        if start is not None:
+            logger.info('\tmmap: [SUCC] found %d bytes of free space at 0x%08x', length, start)
 
-            if end - start > length:
-                _end = start + length
-                kernel.free_memory_blocks[i] = _end, end
-
-                logger.info('\tmmap: [SUCC] found more than %d bytes of free space', length)
-
-                return kernel.cpu.mem.memset(start, 0, length)
+            return kernel.cpu.mem.memset(start, 0, length)
 
         old_brk = kernel.cpu.mem.memset(kernel.cpu.mem.program_break, 0, length)
         kernel.cpu.mem.program_break += length
@@ -253,30 +233,6 @@ def sys_mmap(kernel: Kernel, addr: Uint, length: Uint, prot: Int, flags: Int, fd
     return -1
 
 
-def _munmap_fuse_memory_blocks(kernel: Kernel):
-    kernel.free_memory_blocks.sort()
-
-    did_fuse = True
-
-    while did_fuse:
-        did_fuse = False
-
-        for i in range(len(kernel.free_memory_blocks) - 1):
-            fst, snd = kernel.free_memory_blocks[i], kernel.free_memory_blocks[i + 1]
-
-            if fst[0] <= snd[0] and snd[1] <= fst[1]:  # snd contained in fst
-                kernel.free_memory_blocks[i] = None
-                kernel.free_memory_blocks[i + 1] = fst
-                did_fuse = True
-            elif fst[0] <= snd[0] <= fst[1] < snd[1]:  # fst intersects snd
-                kernel.free_memory_blocks[i] = None
-                kernel.free_memory_blocks[i + 1] = fst[0], snd[1]
-                did_fuse = True
-
-        if did_fuse:
-            kernel.free_blocks = sorted(filter(None, kernel.free_memory_blocks))
-
-
 @Kernel.register(0x5b)
 def sys_munmap(kernel: Kernel, addr: Uint, length: Uint):
     """
@@ -295,17 +251,18 @@ def sys_munmap(kernel: Kernel, addr: Uint, length: Uint):
             length, addr
         )
     else:
-        kernel.free_memory_blocks.append((s, e))
-        _munmap_fuse_memory_blocks(kernel)
+        kernel.free_memory_blocks.free(s, e)
 
         logger.info(
             'munmap: [SUCC] unmapping %d bytes at 0x%08x inside mapped area',
             length, addr
         )
 
-    if kernel.free_memory_blocks and kernel.free_memory_blocks[-1][1] >= kernel.cpu.mem.program_break:
-        kernel.cpu.mem.program_break = kernel.free_memory_blocks[-1][0]
-        kernel.free_memory_blocks.pop()
+    blocks = kernel.free_memory_blocks
+    if blocks and blocks.last()[1] >= kernel.cpu.mem.program_break:
+        # the break goes down to the free memory just below it
+        start, _ = blocks.remove(blocks.last()[0])
+        kernel.cpu.mem.program_break = start
 
     logger.info('munmap: [SUCC] unmapped %d bytes at 0x%08x', length, addr)
 
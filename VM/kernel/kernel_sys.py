@@ -198,15 +198,15 @@ def sys_exit(kernel: Kernel, code: Int):
     else:
         logger.info('sys_exit: no memory to deallocate')
 
+    kernel.output.flush()
+
     logger.info('sys_exit: closing file descriptors...')
     closed = 0
-    for i, descr in enumerate(kernel.cpu.descriptors[3:], 3):
-        if descr is not None:
-            if not descr.closed:
-                closed += 1
-                kernel.cpu.descriptors[i].close()
-            kernel.cpu.descriptors[i] = None
-    kernel.cpu.descriptors = list(filter(None, kernel.cpu.descriptors))
+    for fd in range(3, len(kernel.cpu.descriptors)):
+        descr = kernel.cpu.descriptors.close(fd)
+        if descr is not None and not descr.closed:
+            closed += 1
+            descr.close()
     if closed > 0:
         logger.info('sys_exit: closed %d file descriptors', closed)
     else:
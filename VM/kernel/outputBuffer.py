@@ -0,0 +1,113 @@
+"""
+Buffered output of the guest.
+
+`sys_write` and `sys_writev` don't write to the host right away: `OutputBuffer` collects the data
+written to a guest file descriptor and writes it when `limit` bytes have been collected, when the guest writes
+to another descriptor (so that the output to stdout and stderr isn't reordered), when it reads,
+seeks, opens, closes or syncs files, when it exits and when the VM stops for any other reason.
+The collected chunks are written with a single `os.writev` if the descriptor has a host file descriptor.
+Other file objects (like `io.StringIO`) get one `write` and one `flush` per flush of the buffer.
+
+If writing to the host fails (say, with `EPIPE` or `ENOSPC`), the error is returned by the guest's write
+that caused the flush or, if the flush was caused by something else, by the next write, `fsync` or `close`
+of that descriptor, like Linux reports errors of delayed writes.
+"""
+
+import io
+import os
+from io import UnsupportedOperation
+
+__all__ = 'OutputBuffer',
+
+# `os.writev` isn't available on Windows
+_writev = getattr(os, 'writev', None)
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+
+
+class OutputBuffer:
+    def __init__(self, cpu, limit=1 << 16):
+        """
+        :param cpu: the VM, whose `descriptors` are written to
+        :param limit: the number of bytes to collect before writing them (0: write immediately)
+        """
+        self.cpu = cpu
+        self.limit = limit
+        self.fd = None  # the descriptor the collected data is for
+        self.pending = []  # chunks of bytes
+        self.size = 0  # total size of the chunks
+        self.errors = {}  # descriptor -> errno of the last failed write to the host that hasn't been reported yet
+
+    def write(self, fd: int, chunks: list) -> int:
+        """
+        Write the bytes-like objects in `chunks` to the guest's file descriptor `fd`.
+        :return: the number of bytes written or `-errno` if writing to the host failed
+        """
+        error = self.error(fd)
+        if error:
+            return error
+
+        if fd != self.fd:
+            self.flush()
+            self.fd = fd
+
+        self.pending.extend(chunks)
+        size = sum(len(chunk) for chunk in chunks)
+        self.size += size
+
+        if self.size >= self.limit:
+            self.flush()
+
+            error = self.error(fd)
+            if error:
+                return error
+
+        return size
+
+    def error(self, fd: int) -> int:
+        """
+        :return: `-errno` of the last failed write to the host file of `fd` (which is forgotten then) or 0
+        """
+        return -self.errors.pop(fd, 0)
+
+    def flush(self, fd=None) -> None:
+        """
+        Write the collected data (only if it's for `fd`, unless `fd` is `None`) to the host.
+        """
+        if not self.pending or (fd is not None and fd != self.fd):
+            return
+
+        fd, chunks = self.fd, self.pending
+        self.fd, self.pending, self.size = None, [], 0
+
+        try:
+            self.write_chunks(self.cpu.descriptors[fd], chunks)
+        except OSError as e:
+            self.errors[fd] = e.errno or 1  # EPERM if it's unknown
+
+    @staticmethod
+    def write_chunks(file, chunks: list) -> None:
+        try:
+            fileno = file.fileno()
+        except (AttributeError, UnsupportedOperation):
+            fileno = None
+
+        if fileno is None or _writev is None:
+            data = b''.join(chunks)
+            file.write(data.decode('ascii') if isinstance(file, io.TextIOBase) else data)
+            file.flush()
+            return
+
+        file.flush()  # whatever has been written to the file object comes first
+
+        while chunks:
+            written = _writev(fileno, chunks[:IOV_MAX])
+
+            # drop what has been written, keep the rest
+            while chunks and written >= len(chunks[0]):
+                written -= len(chunks.pop(0))
+            if written:
+                chunks[0] = memoryview(chunks[0])[written:]
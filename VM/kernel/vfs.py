@@ -0,0 +1,134 @@
+"""
+Filesystems the guest's `sys_open` and `sys_unlink` work with (`Kernel.fs`).
+
+A filesystem has three methods:
+
+    open(path, mode): return a file object for `path`, `mode` is one of 'r', 'r+', 'w' and 'x' (binary is implied);
+        raise `OSError` if that's impossible
+    exists(path): return whether there's a file at `path`
+    unlink(path): remove the file at `path` or raise `OSError`
+
+`HostFS` passes everything to the host's filesystem. `MemoryFS` keeps the files in a dictionary,
+so that the guest can run without any disk I/O and leaves no files behind: the inputs are given
+as a dictionary or a tarball and the outputs are read back as bytes.
+"""
+
+import io
+import os
+import posixpath
+import tarfile
+
+__all__ = 'HostFS', 'MemoryFS', 'MemoryFile'
+
+
+class HostFS:
+    def open(self, path: str, mode: str):
+        return open(path, mode + 'b')
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(path)
+
+    def unlink(self, path: str) -> None:
+        os.unlink(path)
+
+
+class MemoryFile(io.BytesIO):
+    """
+    An open file of a `MemoryFS`. What's written to it is stored in the filesystem when it's flushed or closed.
+    """
+
+    def __init__(self, fs: 'MemoryFS', path: str, data=b'', writable=True):
+        super().__init__(data)
+        self.fs, self.path, self._writable = fs, path, writable
+
+    def writable(self) -> bool:
+        return self._writable and super().writable()
+
+    def write(self, data) -> int:
+        if not self._writable:
+            raise io.UnsupportedOperation('not writable')
+
+        return super().write(data)
+
+    def flush(self) -> None:
+        super().flush()
+
+        if self._writable and not self.closed:
+            self.fs.files[self.path] = self.getvalue()
+
+    def close(self) -> None:
+        if not self.closed:
+            self.flush()
+
+        super().close()
+
+
+class MemoryFS:
+    def __init__(self, files=None):
+        """
+        :param files: {path: contents (bytes or str)} of the initial files
+        """
+        self.files = {}  # normalized path -> bytes
+
+        for path, data in (files or {}).items():
+            self.files[self.normalize(path)] = data.encode() if isinstance(data, str) else bytes(data)
+
+    @classmethod
+    def from_tar(cls, tar) -> 'MemoryFS':
+        """
+        :param tar: the path to a tarball or a binary file object with one
+        """
+        if isinstance(tar, (str, bytes)) or hasattr(tar, '__fspath__'):
+            archive = tarfile.open(tar)
+        else:
+            archive = tarfile.open(fileobj=tar)
+
+        with archive:
+            return cls({
+                member.name: archive.extractfile(member).read()
+                for member in archive.getmembers() if member.isfile()
+            })
+
+    @staticmethod
+    def normalize(path: str) -> str:
+        """
+        Relative paths are relative to the root directory.
+        """
+        return posixpath.normpath(posixpath.join('/', path))
+
+    def read(self, path: str) -> bytes:
+        """
+        :return: the contents of the file at `path`
+        """
+        try:
+            return self.files[self.normalize(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def open(self, path: str, mode: str) -> MemoryFile:
+        key = self.normalize(path)
+        mode = mode.replace('b', '')
+
+        if mode in ('r', 'r+'):
+            if key not in self.files:
+                raise FileNotFoundError(path)
+
+            return MemoryFile(self, key, self.files[key], writable=mode == 'r+')
+
+        if mode == 'x' and key in self.files:
+            raise FileExistsError(path)
+
+        if mode in ('w', 'x'):
+            self.files[key] = b''
+            return MemoryFile(self, key)
+
+        raise ValueError(f'Invalid mode: {mode!r}')
+
+    def exists(self, path: str) -> bool:
+        return self.normalize(path) in self.files
+
+    def unlink(self, path: str) -> None:
+        try:
+            del self.files[self.normalize(path)]
+        except KeyError:
+            raise FileNotFoundError(path) from None
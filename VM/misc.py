@@ -1,4 +1,5 @@
 import enum
+from collections import namedtuple
 
 
 @enum.unique
@@ -12,86 +13,139 @@ class Shift(enum.Enum):
     SAR = 6
 
 
-def process_ModRM(self) -> tuple:
-    """
-    Parses the ModRM byte, which is pointed to by `self.eip`.
+# The addressing form encoded by a ModRM byte.
+# is_register: True if the r/m operand is a register; its number is in `base`
+# base: the number of the base register or `None`
+# REG: the number of the register in the REG field
+# disp_size: the size of the displacement that follows the ModRM byte (0, 1 or 4 bytes)
+# sib: True if a SIB byte follows the ModRM byte; `base` and `disp_size` are then taken from `SIB_TABLE`
+ModRMForm = namedtuple('ModRMForm', 'is_register base REG disp_size sib')
 
-    :return: (type1, address1), (type2, address2)
-        type:
-            self.mem or self.reg
-        address:
-            Address in memory or the number of the register
-    """
-    # TODO: 16-bit addressing is not supported!
+# The addressing form encoded by a SIB byte (for the given MOD).
+# base, index: the numbers of registers to add to the address or `None`
+# scale: the index is shifted left by this amount
+# disp_size: the size of the displacement that follows the SIB byte (0, 1 or 4 bytes)
+SIBForm = namedtuple('SIBForm', 'base index scale disp_size')
 
-    ModRM = self.mem.get_eip(self.eip, 1)
-    self.eip += 1
 
+def _ModRM_form(ModRM: int) -> ModRMForm:
     MOD = (ModRM & 0b11000000) >> 6
     REG = (ModRM & 0b00111000) >> 3
     RM  = (ModRM & 0b00000111)
 
     if MOD == 0b11:
-        return (self.reg, RM), (self.reg, REG)
-
-    if RM != 0b100:  # No SIB byte
-        if MOD == 0b01:
-            addr = self.reg.get(RM, 4, True)
-            addr += self.mem.get_eip(self.eip, 1, True)
-            self.eip += 1
-
-            return (self.mem, addr), (self.reg, REG)
-        if MOD == 0b10:
-            addr = self.reg.get(RM, 4, True)
-            addr += self.mem.get_eip(self.eip, 4, True)
-            self.eip += 4
+        return ModRMForm(True, RM, REG, 0, False)
 
-            return (self.mem, addr), (self.reg, REG)
+    disp_size = (0, 1, 4)[MOD]
 
-        # MOD == 0b00
-        if RM != 0b101:
-            addr = self.reg.get(RM, 4, True)
+    if RM == 0b100:
+        return ModRMForm(False, None, REG, disp_size, True)
 
-            return (self.mem, addr), (self.reg, REG)
+    if MOD == 0b00 and RM == 0b101:  # disp32 only
+        return ModRMForm(False, None, REG, 4, False)
 
-        # RM == 0b101
-        addr = self.mem.get_eip(self.eip, 4, True)
-        self.eip += 4
+    return ModRMForm(False, RM, REG, disp_size, False)
 
-        return (self.mem, addr), (self.reg, REG)
-
-    # RM == 0b100 => SIB byte
-    SIB = self.mem.get_eip(self.eip, 1)
-    self.eip += 1
 
+def _SIB_form(MOD: int, SIB: int) -> SIBForm:
     scale = (SIB & 0b11000000) >> 6
     index = (SIB & 0b00111000) >> 3
     base  = (SIB & 0b00000111)
 
-    if MOD == 0b00:
-        addr = 0
-    elif MOD == 0b01:
-        addr = self.mem.get_eip(self.eip, 1, True)
-        self.eip += 1
-    else:  # MOD == 0b10
-        addr = self.mem.get_eip(self.eip, 4, True)
-        self.eip += 4
+    if index == 0b100:  # if index == 0b100, there's no index
+        index = None
 
-    if index != 0b100:  # if index == 0b100, there's no index
-        addr += self.reg.get(index, 4, True) << scale
+    if base == 0b101 and MOD == 0b00:  # disp32 instead of the base
+        return SIBForm(None, index, scale, 4)
+
+    return SIBForm(base, index, scale, (0, 1, 4)[MOD])
+
+
+# MODRM_TABLE[ModRM] -> ModRMForm
+MODRM_TABLE = tuple(_ModRM_form(ModRM) for ModRM in range(256))
+
+# SIB_TABLE[MOD][SIB] -> SIBForm (MOD can't be 0b11 if there's a SIB byte)
+SIB_TABLE = tuple(tuple(_SIB_form(MOD, SIB) for SIB in range(256)) for MOD in range(3))
+
+# Decoded register operands don't depend on anything but the ModRM byte, so they're shared
+REGISTER_OPERANDS = tuple((True, form.base, None, 0, 0, form.REG, 1) for form in MODRM_TABLE)
+
+
+def decode_ModRM(self) -> tuple:
+    """
+    Decodes the ModRM byte (and the SIB byte and displacement, if any) pointed to by `self.eip`.
+    Does not modify `self.eip`.
+
+    :return: (is_register, base, index, scale, displacement, REG, length)
+        is_register:
+            True if the r/m operand is a register; its number is in `base`
+        base, index:
+            Numbers of registers to add to the address or `None`
+        length:
+            Number of bytes taken by the ModRM byte, SIB byte and displacement
+    """
+    # TODO: 16-bit addressing is not supported!
+
+    eip = self.eip
+    ModRM = self.mem.get_eip8(eip)
+    form = MODRM_TABLE[ModRM]
+
+    if form.is_register:
+        return REGISTER_OPERANDS[ModRM]
 
-    if base == 0b101:
-        if MOD == 0:
-            addr += self.mem.get_eip(self.eip, 4, True)
-            self.eip += 4
+    if form.sib:
+        sib = SIB_TABLE[ModRM >> 6][self.mem.get_eip8(eip + 1)]
+        base, index, scale, disp_size = sib
+        length = 2
+    else:
+        base, index, scale, disp_size = form.base, None, 0, form.disp_size
+        length = 1
 
-            return (self.mem, addr), (self.reg, REG)
+    if disp_size == 1:
+        disp = self.mem.get_eip8s(eip + length)
+    elif disp_size == 4:
+        disp = self.mem.get_eip32s(eip + length)
+    else:
+        disp = 0
 
-    # (base != 0b101) or we dropped from the `if` clause above
+    return False, base, index, scale, disp, form.REG, length + disp_size
 
-    addr += self.reg.get(base, 4, True)
 
-    return (self.mem, addr), (self.reg, REG)
+def process_ModRM(self) -> tuple:
+    """
+    Parses the ModRM byte, which is pointed to by `self.eip`.
+    Decoded operands are cached in `self.decode_cache`, so only the address is recalculated on subsequent calls.
+
+    :return: (type1, address1), (type2, address2)
+        type:
+            self.mem or self.reg
+        address:
+            Address in memory or the number of the register
+    """
+
+    operands = self.decode_cache.operands
+    try:
+        is_register, base, index, scale, addr, REG, length = operands[self.eip]
+    except KeyError:
+        decoded = decode_ModRM(self)
+        self.decode_cache.add_operands(self.eip, decoded)
+        is_register, base, index, scale, addr, REG, length = decoded
+
+    self.eip += length
+
+    # register operands are preallocated, see `CPU32.register_operands`
+    registers = self.register_operands
+
+    if is_register:
+        return registers[base], registers[REG]
+
+    if index is not None:
+        addr += self.reg.get(index, 4, True) << scale
+
+    if base is not None:
+        addr += self.reg.get(base, 4, True)
+
+    return (self.mem, addr & 0xFFFFFFFF), registers[REG]  # addresses wrap around
 
 
 def sign_extend(num: int, nbytes: int) -> int:
@@ -109,15 +163,18 @@ def sign_extend(num: int, nbytes: int) -> int:
     return (num & (sign_bit - 1)) - (num & sign_bit)
 
 
+# PARITY[byte] is 1 if `byte` has an even number of set bits (that's how PF works)
+PARITY = bytes(1 - bin(byte).count('1') % 2 for byte in range(256))
+
+
 def parity(num: int) -> int:
     """
     Calculate the parity of the least significant byte of a number.
-    See: https://graphics.stanford.edu/~seander/bithacks.html#ParityWith64Bits
     :param num: The byte to calculate the parity of.
     :return:
     """
 
-    return ((((num & 0xFF) * 0x0101010101010101) & 0x8040201008040201) % 0x1FF) & 1
+    return PARITY[num & 0xFF]
 
 
 def MSB(num: int, size: int) -> int:
@@ -0,0 +1,205 @@
+"""
+Guest instruction profiler.
+
+When a VM is created with `profile=True`, `FetchLoopMixin.run` hands control over to `Profiler.run`,
+a copy of the fetch loop that counts how many times each run of instructions is executed.
+A run is a sequence of cached instructions that ends with a branch, so the counters are updated
+once per basic block rather than once per instruction. Compiled blocks (see `translator`) are not used in this mode,
+so that the runs are the same whether the code is hot or not.
+
+`Profiler.report()` expands the runs into the addresses of their instructions and aggregates the counts
+per opcode, per handler (the names of the methods that implement them, like `i_ADDSUB_rm_imm`,
+see `CPUMeta.implementation_names`) and per address.
+"""
+
+from collections import Counter
+
+from .util import DispatchTable, DispatchGroup, opcode_bytes
+from .decodeCache import HOOK_OPCODE
+
+__all__ = 'Profiler', 'format_report'
+
+
+def handler_names(vm) -> dict:
+    """
+    :return: {bound implementation: implementation name} for all the instructions in the dispatch table of `vm`
+    """
+    names = {}
+
+    def walk(handlers, concrete_names):
+        for handler, name in zip(handlers, concrete_names):
+            if isinstance(handler, DispatchTable):
+                walk(handler, name)
+            elif isinstance(handler, DispatchGroup):
+                walk(handler.by_reg, name.by_reg)
+                walk(handler.by_modrm, name.by_modrm)
+            elif handler is not None:
+                names[handler] = vm.implementation_names[name]
+
+    walk(vm.dispatch, vm.dispatch_names)
+
+    for hook in vm.hooks.values():
+        names[hook] = hook.__name__
+
+    return names
+
+
+class Profiler:
+    def __init__(self, vm):
+        self.vm = vm
+        self.runs = {}  # (address, number of instructions) -> number of times the run starting there was executed
+        self.decoded = {}  # address -> (opcode, handler, length) of the last instruction decoded there
+
+    def reset(self) -> None:
+        self.runs.clear()
+        self.decoded.clear()
+
+    def run(self) -> int:
+        vm = self.vm
+        entries = vm.decode_cache.entries
+        runs, decoded = self.runs, self.decoded
+
+        vm.running = True
+        retired = 0
+        start, count = vm.eip, 0  # the current run
+
+        try:
+            while vm.running and vm.eip + 1 < vm.mem.size:
+                eip = vm.eip
+
+                try:
+                    impl, vm.opcode, vm.eip, overrides, length = entries[eip]
+                except KeyError:
+                    if count:
+                        runs[start, count] = runs.get((start, count), 0) + 1
+                        retired += count
+
+                    vm.decode_and_execute()
+
+                    entry = entries.get(eip)
+                    if entry is not None:  # the instruction may have overwritten itself
+                        decoded[eip] = entry.opcode, entry.handler, entry.length
+                    runs[eip, 1] = runs.get((eip, 1), 0) + 1
+                    retired += 1
+
+                    start, count = vm.eip, 0
+                    continue
+
+                if overrides:
+                    vm.apply_prefixes(overrides)
+                    impl()
+                    vm.undo_prefixes(overrides)
+                else:
+                    impl()
+
+                count += 1
+
+                if length is None:
+                    runs[start, count] = runs.get((start, count), 0) + 1
+                    retired += count
+
+                    start, count = vm.eip, 0
+        finally:
+            if count:
+                runs[start, count] = runs.get((start, count), 0) + 1
+                retired += count
+
+            vm.instructions_retired += retired
+
+        return vm.reg.eax
+
+    def describe(self, eip: int) -> tuple:
+        """
+        :return: (opcode, handler, length) of the instruction at `eip` or `None`s if it's unknown
+        """
+        info = self.decoded.get(eip)
+        if info is not None:
+            return info
+
+        entry = self.vm.decode_cache.entries.get(eip)
+        if entry is not None:
+            return entry.opcode, entry.handler, entry.length
+
+        return None, None, None
+
+    def counts(self) -> Counter:
+        """
+        :return: {address: number of instructions retired there}
+        """
+        counts = Counter()
+
+        for (start, length), executed in self.runs.items():
+            eip = start
+            for _ in range(length):
+                counts[eip] += executed
+
+                size = self.describe(eip)[2]
+                if size is None:  # a branch ends the run
+                    break
+
+                eip += size
+
+        return counts
+
+    def report(self, top=20) -> dict:
+        """
+        :param top: the number of the hottest addresses to include
+        :return: a dictionary that can be serialized as JSON:
+            instructions: the total number of retired instructions
+            opcodes: [{opcode, count}] sorted by count, descending
+            handlers: [{handler, count}] sorted by count, descending
+            hot_eips: [{eip, opcode, handler, count}] for the `top` hottest addresses
+        """
+        names = handler_names(self.vm)
+        counts = self.counts()
+        opcodes, handlers = Counter(), Counter()
+
+        for eip, count in counts.items():
+            opcode, handler, _ = self.describe(eip)
+            opcodes[opcode] += count
+            handlers[names.get(handler)] += count
+
+        def describe(eip: int, count: int) -> dict:
+            opcode, handler, _ = self.describe(eip)
+            return {'eip': eip, 'opcode': opcode, 'handler': names.get(handler), 'count': count}
+
+        return {
+            'instructions': sum(counts.values()),
+            'opcodes': [{'opcode': opcode, 'count': count} for opcode, count in opcodes.most_common()],
+            'handlers': [{'handler': handler, 'count': count} for handler, count in handlers.most_common()],
+            'hot_eips': [describe(eip, count) for eip, count in counts.most_common(top)],
+        }
+
+
+def format_report(report: dict, top=20) -> str:
+    """
+    Format the `report` returned by `Profiler.report` as text tables.
+    """
+    total = report['instructions'] or 1
+
+    def opcode(value) -> str:
+        if value == HOOK_OPCODE:
+            return 'hook'
+
+        return '?' if value is None else opcode_bytes(value).hex()
+
+    lines = [f"Instructions retired: {report['instructions']:,d}", '', 'Handlers:']
+    lines += [
+        f"  {entry['count']:>14,d} {entry['count'] / total:7.2%}  {entry['handler']}"
+        for entry in report['handlers'][:top]
+    ]
+
+    lines += ['', 'Opcodes:']
+    lines += [
+        f"  {entry['count']:>14,d} {entry['count'] / total:7.2%}  {opcode(entry['opcode'])}"
+        for entry in report['opcodes'][:top]
+    ]
+
+    lines += ['', 'Hottest addresses:']
+    lines += [
+        f"  {entry['count']:>14,d} {entry['count'] / total:7.2%}  0x{entry['eip']:08x}  "
+        f"{opcode(entry['opcode'])} {entry['handler']}"
+        for entry in report['hot_eips'][:top]
+    ]
+
+    return '\n'.join(lines)
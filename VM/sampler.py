@@ -0,0 +1,110 @@
+"""
+Guest sampling profiler.
+
+`SamplingProfiler` is a tracer (see `tracing`) that finds out which guest functions the time is spent in.
+It maintains a shadow call stack: every `call` pushes its target and the value of ESP right after the call,
+every `ret` pops the frames whose stack memory has been released (this way, frames skipped by `longjmp`
+and calls that never return, like `call next; pop ebx`, are dropped as well). Every `interval` instructions the current stack is recorded as a sample.
+
+Addresses are resolved to function names with an `ELF.SymbolIndex` built from the `.symtab` section
+of the executable. `collapsed()` returns the samples in the "collapsed stack" format (`main;f;g 42`)
+understood by `flamegraph.pl`, speedscope, inferno and other flame graph tools.
+"""
+
+from collections import Counter
+
+from .profiler import handler_names
+from .decodeCache import HOOK_OPCODE
+
+__all__ = 'SamplingProfiler',
+
+
+class SamplingProfiler:
+    def __init__(self, symbols=None, interval=1000):
+        """
+        :param symbols: an `ELF.SymbolIndex` or `None` to show raw addresses
+        :param interval: the number of instructions between samples
+        """
+        assert interval > 0
+
+        self.symbols = symbols
+        self.interval = interval
+        self.countdown = interval
+
+        self.stack = []  # [(address of the called function, ESP right after the call)]
+        self.samples = Counter()  # (address of the outermost function, ..., EIP) -> number of samples
+
+        self.calls = self.returns = None  # handlers of `call` and `ret`
+
+    def reset(self) -> None:
+        self.stack.clear()
+        self.samples.clear()
+        self.countdown = self.interval
+
+    def find_handlers(self, vm) -> None:
+        names = handler_names(vm)
+
+        self.calls = {handler for handler, name in names.items() if name.startswith('i_CALL_')}
+        self.returns = {handler for handler, name in names.items() if name.startswith('i_RET_')}
+
+    def on_instruction(self, vm, address: int, entry) -> None:
+        if entry is not None:
+            if self.calls is None:
+                self.find_handlers(vm)
+
+            handler = entry.handler
+
+            if handler in self.calls:
+                esp, stack = vm.reg.esp, self.stack
+
+                # Frames at or below the new return address are stale (`call next; pop ebx` and the like)
+                while stack and stack[-1][1] <= esp:
+                    stack.pop()
+
+                stack.append((vm.eip, esp))
+            elif handler in self.returns or entry.opcode == HOOK_OPCODE:  # hooks return to the caller too
+                esp, stack = vm.reg.esp, self.stack
+
+                while stack and stack[-1][1] < esp:
+                    stack.pop()
+
+        self.countdown -= 1
+        if not self.countdown:
+            self.countdown = self.interval
+            self.samples[tuple(function for function, _ in self.stack) + (vm.eip,)] += 1
+
+    def frames(self, sample: tuple) -> list:
+        """
+        :return: the names of the functions in `sample`, outermost first
+        """
+        name = (lambda address: f'0x{address:08x}') if self.symbols is None else self.symbols.name
+        *calls, eip = sample
+
+        frames = [name(address) for address in calls]
+        current = name(eip)
+
+        # The last call may have been a jump to another function or there may be no calls at all
+        if not frames or frames[-1] != current:
+            frames.append(current)
+
+        return frames
+
+    def collapsed(self) -> str:
+        """
+        :return: the samples in the collapsed stack format, one stack per line
+        """
+        stacks = Counter()
+        for sample, count in self.samples.items():
+            stacks[';'.join(self.frames(sample))] += count
+
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(stacks.items()))
+
+    def top(self, count=20) -> list:
+        """
+        :return: [(function name, number of samples)] of the `count` functions most samples were taken in
+        """
+        functions = Counter()
+        for sample, samples in self.samples.items():
+            functions[self.frames(sample)[-1]] += samples
+
+        return functions.most_common(count)
@@ -0,0 +1,144 @@
+"""
+VM snapshots.
+
+A `Snapshot` captures everything a running program can observe: the registers, the FPU, memory,
+the program break, the kernel's list of free memory blocks, the GDT, the file descriptor table
+and the files of a `MemoryFS`. It can be restored any number of times, so the same program can be started once
+and then rerun from that point with different inputs.
+
+The files the guest has opened itself are reopened on restore by the path they were opened at and seeked
+to the saved position, so closing them after the snapshot was taken doesn't matter. Files that can't be
+reopened (the host filesystem may have lost them) leave their descriptors closed. Other files,
+like the standard streams, are only seeked back.
+
+Taking a snapshot starts dirty page tracking (see `Memory.mark_clean`), so restoring it only copies back
+the pages that have been written to since then. If the memory has been resized or another snapshot has been
+taken in the meantime, all the pages are copied and tracking starts over.
+"""
+
+import ctypes
+
+from .util import SegmentRegs
+from .kernel.descriptorTable import DescriptorTable
+from .kernel.vfs import MemoryFS
+
+__all__ = 'Snapshot',
+
+
+def _save_struct(struct) -> bytes:
+    return ctypes.string_at(ctypes.addressof(struct), ctypes.sizeof(struct))
+
+
+def _load_struct(struct, data: bytes) -> None:
+    ctypes.memmove(ctypes.addressof(struct), data, len(data))
+
+
+def _reopen_mode(mode: str) -> str:
+    """
+    The file exists by the time it's reopened, so it mustn't be truncated or required to be new.
+    """
+    return 'r' if mode == 'r' else 'r+'
+
+
+class Snapshot:
+    CPU_ATTRIBUTES = (
+        'eip', 'current_mode', 'operand_size', 'address_size', 'stack_address_size',
+        'code_segment_end', 'running', 'RETCODE'
+    )
+
+    def __init__(self, vm):
+        vm.reg.eflags  # store the lazily evaluated flags into the register
+
+        self.reg = vm.reg.save()
+        self.sreg = _save_struct(vm.sreg)
+        self.fpu = _save_struct(vm.fpu)
+        self.cpu = {name: getattr(vm, name) for name in self.CPU_ATTRIBUTES}
+
+        self.memory_size = vm.mem.size
+        self.program_break = vm.mem.program_break
+        self.pages = vm.mem.copy_pages()
+
+        kernel = vm.kernel
+        self.free_memory_blocks = kernel.free_memory_blocks.copy()
+        kernel.output.flush()  # the positions of the files must include the buffered output
+        self.GDT = list(vm.GDT)
+
+        self.descriptors = []  # (file, position, (path, mode) to reopen it with or `None`)
+        for file in vm.descriptors:
+            if file is None or file.closed:
+                self.descriptors.append((file, None, None))
+                continue
+
+            file.flush()  # files of a `MemoryFS` store what's written to them when flushed
+            opened = kernel.opened_files.get(file)
+            self.descriptors.append((
+                file,
+                file.tell() if file.seekable() else None,
+                None if opened is None else (opened[0], _reopen_mode(opened[1]))
+            ))
+
+        self.files = dict(kernel.fs.files) if isinstance(kernel.fs, MemoryFS) else None
+
+        vm.mem.mark_clean()
+        self.dirty_pages = vm.mem.dirty_pages  # identifies the memory this snapshot is tracking
+
+    def restore(self, vm) -> None:
+        mem = vm.mem
+
+        if mem.dirty_pages is not None and mem.dirty_pages is self.dirty_pages:
+            dirty = sorted(mem.dirty_pages)
+        else:
+            if mem.size != self.memory_size:
+                mem.size = self.memory_size
+
+            # the pages that are committed now or were committed when the snapshot was taken
+            dirty = sorted(set(mem.committed_page_numbers()) | set(self.pages))
+            mem.mark_clean()
+            self.dirty_pages = mem.dirty_pages
+
+        for page in dirty:
+            mem.reset_page(page, self.pages.get(page))
+        mem.dirty_pages.clear()
+
+        mem.program_break = self.program_break
+
+        vm.reg.load(self.reg)
+        _load_struct(vm.sreg, self.sreg)
+        _load_struct(vm.fpu, self.fpu)
+        mem.segment_override = SegmentRegs.DS  # reload the segment base
+
+        for name, value in self.cpu.items():
+            setattr(vm, name, value)
+
+        kernel = vm.kernel
+        kernel.free_memory_blocks = self.free_memory_blocks.copy()
+        vm.GDT = list(self.GDT)
+
+        kernel.output.flush()
+
+        # files opened after the snapshot was taken are not needed anymore and the ones opened before are reopened
+        kept = {id(file) for file, _, reopen in self.descriptors if reopen is None}
+        for file in vm.descriptors:
+            if file is not None and id(file) not in kept and not file.closed:
+                file.close()
+
+        if self.files is not None:  # after closing the files, which writes them back
+            kernel.fs.files = dict(self.files)
+
+        descriptors = []
+        for file, position, reopen in self.descriptors:
+            if reopen is not None:
+                path, mode = reopen
+                try:
+                    file = kernel.fs.open(path, mode)
+                except OSError:
+                    descriptors.append(None)
+                    continue
+
+                kernel.opened_files[file] = reopen
+
+            if position is not None and not file.closed:
+                file.seek(position)
+            descriptors.append(file)
+
+        vm.descriptors = DescriptorTable(descriptors)
@@ -0,0 +1,144 @@
+"""
+Binary execution trace recorder.
+
+`TraceRecorder` is a tracer (see `tracing`) that keeps the last `capacity` retired instructions
+in a ring buffer: an `array` of fixed-size records, each holding EIP, the opcode
+and the values of the selected registers after the instruction was executed, as unsigned 32-bit integers.
+Opcodes of hooks (see `decodeCache.HOOK_OPCODE`) and of instructions that have overwritten themselves
+are stored as `0xFFFFFFFF`.
+
+`TraceRecorder.dump` writes the records in chronological order to a binary file:
+
+    header: magic (8 bytes), version (uint16), number of registers (uint16), number of records (uint64)
+    register names: 4 bytes each, padded with zeros
+    records: EIP, opcode and the registers, uint32 each
+
+All numbers are little-endian. `load_trace` reads such a file back, see also `decode_trace.py`.
+"""
+
+import struct
+from array import array
+from collections import namedtuple
+from operator import attrgetter
+
+__all__ = 'TraceRecorder', 'TraceRecord', 'load_trace', 'REGISTERS'
+
+MAGIC = b'PyVMtrc\0'
+VERSION = 1
+HEADER = struct.Struct('<8sHHQ')
+NAME_SIZE = 4
+
+REGISTERS = 'eax', 'ecx', 'edx', 'ebx', 'esp', 'ebp', 'esi', 'edi'
+NO_OPCODE = 0xFFFFFFFF
+
+
+def record_format(registers: tuple) -> struct.Struct:
+    return struct.Struct(f'<{2 + len(registers)}I')
+
+
+def registers_getter(registers: tuple):
+    """
+    :return: a function that returns the values of `registers` from a register file as a tuple
+    """
+    if len(registers) > 1:
+        return attrgetter(*registers)
+
+    if registers:
+        get = attrgetter(*registers)
+        return lambda reg: (get(reg),)
+
+    return lambda reg: ()
+
+
+# A decoded record. opcode: `None` for hooks and unknown instructions; registers: {name: value}
+TraceRecord = namedtuple('TraceRecord', 'eip opcode registers')
+
+
+class TraceRecorder:
+    def __init__(self, capacity=1_000_000, registers=REGISTERS):
+        """
+        :param capacity: the number of instructions to keep
+        :param registers: the names of the 32-bit registers to record
+        """
+        assert capacity > 0
+        assert all(len(name.encode()) <= NAME_SIZE for name in registers)
+
+        self.capacity = capacity
+        self.registers = tuple(registers)
+        self.record = record_format(self.registers)
+        self.get_registers = registers_getter(self.registers)
+
+        self.buffer = array('I', bytes(self.record.size * capacity))
+        self.position = 0  # the index of the next record in the ring buffer
+        self.count = 0  # the number of instructions recorded since the last call to `clear`
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def clear(self) -> None:
+        self.position = self.count = 0
+
+    def on_instruction(self, vm, address: int, entry) -> None:
+        opcode = NO_OPCODE if entry is None or entry.opcode < 0 else entry.opcode
+        self.record.pack_into(
+            self.buffer, self.position * self.record.size, address, opcode, *self.get_registers(vm.reg)
+        )
+
+        self.position += 1
+        if self.position == self.capacity:
+            self.position = 0
+        self.count += 1
+
+    def raw_records(self) -> bytes:
+        """
+        :return: the records in chronological order
+        """
+        data = self.buffer.tobytes()
+        if self.count <= self.capacity:
+            return data[:self.count * self.record.size]
+
+        split = self.position * self.record.size
+        return data[split:] + data[:split]
+
+    def dump(self, file) -> None:
+        """
+        Write the trace to `file`, a path or a binary file object.
+        """
+        if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+            with open(file, 'wb') as f:
+                return self.dump(f)
+
+        file.write(HEADER.pack(MAGIC, VERSION, len(self.registers), len(self)))
+        file.write(b''.join(name.encode().ljust(NAME_SIZE, b'\0') for name in self.registers))
+        file.write(self.raw_records())
+
+
+def load_trace(file):
+    """
+    Read a trace written by `TraceRecorder.dump`.
+    :param file: a path or a binary file object
+    :return: (register names, iterator over `TraceRecord`s)
+    """
+    if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+        file = open(file, 'rb')
+
+    magic, version, register_count, count = HEADER.unpack(file.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f'Not a trace file (magic: {magic!r})')
+    if version != VERSION:
+        raise ValueError(f'Unsupported trace version: {version}')
+
+    names = file.read(NAME_SIZE * register_count)
+    registers = tuple(
+        names[i:i + NAME_SIZE].rstrip(b'\0').decode()
+        for i in range(0, len(names), NAME_SIZE)
+    )
+    record = record_format(registers)
+
+    def records():
+        with file:
+            for _ in range(count):
+                eip, opcode, *values = record.unpack(file.read(record.size))
+                yield TraceRecord(eip, None if opcode == NO_OPCODE else opcode, dict(zip(registers, values)))
+
+    return registers, records()
@@ -0,0 +1,154 @@
+"""
+Trace hooks.
+
+A tracer is any object that has one or more of these methods:
+
+    on_instruction(vm, address, entry)
+        Called after the instruction at `address` retires. `entry` is its `DecodedInstruction`
+        or `None` if the instruction has overwritten itself.
+    on_syscall(vm, number, result)
+        Called after the system call `number` has returned `result`.
+    on_memory_write(vm, address, size)
+        Called before `size` bytes are written at the absolute address `address`.
+
+Tracers are attached with `vm.tracing.attach(tracer)` and detached with `vm.tracing.detach(tracer)`
+at any time, even from inside a hook while the VM is running, so tracing can be turned on for a part
+of the execution only. Only the methods a tracer actually has are called.
+
+Nothing is paid for hooks nobody listens to:
+ * while no tracer has `on_instruction`, `FetchLoopMixin.run` uses the usual fetch loop with compiled blocks.
+   Otherwise it switches to `Tracing.run`, a copy of the loop that doesn't use compiled blocks;
+ * memory writes are only reported while some tracer has `on_memory_write`: all pages are then marked
+   with `PAGE_TRACED`, so that every write takes the slow write path;
+ * system calls are rare, so the list of syscall hooks is simply checked after each one.
+
+If the VM is being profiled, `Profiler.run` is used instead, and instruction hooks are not called.
+"""
+
+import sys
+
+from .profiler import handler_names
+from .disassembler import disassemble
+from .decodeCache import MAX_INSTRUCTION_LENGTH
+
+__all__ = 'Tracing', 'DisassemblyTracer'
+
+
+class Tracing:
+    def __init__(self, vm):
+        self.vm = vm
+        self.tracers = []
+
+        # bound hooks of the attached tracers
+        self.instruction = ()
+        self.syscall = ()
+        self.memory_write = ()
+
+        self.switch = False  # whether `run` must restart the fetch loop because instruction hooks were (un)registered
+
+    def __bool__(self):
+        return bool(self.tracers)
+
+    def attach(self, tracer) -> None:
+        if tracer not in self.tracers:
+            self.tracers.append(tracer)
+            self.update()
+
+    def detach(self, tracer) -> None:
+        if tracer in self.tracers:
+            self.tracers.remove(tracer)
+            self.update()
+
+    def update(self) -> None:
+        was_tracing_instructions = bool(self.instruction)
+
+        self.instruction = self.hooks('on_instruction')
+        self.syscall = self.hooks('on_syscall')
+        self.memory_write = self.hooks('on_memory_write')
+
+        self.vm.mem.trace_writes(self.on_memory_write if self.memory_write else None)
+
+        if bool(self.instruction) != was_tracing_instructions and self.vm.running:
+            # Stop the current fetch loop, `FetchLoopMixin.run` will continue in the other one
+            self.switch = True
+            self.vm.running = False
+
+    def hooks(self, name: str) -> tuple:
+        return tuple(getattr(tracer, name) for tracer in self.tracers if hasattr(tracer, name))
+
+    def on_memory_write(self, address: int, size: int) -> None:
+        for hook in self.memory_write:
+            hook(self.vm, address, size)
+
+    def on_syscall(self, number: int, result: int) -> None:
+        for hook in self.syscall:
+            hook(self.vm, number, result)
+
+    def run(self) -> None:
+        """
+        The fetch loop that calls the instruction hooks after every instruction.
+        """
+        vm = self.vm
+        entries = vm.decode_cache.entries
+
+        vm.running = True
+        retired = 0
+
+        try:
+            while vm.running and vm.eip + 1 < vm.mem.size:
+                address = vm.eip
+
+                try:
+                    impl, vm.opcode, vm.eip, overrides, length = entry = entries[address]
+                except KeyError:
+                    vm.decode_and_execute()
+                    entry = entries.get(address)
+                else:
+                    if overrides:
+                        vm.apply_prefixes(overrides)
+                        impl()
+                        vm.undo_prefixes(overrides)
+                    else:
+                        impl()
+
+                retired += 1
+
+                for hook in self.instruction:
+                    hook(vm, address, entry)
+        finally:
+            vm.instructions_retired += retired
+
+
+class DisassemblyTracer:
+    """
+    Writes a line for every retired instruction (its address, bytes and disassembly, see `disassembler`)
+    and system call:
+
+        [0x08048074]    83c301  add ebx, 0x1
+        syscall 0x04 -> 0x0000000d
+    """
+
+    def __init__(self, stream=sys.stderr):
+        self.stream = stream
+        self.names = {}  # handler -> name
+
+    def name(self, vm, handler) -> str:
+        name = self.names.get(handler)
+        if name is None:
+            self.names = handler_names(vm)  # hooks may have been installed since the last time
+            name = self.names.get(handler, '?')
+
+        return name
+
+    def on_instruction(self, vm, address: int, entry) -> None:
+        if entry is not None and entry.opcode < 0:
+            self.stream.write(f'\t[{address:#010x}]\thook\t{self.name(vm, entry.handler)}\n')
+            return
+
+        length, text = disassemble(bytes(vm.mem.view[address:address + MAX_INSTRUCTION_LENGTH]), address)
+        code = bytes(vm.mem.view[address:address + length]).hex()
+
+        self.stream.write(f'\t[{address:#010x}]\t{code}\t{text}\n')
+
+    def on_syscall(self, vm, number: int, result: int) -> None:
+        self.stream.write(f'\tsyscall 0x{number:02x} -> 0x{result & 0xFFFFFFFF:08x}\n')
@@ -0,0 +1,192 @@
+"""
+Basic block translator.
+
+A basic block is a run of instructions that starts at a branch target and ends with the first instruction
+that may transfer control (jmp, jcc, call, ret, int, ...). Once a branch target has been reached
+`HOT_THRESHOLD` times, the decoded instructions of its block (see `decodeCache`) are turned into
+the source code of a single Python function, which is then compiled and cached by the start address.
+
+Most instructions are translated into a direct call of their handler, with `vm.opcode` and `vm.eip` set
+to the values the handler expects. Some simple instructions that don't touch the flags are inlined instead.
+A block stops early at an instruction that hasn't been decoded yet: the fetch loop interprets the rest.
+
+An instruction may write to the block it's part of. So after every instruction that may write to memory,
+the block checks whether it's still in `BlockTranslator.blocks` and returns if it's been invalidated,
+so that the fetch loop decodes the rest of it again. A block returns the number of instructions it has executed.
+"""
+
+from .Memory import PAGE_SHIFT
+from .decodeCache import DecodeCache, MAX_INSTRUCTION_LENGTH, HOOK_OPCODE
+
+__all__ = 'BlockTranslator',
+
+HOT_THRESHOLD = 64
+MAX_BLOCK_LENGTH = 64  # instructions
+
+
+def _inline(vm, address: int, entry) -> str:
+    """
+    Return the Python code that implements the decoded instruction `entry`
+    without calling its handler or `None` if there's no such code.
+    The code may use the names set up by `BlockTranslator.compile`.
+    """
+    if entry.prefixes or entry.opcode == HOOK_OPCODE:
+        return None
+
+    opcode = entry.opcode
+    if opcode == 0x90:  # nop
+        return 'pass'
+    if 0xB8 <= opcode <= 0xBF:  # mov r32, imm32
+        return f'reg_set({opcode & 0b111}, 4, {vm.mem.get_eip32(entry.eip)})'
+    if 0x50 <= opcode <= 0x57:  # push r32
+        return f'stack_push(reg_get({opcode & 0b111}, 4))'
+    if 0x58 <= opcode <= 0x5F:  # pop r32
+        return f'reg_set({opcode & 0b111}, 4, stack_pop(4))'
+    if opcode in (0x89, 0x8B):  # mov r32, r32
+        ModRM = vm.mem.get_eip8(entry.eip)
+        if ModRM >> 6 != 0b11:
+            return None
+
+        RM, REG = ModRM & 0b111, (ModRM >> 3) & 0b111
+        if opcode == 0x8B:
+            RM, REG = REG, RM
+
+        return f'reg_set({RM}, 4, reg_get({REG}, 4))'
+
+    return None
+
+
+class BlockTranslator:
+    def __init__(self, vm, decode_cache: DecodeCache):
+        self.vm = vm
+        self.decode_cache = decode_cache
+        self.blocks = {}  # start address -> compiled function
+        self.counts = {}  # branch target -> number of times it's been reached
+        self.pages = {}  # page number -> {start address: end address} of the blocks that start there
+
+        decode_cache.listeners.append(self)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, address: int):
+        return address in self.blocks
+
+    def hit(self, address: int) -> None:
+        """
+        Count one more jump to `address` and translate the block that starts there once it becomes hot.
+        """
+        count = self.counts.get(address, 0) + 1
+        self.counts[address] = count
+
+        if count >= HOT_THRESHOLD:
+            self.compile(address)
+
+    def compile(self, start: int):
+        """
+        Translate the block that starts at address `start`.
+        :return: the compiled function or `None` if the first instruction hasn't been decoded yet
+        """
+        entries = self.decode_cache.entries
+        handlers, lines = [], []
+        address, end = start, start
+        eip_is_valid = True  # whether `vm.eip` will be correct when the current instruction ends
+        count = 0  # the number of instructions translated
+
+        # an instruction that may have written to the block returns from it if the block has been invalidated
+        check = ''
+
+        while address in entries and count < MAX_BLOCK_LENGTH:
+            entry = entries[address]
+            lines.append(check)
+            count += 1
+
+            code = _inline(self.vm, address, entry)
+            if code is not None:
+                lines.append(code)
+                eip_is_valid = False
+
+                if 0x50 <= entry.opcode <= 0x57:  # push writes to the stack
+                    check = f'if {start} not in blocks: vm.eip = {address + entry.length}; return {count}'
+                else:
+                    check = ''
+            else:
+                handler = f'h{len(handlers)}'
+                handlers.append(entry.handler)
+
+                if entry.prefixes:
+                    lines.append(
+                        f'vm.opcode = {entry.opcode}; vm.eip = {entry.eip}; '
+                        f'apply_prefixes({entry.prefixes}); {handler}(); undo_prefixes({entry.prefixes})'
+                    )
+                else:
+                    lines.append(f'vm.opcode = {entry.opcode}; vm.eip = {entry.eip}; {handler}()')
+                eip_is_valid = True
+
+                check = f'if {start} not in blocks: return {count}'
+
+            if entry.length is None:  # the block ends with a branch
+                end = address + MAX_INSTRUCTION_LENGTH
+                break
+
+            address += entry.length
+            end = address
+
+        if not count:
+            return None
+
+        if not eip_is_valid:
+            lines.append(f'vm.eip = {address}')
+        lines.append(f'return {count}')
+
+        body = '\n'.join(f'        {line}' for line in lines if line)
+        source = (
+            f'def make_block(vm, {", ".join(["blocks", "reg_get", "reg_set", "stack_push", "stack_pop", "apply_prefixes", "undo_prefixes"] + [f"h{i}" for i in range(len(handlers))])}):\n'
+            f'    def block_{start:08x}():\n'
+            f'{body}\n'
+            f'    return block_{start:08x}\n'
+        )
+
+        namespace = {}
+        exec(compile(source, f'<block 0x{start:08x}>', 'exec'), namespace)
+
+        vm = self.vm
+        block = namespace['make_block'](
+            vm, self.blocks, vm.reg.get, vm.reg.set, vm.stack_push, vm.stack_pop, vm.apply_prefixes, vm.undo_prefixes,
+            *handlers
+        )
+
+        self.blocks[start] = block
+        self.pages.setdefault(start >> PAGE_SHIFT, {})[start] = end
+
+        return block
+
+    def invalidate(self, address: int, size: int) -> None:
+        """
+        Drop all the blocks that might overlap the memory range `address`..`address + size`.
+        """
+        end = address + size
+        first_page = max(address - MAX_BLOCK_LENGTH * MAX_INSTRUCTION_LENGTH, 0) >> PAGE_SHIFT
+
+        pages = range(first_page, ((end - 1) >> PAGE_SHIFT) + 1)
+        if len(pages) > len(self.pages):
+            pages = [page for page in self.pages if page in pages]
+
+        for page in pages:
+            blocks = self.pages.get(page)
+            if not blocks:
+                continue
+
+            stale = [start for start, block_end in blocks.items() if start < end and address < block_end]
+            for start in stale:
+                del blocks[start]
+                del self.blocks[start]
+                self.counts.pop(start, None)
+
+            if not blocks:
+                del self.pages[page]
+
+    def flush(self) -> None:
+        self.blocks.clear()
+        self.counts.clear()
+        self.pages.clear()
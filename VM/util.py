@@ -1,5 +1,4 @@
 import functools
-import os
 import enum
 import struct
 
@@ -80,10 +79,63 @@ class InstructionMeta(type):
             logger.log(logging.NOTSET, "\tInstruction %s registered", name)
 
 
+class DispatchTable(list):
+    """
+    256 dispatch entries indexed by the next opcode byte.
+
+    An entry may be:
+        None: no such opcode
+        the name (or, once bound by `CPU.__init__`, the implementation) of the only instruction with this opcode
+        a `DispatchGroup`
+        another `DispatchTable` (for escape bytes like 0x0F)
+    """
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__([None] * 256)
+
+    def map(self, func):
+        table = DispatchTable()
+        for byte, entry in enumerate(self):
+            if isinstance(entry, (DispatchTable, DispatchGroup)):
+                table[byte] = entry.map(func)
+            elif entry is not None:
+                table[byte] = func(entry)
+
+        return table
+
+
+class DispatchGroup:
+    """
+    Instructions that share an opcode and are told apart by the REG field of the ModRM byte ("/digit" opcodes).
+    Instructions encoded by the whole ModRM byte (like x87's `D9 C0+i`) go to `by_modrm` and take precedence.
+    """
+    __slots__ = 'by_reg', 'by_modrm'
+
+    def __init__(self):
+        self.by_reg = [None] * 8
+        self.by_modrm = [None] * 256
+
+    def map(self, func):
+        group = DispatchGroup()
+        group.by_reg = [None if entry is None else func(entry) for entry in self.by_reg]
+        group.by_modrm = [None if entry is None else func(entry) for entry in self.by_modrm]
+
+        return group
+
+
+def opcode_bytes(opcode: int) -> bytes:
+    return opcode.to_bytes(max(1, (opcode.bit_length() + 7) // 8), 'big')
+
+
 class CPUMeta(type):
     """
     This metaclass transfers all the needed methods of all the registered instructions' classes into the name space of 'cls'.
     Duplicate function names are handled accordingly.
+
+    It also builds the dispatch table (see `DispatchTable`) that maps opcodes to the names of these methods.
+    Opcodes shared by several instructions must specify the REG field of the ModRM byte
+    as the `REG` keyword argument of `functools.partialmethod`, so that every instruction resolves to exactly one method.
     """
     
     loaded = False
@@ -99,44 +151,93 @@ class CPUMeta(type):
 
         cls.opcodes_names = {}  # TODO: this looks ugly
         cls.concrete_names = []
+        cls.implementation_names = {}  # concrete name -> name shared by all the opcodes of the implementation
+        regs = {}  # concrete name -> REG
 
-        for instruction in Instruction.instruction_set:
+        # sort the instructions to get the same concrete names every time
+        for instruction in sorted(Instruction.instruction_set, key=lambda instr: instr.__name__):
             for opcode, implementation in instruction().opcodes.items():
-                if isinstance(implementation, (list, tuple)):  # in case one opcode represents two instructions
-                    for impl in implementation:
-                        CPUMeta.load_instruction(cls, instruction, opcode, impl)
-                else:
-                    CPUMeta.load_instruction(cls, instruction, opcode, implementation)
+                if not isinstance(implementation, (list, tuple)):
+                    implementation = implementation,
+
+                for impl in implementation:  # in case one opcode represents several instructions
+                    concrete_name = CPUMeta.load_instruction(cls, instruction, opcode, impl)
+
+                    if isinstance(impl, functools.partialmethod):
+                        regs[concrete_name] = impl.keywords.get('REG')
+
+        cls.dispatch_names = DispatchTable()
+        for opcode in sorted(cls.opcodes_names, key=lambda opcode: (len(opcode_bytes(opcode)), opcode)):
+            CPUMeta.dispatch_instruction(cls, opcode, cls.opcodes_names[opcode], regs)
                     
         cls.__class__.loaded = True
 
     @staticmethod
-    def load_instruction(cls, instruction, opcode, implementation):
+    def load_instruction(cls, instruction, opcode, implementation) -> str:
         try:
             impl_name = implementation.__name__
         except AttributeError:
-            if isinstance(implementation, functools.partialmethod):
-                rand = os.urandom(4).hex()
+            # Eg. a partialmethod or a MagicMock
+            impl_name = getattr(getattr(implementation, 'func', None), '__name__', 'impl')
 
-                try:
-                    impl_name = f"{implementation.func.__name__}_{rand}"
-                except AttributeError:
-                    # TODO: WTF is happening here? Eg. when wrapping a MagicMock
-                    impl_name = rand
-            else:
-                # TODO: WTF is happening here? Eg. with a MagicMock
-                impl_name = os.urandom(4).hex()
-
-        concrete_name = f"i_{instruction.__name__}_{impl_name}"
+        concrete_name = base_name = f"i_{instruction.__name__}_{impl_name}"
 
+        number = 1
         while concrete_name in cls.concrete_names:
-            concrete_name += os.urandom(4).hex()
+            number += 1
+            concrete_name = f"{base_name}_{number}"
 
         cls.concrete_names.append(concrete_name)
+        cls.implementation_names[concrete_name] = base_name
 
         setattr(cls, concrete_name, implementation)
         cls.opcodes_names.setdefault(opcode, []).append(concrete_name)
 
+        return concrete_name
+
+    @staticmethod
+    def dispatch_instruction(cls, opcode: int, names: list, regs: dict) -> None:
+        *path, last = opcode_bytes(opcode)
+        table = cls.dispatch_names
+
+        for i, byte in enumerate(path):
+            entry = table[byte]
+
+            if isinstance(entry, DispatchGroup) and i == len(path) - 1:
+                # `last` is the whole ModRM byte
+                if len(names) != 1 or entry.by_modrm[last] is not None:
+                    raise ValueError(f'Conflicting implementations of opcode 0x{opcode:x}: {names}')
+
+                entry.by_modrm[last] = names[0]
+                return
+
+            if entry is None:
+                entry = table[byte] = DispatchTable()
+            elif not isinstance(entry, DispatchTable):
+                raise ValueError(f'Opcode 0x{opcode:x} ({names}) conflicts with a shorter opcode: {entry}')
+
+            table = entry
+
+        if all(regs.get(name) is not None for name in names):
+            group = table[last]
+            if group is None:
+                group = table[last] = DispatchGroup()
+            elif not isinstance(group, DispatchGroup):
+                raise ValueError(f'Conflicting implementations of opcode 0x{opcode:x}: {names} and {group}')
+
+            for name in names:
+                REG = regs[name]
+                if group.by_reg[REG] is not None:
+                    raise ValueError(
+                        f'Conflicting implementations of opcode 0x{opcode:x} /{REG}: {name} and {group.by_reg[REG]}'
+                    )
+
+                group.by_reg[REG] = name
+        elif len(names) == 1 and table[last] is None:
+            table[last] = names[0]
+        else:
+            raise ValueError(f'Conflicting implementations of opcode 0x{opcode:x}: {names}')
+
 
 class Instruction(metaclass=InstructionMeta):
     """
@@ -151,17 +252,15 @@ class CPU(metaclass=CPUMeta):
     Thanks to the metaclass, all the methods of the registered instructions that are mentioned in their 'opcodes' attribute
      become bound to this class. The methods' names are handled accordingly by the metaclass.
     """
-    __slots__ = 'instr',
+    __slots__ = 'dispatch',
     opcodes_names = {}
     concrete_names = []
+    dispatch_names = DispatchTable()
 
     def __init__(self):
         """
-        This merely collects all the methods (which are now bound to the class), so that later on, 'self.instr[opcode]'
-         would be a list containing all the instructions' implementations that correspond to that opcode.
-        All the methods' names are stored in 'self._opcodes_names', which is kinda ugly, but... it works, so there's that.
+        This merely binds all the methods mentioned in the dispatch table, so that later on, 'self.dispatch[opcode]'
+         would be the implementation of the instruction with that one-byte opcode (or a `DispatchTable`/`DispatchGroup`).
+        All the methods' names are stored in 'self.opcodes_names', which is kinda ugly, but... it works, so there's that.
         """
-        self.instr = {
-            opcode: {getattr(self, name) for name in impl_names}
-            for opcode, impl_names in self.opcodes_names.items()
-        }
+        self.dispatch = self.dispatch_names.map(lambda name: getattr(self, name))
@@ -0,0 +1,123 @@
+; Allocates and frees 100000 anonymous mappings of 16-256 bytes, leaving 50000 holes in the middle,
+; and fills the holes with mappings of other sizes before freeing everything.
+; Exits with 0 if the program break is back where it started, 1 otherwise.
+;
+; nasm -f bin -O0 -o mmap.bin mmap.s
+
+USE32
+
+N          equ 100000
+SYS_EXIT   equ 0x01
+SYS_BRK    equ 0x2d
+SYS_MUNMAP equ 0x5b
+SYS_MMAP2  equ 0xc0
+
+_start:
+	mov eax, SYS_BRK
+	xor ebx, ebx
+	int 0x80
+	push eax                    ; the initial program break
+
+	mov ecx, N * 4
+	call mmap
+	mov ebp, eax                ; the addresses of the mappings
+
+	push 0                      ; [esp]: the index of the mapping
+
+allocate:
+	mov eax, [esp]
+	call size_1
+	call mmap
+	mov edx, [esp]
+	mov [ebp + edx * 4], eax
+	inc dword [esp]
+	cmp dword [esp], N
+	jb allocate
+
+	mov dword [esp], 1
+
+free_odd:
+	mov eax, [esp]
+	call size_1
+	mov ebx, [esp]
+	mov ebx, [ebp + ebx * 4]
+	call munmap
+	add dword [esp], 2
+	cmp dword [esp], N
+	jb free_odd
+
+	mov dword [esp], 1
+
+reallocate:
+	mov eax, [esp]
+	call size_2
+	call mmap
+	mov edx, [esp]
+	mov [ebp + edx * 4], eax
+	add dword [esp], 2
+	cmp dword [esp], N
+	jb reallocate
+
+	mov dword [esp], 0
+
+free_all:
+	mov eax, [esp]
+	test eax, 1
+	jnz odd
+	call size_1
+	jmp free
+odd:
+	call size_2
+free:
+	mov ebx, [esp]
+	mov ebx, [ebp + ebx * 4]
+	call munmap
+	inc dword [esp]
+	cmp dword [esp], N
+	jb free_all
+
+	mov ebx, ebp
+	mov ecx, N * 4
+	call munmap
+
+	mov eax, SYS_BRK
+	xor ebx, ebx
+	int 0x80
+	pop ecx
+	pop ecx
+	xor ebx, ebx
+	cmp eax, ecx
+	setne bl
+	mov eax, SYS_EXIT
+	int 0x80
+
+; ecx = ((eax & 15) + 1) * 16
+size_1:
+	and eax, 15
+	inc eax
+	shl eax, 4
+	mov ecx, eax
+	ret
+
+; ecx = (((eax >> 1) & 15) + 1) * 16
+size_2:
+	shr eax, 1
+	jmp size_1
+
+; eax = mmap2(NULL, ecx, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0)
+mmap:
+	mov eax, SYS_MMAP2
+	xor ebx, ebx
+	mov edx, 3
+	mov esi, 0x22
+	mov edi, -1
+	int 0x80
+	ret
+
+; munmap(ebx, ecx)
+munmap:
+	mov eax, SYS_MUNMAP
+	int 0x80
+	ret
+
+	db 0                        ; the initial program break points to the last byte of the file
@@ -0,0 +1,357 @@
+"""
+Benchmark runner.
+
+Runs a fixed set of workloads (the C programs in `C/bin`, the flat binaries in `asm/bin` and `asm/benchmarks`
+and NASM assembling `asm/standalone.s`) and records the wall time, the number of retired instructions,
+the number of instructions per second and the peak RSS of each of them. Every workload runs
+in a separate process, so that the peak RSS of one workload doesn't affect the others.
+
+    python3 -OO benchmark.py -o results.json
+    python3 -OO benchmark.py -b results.json  # compare against the previous results
+
+When a baseline is given, workloads that became slower by more than the threshold are reported
+as regressions and the exit status is 1.
+
+A workload only succeeds if it exits with the expected code and its output (what it prints and the files
+it creates) has the expected SHA-256 hash, see `EXPECTED`. The hash of every run is included in the results,
+so that new workloads can be added to `EXPECTED`.
+"""
+
+import argparse
+import collections
+import datetime
+import hashlib
+import io
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+import VM
+
+ROOT = Path(__file__).resolve().parent
+MEMORY = 0x0017801d
+
+# retcode, output_sha256: the expected results, `None` if unknown
+Workload = collections.namedtuple('Workload', 'name strategy path args stdin memory retcode output_sha256')
+
+# input for the interactive programs
+STDIN = {
+    'calculator': '2\n*\n21\nq\n',
+    'io': '42\nx\n123456\nhello\n',
+    'reverse_polish': '3 2 - 5 * =\nq\n',
+}
+
+
+# {workload name: (exit code, SHA-256 of the output)}
+EXPECTED = {
+    'args': (0, '12ac2e751b3f47f25998d6c36d6d1da97dee5418fa9fefa5a2016233bd86d248'),
+    'bubblesort': (0, 'b8eff3e53321f5acf5bcb50a5077f16302d7afea94973b5618a1d9cecaa1ff4e'),
+    'calculator': (0, 'fed2dea3cc8eb5b05213bc40ff9675ae1d1848b660ab8615f4d29a31681df5cd'),
+    'float_matmul': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'hello_world': (0, '24356fb3067e3628db5c16121fcfe889c2503c1dce6cb07559193ed9393db35f'),
+    'insertionsort': (0, '395c3cd0a51ee6a9161efb5d68b283708539398efbc64f4d0ca4af94c119487e'),
+    'io': (0, '827b00839af240583fccb2daed7a16cdb670c9053c8f27e73190e89a68845e3d'),
+    'memcpy_test': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'memory': (0, '3cf825c931acd72e82bf6fca454b9322a403ecdf396d5e7861346a5c0d9fe4c8'),
+    'quicksort': (0, '395c3cd0a51ee6a9161efb5d68b283708539398efbc64f4d0ca4af94c119487e'),
+    'recursion': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'reverse_polish': (0, 'b3ca8352fcdfcdbd4e26582527965b330a273b0586ecdcd98e77393ce3765abd'),
+    'structs': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'test_malloc': (0, '7e564f339e49c70db5202fdff08414def5f71cf3b495432d5b9340a46fe98295'),
+    'uname': (0, '5cfe91e35d79b25d029232193cbab018e7d83b56cf479f8686c43eea29653674'),
+    'asm/c_float1': (28, '388963388ab553b39e4b6607ca66fd00ef691bc1ce9a87de3600c868e3f3d2f0'),
+    'asm/c_float2': (12, '8dcfddd9c2dde5fba44b654c97a0ba87b1d7a110c69f5c6111a7b5f5d5cb17d5'),
+    'asm/c_float3': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'asm/c_float4': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'asm/c_float_vecmul': (56, '20f6865c6c4c2e899284394f6622c21b5b5a86bd0116dd81681c06555b31c20e'),
+    'asm/c_loop': (10, '98acd9d8889b8927f68c8e6155791bd1b276a9d55453e942edf1675a5e4a6e95'),
+    'asm/c_pointers': (1, '6803761df2f9605cc635c8292a539841f55854ee4d60d7d60036f61d16d3805f'),
+    'asm/c_pow': (113, '0270b58c325eb4dc84e2e6df94d69216a55706d588ab6cec83670b664706d69d'),
+    'asm/c_stdlib': (0, '24356fb3067e3628db5c16121fcfe889c2503c1dce6cb07559193ed9393db35f'),
+    'asm/c_stdlib_O3': (0, '24356fb3067e3628db5c16121fcfe889c2503c1dce6cb07559193ed9393db35f'),
+    'asm/standalone': (0, '45c2084beb057f7fa83b643d367d0ab90b45651c420ebaeefe3ed59471bc8964'),
+    'asm/test_adc': (0, '6f92a64e36db6f73736a6e182b7fa8c6611dbf59fc3297ef777bc50ce0d70dc5'),
+    'asm/test_add_sub': (0, '7f20af20131edf4d7ebf6dbb0de23d8916e2fa12754040ec425a33839699801d'),
+    'asm/test_bitwise': (0, 'f3869d821db415b70d6b0cb0a9780dd83684d19c9ec7e1b3a743967c1b5001fa'),
+    'asm/test_call_ret': (0, '95951d3bf5fb165ee987e5c846f96dc2225e26f4ba7e37e382514336027980a4'),
+    'asm/test_cmp_jcc': (0, 'a9c191db12687bf74cf2aa4b654ba46ee1c572f5d36771eeccb7da65ab3c0ebd'),
+    'asm/test_div': (0, '1a80b55d1ab187c12cc9fa1427bf64574db0b6625c3175fc2fb9be724e9c4832'),
+    'asm/test_idiv': (0, '1a616392ec6cc0bb0e1707fccb506f04af7723ff42f5f7646d7e0fedac75f1cf'),
+    'asm/test_imul': (0, 'dca1edd9a4853d010ea72acce3b56e5b66f99dd3ad2d24c813f6318e51a42bb1'),
+    'asm/test_imul2': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'asm/test_inc_dec': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'asm/test_jmp_int': (0, '55d1622a2644a6dfaa70a246ca0e7aeae7f7229883afde163b8b08c04fa2653e'),
+    'asm/test_lea': (0, 'ef973d8158e5c0d543b619a482002cedf133581aee701d116fd6fbfd13a6ed4d'),
+    'asm/test_mul': (0, '6505c3eb9424f3a74f196e7b286f2ef11273ae1019f94a556b90a5ed9cc0978a'),
+    'asm/test_push_pop': (0, '9339741c3abef4eac21c9ef3ca3d08b21f3e6f3b6e4cba5ed5a963d67d4b2942'),
+    'asm/test_registers': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'asm/test_sbb': (0, '7e7dc99792b2ef4e2c2d3ef0595cd7aafbb57e4424a21a89de3a023e485d8c56'),
+    'asm/test_shifts': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'asm/test_shr_shl': (0, '35980b9d34467f676ff450345dfe3513e494c07eaf09d57b15733c9396ae4b61'),
+    'asm/test_stos': (0, '5fd66a9658fe73a0f845659b77711f7a95f39038ca4ff9a8b7a07a0e89665992'),
+    'asm/test_test': (0, '35d0e5522a34ee130d85d79838835cb7f492f324dbaa6711a419134b04171e9c'),
+    'asm/test_xchg': (232, '45deeeb68dd0be0bad282747a1aa5d5330f7c7a4344f395a98600eb160a56e4a'),
+    'asm/benchmarks/mmap': (0, 'f407e43f48623287d98b439103ff9df63d9ee6fd581fa0416f9f74a6d41d3549'),
+    'nasm': (0, '9183f9466f0f673d3d9ac7761f45adf1f3ef16373d2f37d6c5b463c75742ac4a'),
+}
+
+
+def make_workload(name: str, strategy: str, path: Path, args=(), memory=MEMORY) -> Workload:
+    return Workload(
+        name, strategy, str(path.relative_to(ROOT)), args, STDIN.get(path.stem, ''), memory,
+        *EXPECTED.get(name, (None, None))
+    )
+
+
+def workloads() -> list:
+    found = [make_workload(path.stem, 'ELF', path) for path in sorted((ROOT / 'C' / 'bin').glob('*.elf'))]
+    found += [
+        make_workload(f'asm/{path.stem}', 'FLAT', path) for path in sorted((ROOT / 'asm' / 'bin').glob('*.bin'))
+    ]
+    found += [
+        make_workload(f'asm/benchmarks/{path.stem}', 'FLAT', path, memory=1 << 25)
+        for path in sorted((ROOT / 'asm' / 'benchmarks').glob('*.bin'))
+    ]
+    found.append(make_workload(
+        'nasm', 'ELF', ROOT / 'C' / 'real_life' / 'nasm', ('-o', '{tmp}/standalone.bin', '-O0', 'asm/standalone.s'),
+        MEMORY * 5
+    ))
+
+    return found
+
+
+def peak_rss() -> float:
+    """
+    :return: the peak resident set size of the current process (MiB) or `None` if it's not available
+    """
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_workload(workload: Workload, int_registers=False) -> dict:
+    """
+    Run `workload` in the current process.
+    """
+    output = io.StringIO()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        stdin = Path(tmp) / 'stdin'
+        stdin.write_text(workload.stdin)
+
+        vm = VM.VMKernel(workload.memory, stdin.open(), output, output, int_registers=int_registers)
+        args = [arg.format(tmp=tmp) for arg in workload.args]
+        strategy = VM.ExecutionStrategy[workload.strategy]
+
+        start = time.perf_counter()
+        try:
+            if strategy == VM.ExecutionStrategy.ELF:
+                vm.execute(strategy, workload.path, args)
+            else:
+                vm.execute(strategy, workload.path)
+            error = None
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        wall_time = time.perf_counter() - start
+
+        vm.descriptors[0].close()
+        digest = output_digest(output.getvalue(), Path(tmp))
+
+    if error is None:
+        error = check(workload, vm.RETCODE, digest)
+
+    return {
+        'status': 'ok' if error is None else 'error',
+        'error': error,
+        'retcode': vm.RETCODE,
+        'output_sha256': digest,
+        'wall_time': wall_time,
+        'instructions': vm.instructions_retired,
+        'ips': vm.instructions_retired / wall_time if wall_time else 0,
+        'max_rss_mb': peak_rss(),
+    }
+
+
+def output_digest(output: str, directory: Path) -> str:
+    """
+    :return: the SHA-256 hash of what a workload has printed and the files it has created in `directory`
+    """
+    sha256 = hashlib.sha256(output.encode())
+
+    for path in sorted(directory.iterdir()):
+        if path.name != 'stdin':
+            sha256.update(path.name.encode() + b'\0' + path.read_bytes())
+
+    return sha256.hexdigest()
+
+
+def check(workload: Workload, retcode: int, digest: str):
+    """
+    :return: the description of how the results of `workload` differ from the expected ones or `None`
+    """
+    if workload.retcode is not None and retcode != workload.retcode:
+        return f'Exit code {retcode}, expected {workload.retcode}'
+
+    if workload.output_sha256 is not None and digest != workload.output_sha256:
+        return f'Output hash {digest[:16]}..., expected {workload.output_sha256[:16]}...'
+
+    return None
+
+
+def run_isolated(workload: Workload, timeout: float, int_registers=False) -> dict:
+    """
+    Run `workload` in a new Python process with the same optimization level as this one.
+    """
+    command = [sys.executable] + ['-O'] * sys.flags.optimize + [__file__, '--worker', workload.name]
+    if int_registers:
+        command.append('--int-registers')
+
+    try:
+        process = subprocess.run(
+            command, cwd=str(ROOT), timeout=timeout,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+        )
+    except subprocess.TimeoutExpired:
+        return {'status': 'timeout', 'error': f'Timed out after {timeout} seconds'}
+
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines() or [f'Exit status {process.returncode}']
+        return {'status': 'error', 'error': lines[-1]}
+
+    return json.loads(process.stdout)
+
+
+def best_of(results: list) -> dict:
+    """
+    Combine the results of several runs of the same workload: keep the fastest one and the highest RSS.
+    """
+    ok = [result for result in results if result['status'] == 'ok']
+    if not ok:
+        return results[-1]
+
+    best = dict(min(ok, key=lambda result: result['wall_time']))
+    rss = [result['max_rss_mb'] for result in ok if result['max_rss_mb'] is not None]
+    best['max_rss_mb'] = max(rss) if rss else None
+    best['runs'] = len(results)
+
+    return best
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    """
+    :return: {workload name: relative change of the wall time} for the workloads that succeeded in both runs
+    """
+    changes = {}
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None or result['status'] != 'ok' or old.get('status') != 'ok' or not old['wall_time']:
+            continue
+
+        changes[name] = result['wall_time'] / old['wall_time'] - 1
+
+    return changes
+
+
+def format_table(results: dict, changes: dict, threshold: float) -> str:
+    lines = [f"{'workload':<24} {'time, s':>9} {'instructions':>14} {'MIPS':>7} {'RSS, MiB':>9}  vs. baseline"]
+
+    for name, result in results.items():
+        if result['status'] != 'ok':
+            lines.append(f"{name:<24} {result['status'].upper()}: {result['error']}")
+            continue
+
+        rss = result['max_rss_mb']
+        line = (
+            f"{name:<24} {result['wall_time']:9.3f} {result['instructions']:14,d} "
+            f"{result['ips'] / 1e6:7.3f} {'-' if rss is None else format(rss, '.1f'):>9}"
+        )
+
+        change = changes.get(name)
+        if change is not None:
+            line += f'  {change:+7.1%}'
+            if change > threshold:
+                line += '  REGRESSION'
+
+        lines.append(line)
+
+    return '\n'.join(lines)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the VM on the bundled programs')
+    parser.add_argument('-o', '--output', type=Path, help='Write the results to this JSON file')
+    parser.add_argument('-b', '--baseline', type=Path, help='Compare the results against this JSON file')
+    parser.add_argument(
+        '-t', '--threshold', type=float, default=0.1,
+        help='Report workloads that are slower than the baseline by more than this fraction (default: 0.1)'
+    )
+    parser.add_argument('-k', '--filter', default='', help='Only run the workloads whose names contain this string')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Run every workload this many times')
+    parser.add_argument('--timeout', type=float, default=600, help='Time limit for one run of a workload (seconds)')
+    parser.add_argument(
+        '--int-registers', action='store_true', help='Store the registers as Python integers (see `IntReg32`)'
+    )
+    parser.add_argument('--list', action='store_true', help='List the workloads and exit')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    available = {workload.name: workload for workload in workloads()}
+
+    if args.worker is not None:
+        print(json.dumps(run_workload(available[args.worker], args.int_registers)))
+        return 0
+
+    selected = [workload for name, workload in available.items() if args.filter in name]
+
+    if args.list:
+        for workload in selected:
+            print(workload.name)
+        return 0
+
+    results = {}
+    for workload in selected:
+        print(f'Running {workload.name}...', file=sys.stderr)
+        results[workload.name] = best_of([
+            run_isolated(workload, args.timeout, args.int_registers) for _ in range(args.repeat)
+        ])
+
+    changes = {}
+    if args.baseline is not None:
+        with args.baseline.open() as file:
+            changes = compare(results, json.load(file)['results'])
+
+    print(format_table(results, changes, args.threshold))
+
+    if args.output is not None:
+        with args.output.open('w') as file:
+            json.dump({
+                'date': datetime.datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'optimize': sys.flags.optimize,
+                'int_registers': args.int_registers,
+                'results': results,
+            }, file, indent=2)
+
+    regressions = [name for name, change in changes.items() if change > args.threshold]
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
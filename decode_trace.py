@@ -0,0 +1,83 @@
+"""
+Decode and filter execution traces written by `VM.traceRecorder.TraceRecorder`.
+
+    python3 -OO -m VM --record-trace trace.bin 'C/real_life/nasm -h'
+    python3 decode_trace.py trace.bin --tail 20
+    python3 decode_trace.py trace.bin --eip 0x8048000-0x8049000 --opcode 0f84 -r eax,ecx
+    python3 decode_trace.py trace.bin --hot 10
+"""
+
+import argparse
+import collections
+import itertools
+import sys
+
+from VM.traceRecorder import load_trace
+
+
+def address_range(text: str) -> tuple:
+    """
+    Parse `ADDRESS` or `START-END` (inclusive) as hexadecimal numbers.
+    """
+    start, _, end = text.partition('-')
+    start = int(start, 16)
+
+    return start, int(end, 16) if end else start
+
+
+def select(records, eip=None, opcode=None):
+    for index, record in records:
+        if eip is not None and not eip[0] <= record.eip <= eip[1]:
+            continue
+        if opcode is not None and record.opcode != opcode:
+            continue
+
+        yield index, record
+
+
+def format_record(index: int, record, registers: tuple) -> str:
+    opcode = '?' if record.opcode is None else f'{record.opcode:02x}'
+    values = ' '.join(f'{name}={record.registers[name]:08x}' for name in registers)
+
+    return f'{index:>10} 0x{record.eip:08x} {opcode:>8}  {values}'.rstrip()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Decode and filter a binary execution trace')
+    parser.add_argument('trace', help='The trace file')
+    parser.add_argument('--eip', type=address_range, help='Only show the instructions at ADDRESS or in START-END (hex)')
+    parser.add_argument('--opcode', type=lambda s: int(s, 16), help='Only show the instructions with this opcode (hex)')
+    parser.add_argument('-r', '--registers', help='Comma-separated registers to show (default: all recorded ones)')
+    parser.add_argument('--head', type=int, help='Show the first N matching records')
+    parser.add_argument('--tail', type=int, help='Show the last N matching records')
+    parser.add_argument('--hot', type=int, metavar='N', help='Show the N most executed addresses instead of the records')
+    args = parser.parse_args()
+
+    recorded, records = load_trace(args.trace)
+
+    registers = recorded if args.registers is None else tuple(args.registers.split(','))
+    unknown = set(registers) - set(recorded)
+    if unknown:
+        parser.error(f"Registers not recorded in the trace: {', '.join(sorted(unknown))}")
+
+    selected = select(enumerate(records), args.eip, args.opcode)
+
+    if args.hot is not None:
+        counts = collections.Counter(record.eip for _, record in selected)
+        for eip, count in counts.most_common(args.hot):
+            print(f'0x{eip:08x} {count:>12,d}')
+        return 0
+
+    if args.head is not None:
+        selected = itertools.islice(selected, args.head)
+    if args.tail is not None:
+        selected = collections.deque(selected, maxlen=args.tail)
+
+    for index, record in selected:
+        print(format_record(index, record, registers))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import unittest
+import itertools
+import io
+
+import VM
+from VM.Registers import FLAGS_SUB
+from VM.instructions.control import JUMPS, JCXZ, CONDITION_NAMES
+
+# The conditions as described in the manual, in the order of their encodings
+REFERENCE = [
+    lambda CF, ZF, SF, OF, PF: OF == 1,  # o
+    lambda CF, ZF, SF, OF, PF: OF == 0,  # no
+    lambda CF, ZF, SF, OF, PF: CF == 1,  # b
+    lambda CF, ZF, SF, OF, PF: CF == 0,  # nb
+    lambda CF, ZF, SF, OF, PF: ZF == 1,  # z
+    lambda CF, ZF, SF, OF, PF: ZF == 0,  # nz
+    lambda CF, ZF, SF, OF, PF: CF == 1 or ZF == 1,  # be
+    lambda CF, ZF, SF, OF, PF: CF == 0 and ZF == 0,  # nbe
+    lambda CF, ZF, SF, OF, PF: SF == 1,  # s
+    lambda CF, ZF, SF, OF, PF: SF == 0,  # ns
+    lambda CF, ZF, SF, OF, PF: PF == 1,  # p
+    lambda CF, ZF, SF, OF, PF: PF == 0,  # np
+    lambda CF, ZF, SF, OF, PF: SF != OF,  # l
+    lambda CF, ZF, SF, OF, PF: SF == OF,  # nl
+    lambda CF, ZF, SF, OF, PF: ZF == 1 or SF != OF,  # le
+    lambda CF, ZF, SF, OF, PF: ZF == 0 and SF == OF,  # nle
+]
+
+
+class TestConditions(unittest.TestCase):
+    INT_REGISTERS = False
+
+    def setUp(self):
+        self.vm = VM.VM(1024, io.StringIO(), io.StringIO(), io.StringIO(), int_registers=self.INT_REGISTERS)
+
+    def test_names(self):
+        self.assertEqual(
+            [CONDITION_NAMES[cond] for cond in JUMPS],
+            ['o', 'no', 'b', 'nb', 'z', 'nz', 'be', 'nbe', 's', 'ns', 'p', 'np', 'l', 'nl', 'le', 'nle']
+        )
+
+    def test_conditions(self):
+        for flags in itertools.product((0, 1), repeat=5):
+            eflags = self.vm.reg.eflags
+            eflags.CF, eflags.ZF, eflags.SF, eflags.OF, eflags.PF = flags
+
+            for cond, reference in zip(JUMPS, REFERENCE):
+                self.assertEqual(bool(cond(self.vm)), reference(*flags), (CONDITION_NAMES[cond], flags))
+
+    def test_lazy_flags(self):
+        # cmp al, bl for some interesting pairs of values
+        for a, b in itertools.product((0, 1, 0x7F, 0x80, 0xFF), repeat=2):
+            self.vm.reg.lazy_flags = FLAGS_SUB, a, b, a - b, 1
+            lazy = [bool(cond(self.vm)) for cond in JUMPS]
+
+            eflags = self.vm.reg.eflags
+            flags = eflags.CF, eflags.ZF, eflags.SF, eflags.OF, eflags.PF
+
+            self.assertEqual(lazy, [reference(*flags) for reference in REFERENCE], (a, b))
+
+    def test_jcxz(self):
+        self.vm.reg.eax = 0
+        self.vm.reg.ecx = 0
+        self.assertTrue(JCXZ(self.vm))
+
+        self.vm.reg.ecx = 0x10000  # CX is zero, ECX isn't
+        self.assertFalse(JCXZ(self.vm))
+
+        self.vm.address_size = 2
+        self.assertTrue(JCXZ(self.vm))
+
+        self.vm.reg.ecx = 1
+        self.assertFalse(JCXZ(self.vm))
+
+
+class TestIntConditions(TestConditions):
+    INT_REGISTERS = True
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
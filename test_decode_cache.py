@@ -0,0 +1,185 @@
+import unittest
+import io
+
+import VM
+from VM import fetchLoop
+
+
+#     mov bl, 20
+#     xor ecx, ecx
+# again:
+#     add bl, 5        ; patched into `sub bl, 5` below
+#     inc ecx
+#     cmp ecx, 2
+#     je done
+#     mov byte [again + 1], 0xEB
+#     jmp again
+# done:
+#     xor eax, eax
+#     inc eax
+#     int 0x80         ; exit(bl)
+SELF_MODIFYING = bytes([
+    0xB3, 0x14,
+    0x31, 0xC9,
+    0x80, 0xC3, 0x05,
+    0x41,
+    0x83, 0xF9, 0x02,
+    0x74, 0x09,
+    0xC6, 0x05, 0x05, 0x00, 0x00, 0x00, 0xEB,
+    0xEB, 0xEE,
+    0x31, 0xC0,
+    0x40,
+    0xCD, 0x80
+])
+
+
+#     xor ecx, ecx
+#     xor ebx, ebx
+# again:
+#     inc ebx
+#     inc ecx
+#     cmp ecx, 1000
+#     jne again
+#     xor eax, eax
+#     inc eax
+#     int 0x80         ; exit(ebx)
+HOT_LOOP = bytes([
+    0x31, 0xC9,
+    0x31, 0xDB,
+    0x43,
+    0x41,
+    0x81, 0xF9, 0xE8, 0x03, 0x00, 0x00,
+    0x75, 0xF6,
+    0x31, 0xC0,
+    0x40,
+    0xCD, 0x80
+])
+
+
+def exit_with(code: int) -> bytes:
+    # mov ebx, code; mov eax, 1; int 0x80
+    return bytes([0xBB]) + code.to_bytes(4, 'little') + bytes([0xB8, 1, 0, 0, 0, 0xCD, 0x80])
+
+
+class TestDecodeCache(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.stdout = io.StringIO()
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), self.stdout, self.stdout)
+
+    def test_entries_are_cached(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, exit_with(3))
+
+        self.assertEqual(self.vm.RETCODE, 3)
+        self.assertIn(0, self.vm.decode_cache)
+        self.assertEqual(self.vm.decode_cache.get(0).length, 5)
+        self.assertIsNone(self.vm.decode_cache.get(10).length)  # int 0x80
+
+    def test_self_modifying_code(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, SELF_MODIFYING)
+
+        self.assertEqual(self.vm.RETCODE, 20)
+
+    def test_reload_program(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, exit_with(3))
+        self.vm.execute(VM.ExecutionStrategy.BYTES, exit_with(4))
+
+        self.assertEqual(self.vm.RETCODE, 4)
+
+    def test_resize_flushes(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, exit_with(3))
+        self.vm.mem.size = self.MEMSZ * 2
+
+        self.assertEqual(len(self.vm.decode_cache), 0)
+
+    def test_prefixes(self):
+        code = bytes([
+            0xBB, 0xFF, 0xFF, 0xFF, 0xFF,  # mov ebx, 0xFFFFFFFF
+            0x66, 0x66, 0xBB, 0x34, 0x12,  # mov bx, 0x1234 (with a repeated operand size prefix)
+            0x80, 0xFB, 0xFF,  # cmp bl, 0xFF: doesn't affect anything, but must be decoded with the default sizes
+        ]) + bytes([0xB8, 1, 0, 0, 0, 0xCD, 0x80])  # exit(ebx)
+
+        self.vm.execute(VM.ExecutionStrategy.BYTES, code)
+
+        self.assertEqual(self.vm.reg.ebx, 0xFFFF1234)
+        self.assertEqual(self.vm.decode_cache.get(5).prefixes, fetchLoop.PREFIX_OPERAND_SIZE)
+        self.assertEqual(self.vm.decode_cache.get(5).length, 5)
+        self.assertEqual(self.vm.decode_cache.get(0).prefixes, 0)
+        self.assertEqual(self.vm.operand_size, 4)
+
+    def test_prefix_table(self):
+        self.assertEqual(sum(1 for prefixes in fetchLoop.PREFIX_TABLE if prefixes), 10)
+        self.assertEqual(
+            fetchLoop.PREFIX_TABLE[0x64],
+            fetchLoop.PREFIX_SEGMENT | (VM.util.SegmentRegs.FS << fetchLoop.SEGMENT_SHIFT)
+        )
+
+
+#     mov ecx, 100
+#     xor ebx, ebx
+#     mov esi, targets
+# again:
+#     mov edi, [esi]
+#     add esi, 4
+#     mov [edi], ecx  ; patches the next instruction (in the same block) when ecx is 20, writes to scratch otherwise
+# set_eax:
+#     mov eax, 0
+#     add ebx, eax
+#     dec ecx
+#     jnz again
+#     mov eax, 1
+#     int 0x80        ; exit(20 * 20)
+# targets:
+#     dd scratch, ..., set_eax + 1 (when ecx is 20), scratch, ...
+TARGETS = 0x100
+PATCHED_LOOP = bytes([
+    0xB9, 0x64, 0x00, 0x00, 0x00,
+    0x31, 0xDB,
+    0xBE, *TARGETS.to_bytes(4, 'little'),
+    0x8B, 0x3E,
+    0x83, 0xC6, 0x04,
+    0x89, 0x0F,
+    0xB8, 0x00, 0x00, 0x00, 0x00,
+    0x01, 0xC3,
+    0x49,
+    0x75, 0xEF,
+    0xB8, 0x01, 0x00, 0x00, 0x00,
+    0xCD, 0x80
+])
+PATCHED_LOOP += bytes(TARGETS - len(PATCHED_LOOP)) + b''.join(
+    (0x14 if ecx == 20 else 0x1800).to_bytes(4, 'little') for ecx in range(100, 0, -1)
+)
+
+
+class TestBlockTranslator(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.stdout = io.StringIO()
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), self.stdout, self.stdout)
+
+    def test_hot_loop(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, HOT_LOOP)
+
+        self.assertEqual(self.vm.RETCODE, 1000 & 0o0377)
+        self.assertIn(4, self.vm.translator)
+
+    def test_invalidate_block(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, HOT_LOOP)
+        self.assertIn(4, self.vm.translator)
+
+        self.vm.mem.set(5, 1, 0x90)  # inc ecx -> nop
+
+        self.assertNotIn(4, self.vm.translator)
+        self.assertNotIn(5, self.vm.decode_cache)
+
+    def test_block_modifies_itself(self):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PATCHED_LOOP)
+
+        self.assertEqual(self.vm.reg.ebx, 20 * 20)
+        self.assertEqual(self.vm.instructions_retired, 3 + 100 * 7 + 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,87 @@
+import unittest
+import io
+import os
+import tempfile
+
+import VM
+from VM.kernel import DescriptorTable
+
+O_RDWR = 0o2
+
+
+class TestDescriptorTable(unittest.TestCase):
+    def setUp(self):
+        self.files = [io.StringIO() for _ in range(6)]
+        self.table = DescriptorTable(self.files[:3])
+
+    def test_open(self):
+        self.assertEqual([self.table.open(file) for file in self.files[3:]], [3, 4, 5])
+        self.assertIs(self.table[4], self.files[4])
+
+    def test_reuse_lowest(self):
+        for file in self.files[3:]:
+            self.table.open(file)
+
+        self.assertIs(self.table.close(4), self.files[4])
+        self.assertIs(self.table.close(1), self.files[1])
+        self.assertIsNone(self.table.close(1))  # already closed
+        self.assertIsNone(self.table.close(100))
+
+        self.assertEqual(self.table.open(self.files[1]), 1)
+        self.assertEqual(self.table.open(self.files[4]), 4)
+        self.assertEqual(self.table.open(io.StringIO()), 6)
+
+    def test_get(self):
+        self.table.close(2)
+
+        self.assertIs(self.table.get(0), self.files[0])
+        self.assertIsNone(self.table.get(2))
+        self.assertIsNone(self.table.get(3))
+        self.assertIsNone(self.table.get(-1))
+
+    def test_stats(self):
+        fd = self.table.open(self.files[3])
+        self.table.close(fd)
+        self.table.open(self.files[4])
+
+        self.assertEqual(self.table.stats(), {'open': 4, 'peak': 4, 'opened': 2})
+
+        table = DescriptorTable([self.files[0], None, self.files[2]])
+        self.assertEqual(table.stats(), {'open': 2, 'peak': 2, 'opened': 0})
+        self.assertEqual(table.open(self.files[1]), 1)
+
+
+class TestSyscalls(unittest.TestCase):
+    def setUp(self):
+        self.vm = VM.VMKernel(0x1000, io.StringIO(), io.StringIO(), io.StringIO())
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        for fd in range(3, len(self.vm.descriptors)):
+            file = self.vm.descriptors.close(fd)
+            if file is not None:
+                file.close()
+        self.directory.cleanup()
+
+    def open(self, name: str) -> int:
+        path = os.path.join(self.directory.name, name).encode() + b'\0'
+        open(path[:-1], 'w').close()
+
+        self.vm.mem.set_bytes(0x100, len(path), path)
+        return self.vm.kernel.sys_open(0x100, O_RDWR, 0)
+
+    def test_open_close(self):
+        descriptors = [self.open(f'file{i}') for i in range(10)]
+        self.assertEqual(descriptors, list(range(3, 13)))
+
+        self.assertEqual(self.vm.kernel.sys_close(7), 0)
+        self.assertEqual(self.vm.kernel.sys_close(5), 0)
+        self.assertEqual(self.vm.kernel.sys_close(5), -1)
+
+        self.assertEqual(self.open('again'), 5)
+        self.assertEqual(self.open('again'), 7)
+        self.assertEqual(self.vm.descriptors.stats(), {'open': 13, 'peak': 13, 'opened': 12})
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
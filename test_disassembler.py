@@ -0,0 +1,37 @@
+import unittest
+
+from VM.disassembler import disassemble
+
+
+class TestDisassembler(unittest.TestCase):
+    def check(self, code: str, text: str, address=0):
+        code = bytes.fromhex(code)
+
+        self.assertEqual(disassemble(code + bytes(8), address), (len(code), text))
+
+    def test_operands(self):
+        self.check('8b4c2404', 'mov ecx, dword [esp+0x4]')
+        self.check('0fafc3', 'imul eax, ebx')
+        self.check('83c301', 'add ebx, 0x1')
+        self.check('66b80100', 'mov ax, 0x1')
+
+    def test_relative(self):
+        self.check('e8fb0f0000', 'call 0x00001000')
+        self.check('ebfe', 'jmp 0x00000100', address=0x100)
+
+    def test_prefixes(self):
+        self.check('f3a5', 'rep movsd')
+        self.check('65a114000000', 'mov eax, dword gs:[0x14]')
+        self.check('f00fb10b', 'lock cmpxchg dword [ebx], ecx')
+
+    def test_x87(self):
+        self.check('d97dfe', 'fnstcw word [ebp-0x2]')
+        self.check('9bd97dfe', 'fstcw word [ebp-0x2]')
+
+    def test_invalid(self):
+        self.assertEqual(disassemble(b'\x8b', 0), (1, '(truncated)'))
+        self.assertEqual(disassemble(b'\x0f\x0b', 0)[1], '(unknown opcode 0xf0b)')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
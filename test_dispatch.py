@@ -0,0 +1,58 @@
+import unittest
+import io
+
+import VM
+from VM.util import CPUMeta, DispatchTable, DispatchGroup
+
+
+class TestDispatch(unittest.TestCase):
+    def setUp(self):
+        self.cpu = VM.VMKernel(1024, io.StringIO(), io.StringIO(), io.StringIO())
+
+    def test_one_byte(self):
+        self.assertEqual(self.cpu.dispatch[0x90].__name__, 'nop')
+
+    def test_escape(self):
+        self.assertIsInstance(self.cpu.dispatch[0x0F], DispatchTable)
+        self.assertIsNotNone(self.cpu.dispatch[0x0F][0x84])  # je rel32
+
+    def test_group(self):
+        group = self.cpu.dispatch[0x83]
+        self.assertIsInstance(group, DispatchGroup)
+
+        for REG in range(8):
+            with self.subTest(REG=REG):
+                self.assertIsNotNone(group.by_reg[REG])
+
+    def test_modrm_forms(self):
+        group = self.cpu.dispatch[0xD9]
+
+        self.assertIsNotNone(group.by_reg[0])  # FLD m32fp
+        for i in range(8):
+            with self.subTest(i=i):
+                self.assertIsNotNone(group.by_modrm[0xC0 + i])  # FLD ST(i)
+
+    def test_conflicts(self):
+        class Fake:
+            dispatch_names = DispatchTable()
+
+        CPUMeta.dispatch_instruction(Fake, 0x80, ['add'], {'add': 0})
+
+        with self.assertRaises(ValueError):
+            CPUMeta.dispatch_instruction(Fake, 0x80, ['sub'], {'sub': 0})
+
+        with self.assertRaises(ValueError):
+            CPUMeta.dispatch_instruction(Fake, 0x90, ['nop', 'xchg'], {})
+
+    def test_shift_is_not_x87(self):
+        # mov al, 3; shl al, 1; mov bl, al; mov eax, 1; int 0x80
+        code = bytes([0xB0, 0x03, 0xD0, 0xE0, 0x88, 0xC3, 0xB8, 0x01, 0x00, 0x00, 0x00, 0xCD, 0x80])
+        vm = VM.VMKernel(1024 * 10, io.StringIO(), io.StringIO(), io.StringIO())
+
+        vm.execute(VM.ExecutionStrategy.BYTES, code)
+
+        self.assertEqual(vm.RETCODE, 6)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+import VM
+from VM.ELF import ELF32, ELFCache, build_image
+
+PROGRAM = 'C/bin/hello_world.elf'
+MEMSZ = 0x0017801d
+
+
+class TestELFCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = ELFCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_program(self, fname=PROGRAM, cache=True):
+        output = io.StringIO()
+        vm = VM.VMKernel(MEMSZ, io.StringIO(), output, io.StringIO(), elf_cache=self.cache if cache else None)
+        vm.execute(VM.ExecutionStrategy.ELF, fname)
+
+        return vm.RETCODE, output.getvalue()
+
+    def test_hit(self):
+        expected = self.run_program(cache=False)
+
+        self.assertEqual(self.run_program(), expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+        self.assertEqual(self.run_program(), expected)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_image(self):
+        with ELF32(PROGRAM) as elf:
+            image = build_image(elf)
+
+        self.cache.get(PROGRAM)
+        cached = self.cache.get(PROGRAM)
+
+        self.assertEqual(cached[:3], image[:3])
+        self.assertEqual(cached.functions, image.functions)
+
+        segment, = cached.segments  # loaded with one copy
+        self.assertEqual((segment.address, segment.memsz), (image.base, image.end - image.base))
+
+        with open(PROGRAM, 'rb') as f, open(cached.source, 'rb') as data:
+            for original in image.segments:
+                f.seek(original.offset)
+                data.seek(segment.offset + original.address - image.base)
+                self.assertEqual(data.read(original.filesz), f.read(original.filesz))
+
+    def test_fast_path(self):
+        self.cache.get(PROGRAM)
+
+        with mock.patch.object(ELFCache, 'digest') as digest:
+            self.cache.get(PROGRAM)
+
+        digest.assert_not_called()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_modified(self):
+        fname = os.path.join(self.directory, 'program.elf')
+        shutil.copy(PROGRAM, fname)
+        self.cache.get(fname)
+
+        with open(fname, 'r+b') as file:  # same size, same modification time, different contents
+            stat = os.fstat(file.fileno())
+            file.seek(stat.st_size - 1)
+            file.write(bytes([file.read(1)[0] ^ 0xFF]))
+        os.utime(fname, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        self.cache.get(fname)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+    def test_corrupted(self):
+        self.cache.get(PROGRAM)
+        for name in os.listdir(self.cache.directory):
+            with open(os.path.join(self.cache.directory, name), 'wb') as file:
+                file.write(b'garbage')
+
+        self.assertEqual(self.run_program(), self.run_program(cache=False))
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 2))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,150 @@
+import unittest
+import io
+import random
+
+import VM
+from VM.kernel.freeBlocks import FreeBlocks, SortedList
+
+PROT_READ_WRITE = 0x3
+MAP_PRIVATE_ANONYMOUS = 0x22
+
+
+class TestFreeBlocks(unittest.TestCase):
+    def test_coalesce(self):
+        blocks = FreeBlocks([(0, 10), (20, 30), (40, 50)])
+
+        blocks.free(10, 20)  # touches two blocks
+        self.assertEqual(list(blocks), [(0, 30), (40, 50)])
+
+        blocks.free(25, 45)  # overlaps two blocks
+        self.assertEqual(list(blocks), [(0, 50)])
+
+        blocks.free(60, 70)
+        blocks.free(5, 8)  # contained in a block
+        self.assertEqual(list(blocks), [(0, 50), (60, 70)])
+
+    def test_best_fit(self):
+        blocks = FreeBlocks([(0, 100), (200, 210), (300, 320), (400, 410)])
+
+        self.assertEqual(blocks.allocate(10), 200)  # the lowest of the exact fits
+        self.assertEqual(blocks.allocate(15), 300)
+        self.assertEqual(list(blocks), [(0, 100), (315, 320), (400, 410)])
+        self.assertEqual(blocks.allocate(50), 0)
+        self.assertIsNone(blocks.allocate(60))
+
+    def test_truncate(self):
+        blocks = FreeBlocks([(0, 10), (20, 30), (40, 50)])
+
+        blocks.truncate(25)
+        self.assertEqual(list(blocks), [(0, 10), (20, 25)])
+        self.assertEqual(blocks.allocate(5), 20)
+        self.assertEqual(blocks.last(), (0, 10))
+
+    def test_many_blocks(self):
+        count = SortedList.LOAD * 8  # enough for the containers to be split
+        order = list(range(count))
+        random.Random(1).shuffle(order)
+
+        blocks = FreeBlocks()
+        for i in order:
+            blocks.free(i * 100, i * 100 + 1 + i % 50)
+
+        self.assertEqual(list(blocks), [(i * 100, i * 100 + 1 + i % 50) for i in range(count)])
+        self.assertEqual(blocks.last(), ((count - 1) * 100, (count - 1) * 100 + 1 + (count - 1) % 50))
+
+        self.assertEqual(blocks.allocate(50), 49 * 100)  # the lowest of the largest blocks
+        self.assertEqual(blocks.allocate(1), 0)
+
+        blocks.free(0, count * 100)
+        self.assertEqual(list(blocks), [(0, count * 100)])
+
+        blocks.truncate(150)
+        self.assertEqual(list(blocks), [(0, 150)])
+
+    def test_random(self):
+        rng = random.Random(42)
+        size = 2000
+        blocks, model = FreeBlocks(), [False] * size  # model: is the byte free?
+
+        for _ in range(5000):
+            if rng.random() < 0.5:
+                start = rng.randrange(size)
+                end = min(size, start + rng.randrange(1, 100))
+                blocks.free(start, end)
+                model[start:end] = [True] * (end - start)
+            else:
+                length = rng.randrange(1, 50)
+                runs = [(end - start, start) for start, end in runs_of(model)]
+                fits = [run for run in runs if run[0] >= length]
+
+                start = blocks.allocate(length)
+                if fits:
+                    self.assertEqual(start, min(fits)[1])
+                    model[start:start + length] = [False] * length
+                else:
+                    self.assertIsNone(start)
+
+            self.assertEqual(list(blocks), runs_of(model))
+            self.assertEqual(list(blocks.sizes), sorted((end - start, start) for start, end in blocks))
+
+
+def runs_of(model: list) -> list:
+    runs, start = [], None
+
+    for address, free in enumerate(model + [False]):
+        if free and start is None:
+            start = address
+        elif not free and start is not None:
+            runs.append((start, address))
+            start = None
+
+    return runs
+
+
+class TestSyscalls(unittest.TestCase):
+    def setUp(self):
+        self.vm = VM.VMKernel(1 << 20, io.StringIO(), io.StringIO(), io.StringIO())
+        self.vm.code_segment_end = self.vm.mem.program_break = 0x1000
+
+    def mmap(self, length: int) -> int:
+        return self.vm.kernel.sys_mmap(0, length, PROT_READ_WRITE, MAP_PRIVATE_ANONYMOUS, -1)
+
+    def munmap(self, address: int, length: int) -> int:
+        return self.vm.kernel.sys_munmap(address, length)
+
+    def test_reuse(self):
+        addresses = [self.mmap(0x100) for _ in range(4)]
+        self.assertEqual(addresses, [0x1000, 0x1100, 0x1200, 0x1300])
+
+        self.munmap(0x1000, 0x100)
+        self.munmap(0x1200, 0x80)
+        self.assertEqual(list(self.vm.kernel.free_memory_blocks), [(0x1000, 0x1100), (0x1200, 0x1280)])
+
+        self.vm.mem.set32(0x1200, 0xDEADBEEF)
+        self.assertEqual(self.mmap(0x80), 0x1200)  # the best fit
+        self.assertEqual(self.vm.mem.get32(0x1200), 0)  # zero-filled
+
+        self.munmap(0x1200, 0x100)
+        self.munmap(0x1100, 0x100)
+        self.assertEqual(list(self.vm.kernel.free_memory_blocks), [(0x1000, 0x1300)])
+
+        # unmapping the last mapping brings the break down past the free blocks
+        self.munmap(0x1300, 0x100)
+        self.assertEqual(self.vm.mem.program_break, 0x1000)
+        self.assertEqual(len(self.vm.kernel.free_memory_blocks), 0)
+
+    def test_brk(self):
+        for _ in range(4):
+            self.mmap(0x100)
+        self.munmap(0x1000, 0x100)
+        self.munmap(0x1200, 0x100)
+
+        self.assertEqual(self.vm.kernel.sys_brk(0x1280), 0x1280)
+        self.assertEqual(list(self.vm.kernel.free_memory_blocks), [(0x1000, 0x1100), (0x1200, 0x1280)])
+
+        self.assertEqual(self.mmap(0x100), 0x1000)
+        self.assertEqual(self.mmap(0x100), 0x1280)  # doesn't fit anywhere else
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
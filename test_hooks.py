@@ -0,0 +1,91 @@
+import unittest
+import io
+
+import VM
+
+FUNCTION = 0x100  # the address of the hooked function
+DATA = 0x200
+
+
+def call(*args) -> bytes:
+    """
+    Call the function at `FUNCTION` with the given arguments and exit with the result in EBX.
+    """
+    code = b''.join(bytes([0x68]) + arg.to_bytes(4, 'little') for arg in reversed(args))  # push imm32
+    code += bytes([0xE8]) + (FUNCTION - len(code) - 5).to_bytes(4, 'little')  # call FUNCTION
+    code += bytes([
+        0x83, 0xC4, 4 * len(args),  # add esp, 4 * len(args)
+        0x89, 0xC3,  # mov ebx, eax
+        0xB8, 0x01, 0x00, 0x00, 0x00,  # mov eax, 1
+        0xCD, 0x80  # int 0x80
+    ])
+
+    return code
+
+
+class TestLibcHooks(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO(), libc_hooks=True)
+
+    def run_hooked(self, name: str, code: bytes, data: bytes) -> int:
+        program = bytearray(DATA + len(data))
+        program[:len(code)] = code
+        program[FUNCTION] = 0xF4  # hlt: the function itself must not be executed
+        program[DATA:] = data
+
+        self.vm.libc_hooks.install({name: FUNCTION})
+        self.vm.execute(VM.ExecutionStrategy.BYTES, bytes(program))
+
+        return self.vm.reg.ebx
+
+    def test_strlen(self):
+        self.assertEqual(self.run_hooked('strlen', call(DATA), b'hello\0world\0'), 5)
+        self.assertEqual(self.run_hooked('strlen', call(DATA), b'\0'), 0)
+
+    def test_strcmp(self):
+        data = b'abc\0abd\0ab\0'
+
+        self.assertEqual(self.run_hooked('strcmp', call(DATA, DATA), data), 0)
+        self.assertEqual(self.run_hooked('strcmp', call(DATA, DATA + 4), data), (ord('c') - ord('d')) & 0xFFFFFFFF)
+        self.assertEqual(self.run_hooked('strcmp', call(DATA, DATA + 8), data), ord('c'))
+
+    def test_memcmp(self):
+        data = b'abcdabce'
+
+        self.assertEqual(self.run_hooked('memcmp', call(DATA, DATA + 4, 3), data), 0)
+        self.assertEqual(self.run_hooked('memcmp', call(DATA, DATA + 4, 4), data), (ord('d') - ord('e')) & 0xFFFFFFFF)
+
+    def test_strchr(self):
+        data = b'hello\0'
+
+        self.assertEqual(self.run_hooked('strchr', call(DATA, ord('l')), data), DATA + 2)
+        self.assertEqual(self.run_hooked('strchr', call(DATA, ord('x')), data), 0)
+        self.assertEqual(self.run_hooked('strchr', call(DATA, 0), data), DATA + 5)
+
+    def test_memset_memcpy(self):
+        self.assertEqual(self.run_hooked('memset', call(DATA, 0x1AB, 4), bytes(8)), DATA)
+        self.assertEqual(self.vm.mem.get_bytes(DATA, 8), bytes([0xAB] * 4 + [0] * 4))
+
+        self.assertEqual(self.run_hooked('memcpy', call(DATA + 4, DATA, 4), b'abcd\0\0\0\0'), DATA + 4)
+        self.assertEqual(self.vm.mem.get_bytes(DATA, 8), b'abcdabcd')
+
+    def test_uninstall(self):
+        self.vm.libc_hooks.install({'strlen': FUNCTION})
+        self.vm.libc_hooks.uninstall()
+
+        self.assertEqual(self.vm.hooks, {})
+
+    def test_elf(self):
+        output = io.StringIO()
+        vm = VM.VMKernel(0x0017801d, io.StringIO(), output, output, libc_hooks=True)
+
+        vm.execute(VM.ExecutionStrategy.ELF, 'C/bin/memcpy_test.elf')
+
+        self.assertEqual(vm.RETCODE, 0)
+        self.assertEqual(sorted(vm.libc_hooks.installed.values()), ['memcpy', 'memset'])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,9 +1,12 @@
 import unittest
 import os
+import io
 import ctypes
+import mmap
+import tempfile
 
-
-from VM.Memory import Memory
+import VM
+from VM.Memory import Memory, PagedMemory, PAGE_SIZE
 
 
 class TestMemory(unittest.TestCase):
@@ -103,5 +106,184 @@ class TestMemory(unittest.TestCase):
         self.do_test_set(4)
 
 
+class TestSizedAccessors(unittest.TestCase):
+    MEM_SIZE = 512
+
+    def setUp(self):
+        self.mem = Memory(self.MEM_SIZE)
+        self.random_data = os.urandom(self.MEM_SIZE)
+        ctypes.memmove(self.mem.mem, self.random_data, self.MEM_SIZE)
+
+    def test_get(self):
+        for size in 1, 2, 4:
+            get = getattr(self.mem, f'get{size * 8}')
+            get_signed = getattr(self.mem, f'get{size * 8}s')
+            get_eip = getattr(self.mem, f'get_eip{size * 8}')
+            get_eip_signed = getattr(self.mem, f'get_eip{size * 8}s')
+
+            for offset in range(self.mem.size - size + 1):
+                data = self.random_data[offset:offset + size]
+                correct = int.from_bytes(data, 'little')
+                correct_signed = int.from_bytes(data, 'little', signed=True)
+
+                self.assertEqual(get(offset), correct)
+                self.assertEqual(get(offset), self.mem.get(offset, size))
+                self.assertEqual(get_eip(offset), correct)
+                self.assertEqual(get_signed(offset), correct_signed)
+                self.assertEqual(get_eip_signed(offset), correct_signed)
+
+    def test_set(self):
+        for size in 1, 2, 4:
+            set_ = getattr(self.mem, f'set{size * 8}')
+
+            for offset in range(self.mem.size - size + 1):
+                correct = int.from_bytes(os.urandom(size), 'little')
+                set_(offset, correct)
+
+                self.assertEqual(self.mem.get(offset, size), correct)
+
+    def test_bounds(self):
+        for size in 1, 2, 4:
+            with self.assertRaises(MemoryError):
+                getattr(self.mem, f'get{size * 8}')(self.mem.size - size + 1)
+
+            with self.assertRaises(MemoryError):
+                getattr(self.mem, f'get_eip{size * 8}')(self.mem.size - size + 1)
+
+            with self.assertRaises(MemoryError):
+                getattr(self.mem, f'set{size * 8}')(self.mem.size - size + 1, 0)
+
+    def test_paged(self):
+        mem = PagedMemory(PAGE_SIZE * 4)
+        offset = PAGE_SIZE * 2 - 2  # crosses the page boundary
+
+        mem.set32(offset, 0xDEADBEEF)
+
+        self.assertEqual(mem.get32(offset), 0xDEADBEEF)
+        self.assertEqual(mem.get16s(offset + 2), -0x2153)
+        self.assertEqual(mem.get8(offset), 0xEF)
+
+
+class TestPagedMemory(unittest.TestCase):
+    def setUp(self):
+        self.mem = PagedMemory()
+
+    def test_size(self):
+        self.assertEqual(self.mem.size, 1 << 32)
+        self.assertEqual(self.mem.committed_pages, 0)
+
+    def test_untouched_pages(self):
+        self.assertEqual(self.mem.get(0x12345678, 4), 0)
+        self.assertEqual(self.mem.get_bytes(0x80000000, 16), bytes(16))
+        self.assertEqual(self.mem.committed_pages, 0)
+
+    def test_commit(self):
+        self.mem.set(0xFFFFFFFC, 4, 0xDEADBEEF)
+        self.mem.set(0xFFFFFFF8, 4, 0xCAFEBABE)  # same page
+
+        self.assertEqual(self.mem.get(0xFFFFFFFC, 4), 0xDEADBEEF)
+        self.assertEqual(self.mem.get(0xFFFFFFF8, 4), 0xCAFEBABE)
+        self.assertEqual(self.mem.committed_pages, 1)
+
+        self.mem.set_bytes(PAGE_SIZE - 1, 2, b'ab')  # crosses the boundary of two pages
+        self.mem.memset(PAGE_SIZE * 10, 0, PAGE_SIZE * 3)
+
+        self.assertEqual(self.mem.get_bytes(PAGE_SIZE - 1, 2), b'ab')
+        self.assertEqual(self.mem.committed_pages, 6)
+
+    def test_memsz(self):
+        mem = PagedMemory(PAGE_SIZE * 3 + 1)
+
+        self.assertEqual(mem.size, PAGE_SIZE * 4)
+        self.assertEqual(len(mem.mapping), PAGE_SIZE * 4)
+
+    def test_tracking(self):
+        self.mem.set(PAGE_SIZE * 5, 4, 1)
+
+        writes = []
+        self.mem.trace_writes(lambda address, size: writes.append((address, size)))
+        self.mem.mark_clean()
+
+        self.mem.set(PAGE_SIZE * 5, 4, 2)
+        self.mem.set(PAGE_SIZE * 7, 4, 3)  # committed while tracking
+        self.mem.set(PAGE_SIZE * 7 + 4, 4, 4)
+
+        self.assertEqual(writes, [(PAGE_SIZE * 5, 4), (PAGE_SIZE * 7, 4), (PAGE_SIZE * 7 + 4, 4)])
+        self.assertEqual(self.mem.dirty_pages, {5, 7})
+        self.assertEqual(sorted(self.mem.copy_pages()), [5, 7])
+
+        self.mem.trace_writes(None)
+        self.assertFalse(any(bits & VM.Memory.PAGE_TRACED for bits in self.mem.page_state))
+
+    def test_execute(self):
+        vm = VM.VMKernel(0, io.StringIO(), io.StringIO(), io.StringIO(), paged=True)
+
+        # push 7; pop ebx; mov eax, 1; int 0x80
+        vm.execute(VM.ExecutionStrategy.BYTES, bytes([0x6A, 0x07, 0x5B, 0xB8, 0x01, 0x00, 0x00, 0x00, 0xCD, 0x80]))
+
+        self.assertEqual(vm.RETCODE, 7)
+        self.assertEqual(vm.mem.committed_pages, 2)  # the code and the stack
+
+
+class TestMapFile(unittest.TestCase):
+    def setUp(self):
+        self.data = os.urandom(mmap.PAGESIZE * 4 + 100)
+        self.file = tempfile.NamedTemporaryFile()
+        self.file.write(self.data)
+        self.file.flush()
+
+    def tearDown(self):
+        self.file.close()
+
+    def check(self, mem, offset, file_offset, size):
+        mem.map_file(offset, size, self.file, file_offset)
+
+        self.assertEqual(mem.get_bytes(offset, size), self.data[file_offset:file_offset + size])
+        self.assertEqual(mem.get_bytes(offset - 1, 1) + mem.get_bytes(offset + size, 1), bytes(2))
+
+    def test_memory(self):
+        mem = Memory(len(self.data) * 2)
+
+        self.check(mem, 3, 0, len(self.data))
+        self.check(mem, len(self.data) + 20, 50, 1000)
+
+        with self.assertRaises(MemoryError):
+            mem.map_file(len(self.data) * 2 - 10, 20, self.file, 0)
+
+        with self.assertRaises(ValueError):
+            mem.map_file(0, 200, self.file, len(self.data) - 100)
+
+    def test_paged(self):
+        mem = PagedMemory()
+        offset = 0x8048000
+
+        self.check(mem, offset, 0, len(self.data))
+        self.check(mem, 0x100000 + 3, 0, len(self.data))
+        self.check(mem, offset + 0x10000 + 7, 7, mmap.PAGESIZE * 3)  # partial pages at both edges
+
+        self.assertEqual(mem.committed_pages, 5 + 5 + 4)
+
+        # the data is copied: changing the file doesn't change the memory and vice versa
+        mem.set32(offset + 8, 0xDEADBEEF)
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.flush()
+
+        self.assertEqual(mem.get32(offset + 8), 0xDEADBEEF)
+        self.assertEqual(mem.get_bytes(offset + mmap.PAGESIZE, 16), self.data[mmap.PAGESIZE:mmap.PAGESIZE + 16])
+
+    def test_execute_flat(self):
+        vm = VM.VMKernel(0, io.StringIO(), io.StringIO(), io.StringIO(), paged=True)
+
+        # mov ebx, 9; mov eax, 1; int 0x80
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(bytes([0xBB, 0x09, 0x00, 0x00, 0x00, 0xB8, 0x01, 0x00, 0x00, 0x00, 0xCD, 0x80]))
+        self.file.flush()
+
+        vm.execute(VM.ExecutionStrategy.FLAT, self.file.name)
+        self.assertEqual(vm.RETCODE, 9)
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
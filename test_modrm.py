@@ -0,0 +1,67 @@
+import unittest
+import io
+
+import VM
+from VM.misc import decode_ModRM, MODRM_TABLE, SIB_TABLE
+
+DISPLACEMENT = bytes([0x78, 0x56, 0x34, 0x92])
+
+
+def reference_decode(ModRM: int, SIB: int) -> tuple:
+    """
+    Decode ModRM and SIB bytes followed by `DISPLACEMENT` bit by bit, as described in the manual.
+    """
+    MOD, REG, RM = ModRM >> 6, (ModRM >> 3) & 7, ModRM & 7
+    disp8 = int.from_bytes(DISPLACEMENT[:1], 'little', signed=True)
+    disp32 = int.from_bytes(DISPLACEMENT, 'little', signed=True)
+
+    if MOD == 3:
+        return True, RM, None, 0, 0, REG, 1
+
+    if RM != 4:
+        if MOD == 0 and RM == 5:
+            return False, None, None, 0, disp32, REG, 5
+
+        return False, RM, None, 0, (0, disp8, disp32)[MOD], REG, 1 + (0, 1, 4)[MOD]
+
+    scale, index, base = SIB >> 6, (SIB >> 3) & 7, SIB & 7
+    index = None if index == 4 else index
+
+    if MOD == 0 and base == 5:
+        return False, None, index, scale, disp32, REG, 6
+
+    return False, base, index, scale, (0, disp8, disp32)[MOD], REG, 2 + (0, 1, 4)[MOD]
+
+
+class TestModRMTables(unittest.TestCase):
+    def setUp(self):
+        self.vm = VM.VM(1024, io.StringIO(), io.StringIO(), io.StringIO())
+
+    def test_size(self):
+        self.assertEqual(len(MODRM_TABLE), 256)
+        self.assertEqual([len(table) for table in SIB_TABLE], [256] * 3)
+
+    def test_decode(self):
+        for ModRM in range(256):
+            for SIB in range(256):
+                # the displacement follows the SIB byte only if there is one
+                code = bytes([ModRM, SIB] if ModRM & 7 == 4 else [ModRM]) + DISPLACEMENT
+                self.vm.mem.set_bytes(0, len(code), code)
+                self.vm.eip = 0
+
+                self.assertEqual(decode_ModRM(self.vm), reference_decode(ModRM, SIB), (ModRM, SIB))
+
+    def test_register_operands(self):
+        self.vm.mem.set_bytes(0, 2, bytes([0b11_010_001, 0b11_010_001]))
+        self.vm.eip = 0
+
+        first = self.vm.process_ModRM()
+        second = self.vm.process_ModRM()
+
+        self.assertEqual(first, ((self.vm.reg, 1), (self.vm.reg, 2)))
+        self.assertIs(first[0], second[0])
+        self.assertIs(first[1], second[1])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,152 @@
+import unittest
+import errno
+import io
+import os
+import tempfile
+
+import VM
+from VM.kernel.outputBuffer import OutputBuffer, IOV_MAX
+
+MEMSZ = 0x1000
+
+
+class CountingIO(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = 0
+
+    def write(self, s):
+        self.writes += 1
+        return super().write(s)
+
+
+class PromptedInput(io.StringIO):
+    """
+    Standard input that remembers what was in the standard output when it was read.
+    """
+    def __init__(self, stdout):
+        super().__init__('42')
+        self.stdout = stdout
+        self.seen = None
+
+    def read(self, size=-1):
+        self.seen = self.stdout.getvalue()
+        return super().read(size)
+
+
+class TestOutputBuffer(unittest.TestCase):
+    def setUp(self):
+        self.stdout = CountingIO()
+        self.vm = VM.VMKernel(MEMSZ, io.StringIO(), self.stdout, io.StringIO())
+
+    def write(self, fd: int, data: bytes) -> int:
+        self.vm.mem.set_bytes(0x100, len(data), data)
+        return self.vm.kernel.sys_write(fd, 0x100, len(data))
+
+    def test_coalesce(self):
+        for line in (b'one\n', b'two\n', b'three\n'):
+            self.assertEqual(self.write(1, line), len(line))
+
+        self.assertEqual(self.stdout.getvalue(), '')
+
+        self.vm.kernel.output.flush()
+        self.assertEqual(self.stdout.getvalue(), 'one\ntwo\nthree\n')
+        self.assertEqual(self.stdout.writes, 1)
+
+    def test_limit(self):
+        self.vm.kernel.output.limit = 8
+
+        self.write(1, b'abcd')
+        self.assertEqual(self.stdout.getvalue(), '')
+        self.write(1, b'efgh')
+        self.assertEqual(self.stdout.getvalue(), 'abcdefgh')
+
+    def test_read(self):
+        stdin = self.vm.descriptors[0] = PromptedInput(self.stdout)
+
+        self.write(1, b'Number: ')
+        self.vm.kernel.sys_read(0, 0x200, 2)
+
+        self.assertEqual(stdin.seen, 'Number: ')
+
+    def test_interleaved(self):
+        stdout = self.vm.descriptors[2] = self.stdout  # both go to the same place, like `2>&1`
+
+        self.write(1, b'one\n')
+        self.write(2, b'error\n')
+        self.write(1, b'two\n')
+        self.vm.kernel.output.flush()
+
+        self.assertEqual(stdout.getvalue(), 'one\nerror\ntwo\n')
+
+    def test_broken_pipe(self):
+        read, write = os.pipe()
+        os.close(read)
+
+        with os.fdopen(write, 'wb') as writer:
+            self.vm.descriptors[1] = writer
+
+            self.assertEqual(self.write(1, b'lost'), 4)
+            self.vm.kernel.sys_read(0, 0x200, 1)  # flushes the output, the error is kept for the next write
+            self.assertEqual(self.write(1, b'lost'), -errno.EPIPE)
+
+            self.vm.kernel.output.limit = 0
+            self.assertEqual(self.write(1, b'lost'), -errno.EPIPE)
+
+            self.vm.kernel.output.limit = 1 << 16
+            self.write(1, b'lost')
+            self.assertEqual(self.vm.kernel.sys_fsync(1), -errno.EPIPE)
+
+    def test_bad_descriptor(self):
+        self.assertEqual(self.write(10, b'lost'), -1)
+
+    def test_fsync(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'output')
+
+            with open(path, 'wb') as file:
+                self.assertEqual(self.vm.descriptors.open(file), 3)
+                self.write(3, b'data')
+
+                with open(path, 'rb') as check:
+                    self.assertEqual(check.read(), b'')
+
+                self.assertEqual(self.vm.kernel.sys_fsync(3), 0)
+
+                with open(path, 'rb') as check:
+                    self.assertEqual(check.read(), b'data')
+
+    def test_execute(self):
+        # write(1, "Hi!\n", 4) twice; exit(0)
+        code = bytes([
+            0xB8, 0x04, 0x00, 0x00, 0x00, 0xBB, 0x01, 0x00, 0x00, 0x00, 0xB9, 0x2B, 0x00, 0x00, 0x00,
+            0xBA, 0x04, 0x00, 0x00, 0x00, 0xCD, 0x80,
+            0xB8, 0x04, 0x00, 0x00, 0x00, 0xCD, 0x80,
+            0xB8, 0x01, 0x00, 0x00, 0x00, 0x31, 0xDB, 0xCD, 0x80,
+        ])
+        code += bytes(0x2B - len(code)) + b'Hi!\n'
+
+        self.vm.execute(VM.ExecutionStrategy.BYTES, code)
+
+        self.assertEqual(self.stdout.getvalue(), 'Hi!\nHi!\n')
+        self.assertEqual(self.stdout.writes, 1)
+
+
+class TestWritev(unittest.TestCase):
+    def test_many_chunks(self):
+        read, write = os.pipe()
+
+        with os.fdopen(read, 'rb') as reader, os.fdopen(write, 'wb') as writer:
+            cpu = type('CPU', (), {'descriptors': [None, writer]})
+            buffer = OutputBuffer(cpu)
+
+            chunks = [bytes([i % 256]) * 3 for i in range(IOV_MAX * 2 + 5)]
+            buffer.write(1, chunks)
+            buffer.flush()
+            writer.close()
+
+            self.assertEqual(reader.read(), b''.join(chunks))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
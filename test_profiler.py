@@ -0,0 +1,100 @@
+import unittest
+import io
+
+import VM
+from VM.profiler import format_report
+
+#     mov ecx, 10
+# loop:
+#     add eax, 1
+#     dec ecx
+#     jnz loop
+#     mov eax, 1
+#     xor ebx, ebx
+#     int 0x80
+LOOP = bytes([
+    0xB9, 0x0A, 0x00, 0x00, 0x00,
+    0x83, 0xC0, 0x01,
+    0x49,
+    0x75, 0xFA,
+    0xB8, 0x01, 0x00, 0x00, 0x00,
+    0x31, 0xDB,
+    0xCD, 0x80
+])
+
+
+def loop(iterations: int) -> bytes:
+    return bytes([0xB9]) + iterations.to_bytes(4, 'little') + LOOP[5:]
+
+
+class TestInstructionsRetired(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def run_loop(self, iterations: int, profile: bool) -> int:
+        vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO(), profile=profile)
+        vm.execute(VM.ExecutionStrategy.BYTES, loop(iterations))
+        self.assertEqual(vm.RETCODE, 0)
+
+        return vm.instructions_retired
+
+    def test_compiled_blocks(self):
+        # enough iterations for the loop body to be compiled
+        expected = 1 + 1000 * 3 + 3
+
+        self.assertEqual(self.run_loop(1000, profile=False), expected)
+        self.assertEqual(self.run_loop(1000, profile=True), expected)
+
+
+class TestProfiler(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO(), profile=True)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, LOOP)
+        self.report = self.vm.profiler.report()
+
+    def counts(self, key: str) -> dict:
+        return {entry[key]: entry['count'] for entry in self.report[key + 's']}
+
+    def test_disabled(self):
+        vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO())
+        self.assertIsNone(vm.profiler)
+
+    def test_instructions(self):
+        self.assertEqual(self.vm.RETCODE, 0)
+        self.assertEqual(self.report['instructions'], 1 + 10 * 3 + 3)
+
+    def test_handlers(self):
+        handlers = self.counts('handler')
+
+        self.assertEqual(handlers['i_ADDSUB_rm_imm'], 10)
+        self.assertEqual(handlers['i_INCDEC_r'], 10)
+        self.assertEqual(handlers['i_MOV_r_imm'], 2)
+        self.assertEqual(handlers['i_INT_imm'], 1)
+
+    def test_opcodes(self):
+        opcodes = self.counts('opcode')
+
+        self.assertEqual(opcodes[0x49], 10)
+        self.assertEqual(opcodes[0x75], 10)
+
+    def test_hot_eips(self):
+        self.assertEqual(
+            {entry['eip'] for entry in self.report['hot_eips'] if entry['count'] == 10},
+            {5, 8, 9}
+        )
+
+    def test_runs(self):
+        # the first iteration is decoded one instruction at a time, the rest are executed from the cache
+        self.assertEqual(self.vm.profiler.runs[5, 3], 9)
+        self.assertEqual(self.vm.profiler.runs[5, 1], 1)
+
+    def test_format(self):
+        text = format_report(self.report)
+
+        self.assertIn('Instructions retired: 34', text)
+        self.assertIn('i_ADDSUB_rm_imm', text)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
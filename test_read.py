@@ -0,0 +1,99 @@
+import unittest
+import io
+import os
+
+import VM
+
+MEMSZ = 0x1000
+DATA = bytes(range(256)) * 4
+
+
+class TestRead(unittest.TestCase):
+    def setUp(self):
+        self.vm = VM.VMKernel(MEMSZ, io.StringIO(), io.StringIO(), io.StringIO())
+
+    def read(self, fd: int, address: int, count: int) -> int:
+        return self.vm.kernel.sys_read(fd, address, count)
+
+    def test_binary_file_object(self):
+        self.vm.descriptors[0] = io.BytesIO(DATA)
+
+        self.assertEqual(self.read(0, 0x100, 1000), 1000)
+        self.assertEqual(self.read(0, 0x100 + 1000, 1000), len(DATA) - 1000)
+        self.assertEqual(self.read(0, 0x100, 1000), 0)  # end of file
+
+        self.assertEqual(self.vm.mem.get_bytes(0x100, len(DATA)), DATA)
+
+    def test_host_descriptor(self):
+        read, write = os.pipe()
+        os.write(write, DATA)
+        os.close(write)
+
+        with os.fdopen(read, 'rb') as file:
+            self.vm.descriptors[0] = file
+
+            self.assertEqual(self.read(0, 0x200, 10), 10)
+            self.assertEqual(self.read(0, 0x20A, 2000), len(DATA) - 10)
+
+        self.assertEqual(self.vm.mem.get_bytes(0x200, len(DATA)), DATA)
+
+    def test_text_stream(self):
+        self.vm.descriptors[0] = io.StringIO('42\n7')
+
+        self.assertEqual(self.read(0, 0x100, 2), 2)
+        self.assertEqual(self.read(0, 0x102, 10), 2)
+        self.assertEqual(self.vm.mem.get_bytes(0x100, 5), b'42\n7\0')
+
+        self.assertEqual(self.read(0, 0x100, 10), 0)  # end of stream
+
+    def test_errors(self):
+        self.assertEqual(self.read(7, 0x100, 10), -1)
+
+        self.vm.descriptors[0] = io.BytesIO(DATA)
+        with self.assertRaises(MemoryError):
+            self.read(0, MEMSZ + 10, 20)
+
+    def test_top_of_memory(self):
+        read, write = os.pipe()
+        os.write(write, b'hi\n')
+        os.close(write)
+
+        with os.fdopen(read, 'rb') as file:
+            self.vm.descriptors[0] = file
+            self.assertEqual(self.read(0, MEMSZ - 16, 4096), 3)
+
+        self.assertEqual(self.vm.mem.get_bytes(MEMSZ - 16, 3), b'hi\n')
+
+        self.vm.descriptors[0] = io.BytesIO(DATA)
+        self.assertEqual(self.read(0, MEMSZ - 10, 20), 10)
+        self.assertEqual(self.vm.mem.get_bytes(MEMSZ - 10, 10), DATA[:10])
+
+    def test_reported_writes(self):
+        writes = []
+        self.vm.mem.trace_writes(lambda address, size: writes.append((address, size)))
+        self.vm.descriptors[0] = io.BytesIO(b'short')
+
+        self.assertEqual(self.read(0, 0x100, 1000), 5)
+        self.assertEqual(writes, [(0x100, 5)])
+        self.assertEqual(self.vm.mem.get_bytes(0x100, 5), b'short')
+
+    def test_overwrite_code(self):
+        code = bytes([
+            0xBB, 0x01, 0x00, 0x00, 0x00,  # again: mov ebx, 1
+            0x85, 0xF6,  # test esi, esi
+            0x75, 0x19,  # jnz exit
+            0x46,  # inc esi
+            0xB8, 0x03, 0x00, 0x00, 0x00, 0xBB, 0x00, 0x00, 0x00, 0x00,
+            0xB9, 0x00, 0x00, 0x00, 0x00, 0xBA, 0x05, 0x00, 0x00, 0x00,
+            0xCD, 0x80,  # read(0, again, 5)
+            0xEB, 0xDE,  # jmp again
+            0xB8, 0x01, 0x00, 0x00, 0x00, 0xCD, 0x80,  # exit: exit(ebx)
+        ])
+        self.vm.descriptors[0] = io.BytesIO(bytes([0x43] * 5))  # inc ebx (x5)
+
+        self.vm.execute(VM.ExecutionStrategy.BYTES, code)
+        self.assertEqual(self.vm.RETCODE, 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -1,8 +1,9 @@
 import unittest
 import os
+import io
 
-
-from VM.Registers import Reg32
+import VM
+from VM.Registers import Reg32, IntReg32, FLAGS_ADD, FLAGS_SUB, FLAGS_INC, FLAGS_LOGIC
 
 
 class TestRegisters(unittest.TestCase):
@@ -16,8 +17,10 @@ class TestRegisters(unittest.TestCase):
     NAMES_LO = {'al': 0, 'cl': 1, 'dl': 2, 'bl': 3}
     NAMES_HI = {'ah': 4, 'ch': 5, 'dh': 6, 'bh': 7}
 
+    REGISTERS = Reg32
+
     def setUp(self):
-        self.reg = Reg32()
+        self.reg = self.REGISTERS()
 
         self.random_data = [
             int.from_bytes(os.urandom(4), 'little')
@@ -96,5 +99,116 @@ class TestRegisters(unittest.TestCase):
                 self.assertEqual(ret, correct)
 
 
+    def test_set(self):
+        for offset in range(8):
+            with self.subTest(offset=offset, size=4):
+                self.reg.set(offset, 4, -2)
+                self.assertEqual(self.reg.get(offset, 4), 0xFFFFFFFE)
+
+            with self.subTest(offset=offset, size=2):
+                self.reg.set(offset, 2, 0x12345)
+                self.assertEqual(self.reg.get(offset, 4), 0xFFFF2345)
+
+        for offset in range(4):
+            with self.subTest(offset=offset, size=1):
+                self.reg.set(offset, 4, 0x11223344)
+                self.reg.set(offset, 1, 0x1AA)
+                self.reg.set(offset + 4, 1, -1)
+                self.assertEqual(self.reg.get(offset, 4), 0x1122FFAA)
+
+    def test_names(self):
+        self.reg.esi = 0x12345678
+        self.reg.si = 0xABCD
+
+        self.assertEqual(self.reg.esi, 0x1234ABCD)
+        self.assertEqual(self.reg.get(6, 4), 0x1234ABCD)
+
+    def test_save_load(self):
+        self.reg.eflags.CF = 1
+        state = self.reg.save()
+
+        self.reg.set(0, 4, 0)
+        self.reg.lazy_flags = FLAGS_LOGIC, 0, 0, 0, 4
+        self.reg.load(state)
+
+        self.assertEqual(self.reg.eax, self.random_data[0])
+        self.assertEqual(self.reg.get_CF(), 1)
+
+
+class TestIntRegisters(TestRegisters):
+    REGISTERS = IntReg32
+
+
+class TestLazyFlags(unittest.TestCase):
+    FLAGS = 'CF PF AF ZF SF OF'.split()
+    REGISTERS = Reg32
+
+    def setUp(self):
+        self.reg = self.REGISTERS()
+
+    def check(self, record, **correct):
+        self.reg.lazy_flags = record
+        lazy = {flag: int(getattr(self.reg, 'get_' + flag)()) for flag in self.FLAGS}
+
+        materialized = {flag: getattr(self.reg.eflags, flag) for flag in self.FLAGS}
+        self.assertIsNone(self.reg.lazy_flags)
+
+        self.assertEqual(lazy, materialized)
+        for flag, value in correct.items():
+            with self.subTest(record=record, flag=flag):
+                self.assertEqual(materialized[flag], value)
+
+    def test_add(self):
+        self.check((FLAGS_ADD, 0xFF, 1, 0x100, 1), CF=1, ZF=1, SF=0, OF=0, PF=1)
+        self.check((FLAGS_ADD, 0x7F, 1, 0x80, 1), CF=0, ZF=0, SF=1, OF=1, PF=0)
+
+    def test_sub(self):
+        self.check((FLAGS_SUB, 1, 2, 1 + 0x10000 - 2, 2), CF=1, ZF=0, SF=1, OF=0)
+        self.check((FLAGS_SUB, 5, 5, 5 + 0x100000000 - 5, 4), CF=0, ZF=1, SF=0, OF=0, PF=1)
+
+    def test_inc_preserves_carry(self):
+        self.check((FLAGS_INC, 0xFFFFFFFF, 1, 0x100000000, 4), CF=1, ZF=1, OF=0)
+        self.check((FLAGS_INC, 0x7FFFFFFF, 0, 0x80000000, 4), CF=0, ZF=0, SF=1, OF=1)
+
+    def test_logic(self):
+        self.reg.eflags.CF = self.reg.eflags.OF = 1
+        self.check((FLAGS_LOGIC, 0xF0, 0x0F, 0, 1), CF=0, OF=0, ZF=1, PF=1)
+
+    def test_write_after_record(self):
+        self.reg.lazy_flags = FLAGS_SUB, 1, 2, 0xFF, 1
+        self.reg.eflags.CF = 0
+
+        self.assertIsNone(self.reg.lazy_flags)
+        self.assertEqual(self.reg.eflags.CF, 0)
+        self.assertEqual(self.reg.eflags.SF, 1)
+
+    def test_execute(self):
+        code = bytes([
+            0xB0, 0xFF,  # mov al, 0xFF
+            0x04, 0x01,  # add al, 1   ; CF = 1
+            0x41,  # inc ecx           ; CF is preserved
+            0xBB, 0x00, 0x00, 0x00, 0x00,  # mov ebx, 0
+            0x80, 0xD3, 0x00,  # adc bl, 0  ; bl = 1
+            0x31, 0xD2,  # xor edx, edx
+            0xF7, 0xDA,  # neg edx     ; ZF = 1
+            0x0F, 0x94, 0xC2,  # setz dl
+            0x00, 0xD3,  # add bl, dl  ; bl = 2
+            0xB8, 0x01, 0x00, 0x00, 0x00,  # mov eax, 1
+            0xCD, 0x80  # int 0x80
+        ])
+        vm = VM.VMKernel(
+            1024 * 10, io.StringIO(), io.StringIO(), io.StringIO(), int_registers=self.REGISTERS is IntReg32
+        )
+
+        vm.execute(VM.ExecutionStrategy.BYTES, code)
+
+        self.assertEqual(vm.RETCODE, 2)
+        self.assertIsInstance(vm.reg, self.REGISTERS)
+
+
+class TestIntLazyFlags(TestLazyFlags):
+    REGISTERS = IntReg32
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
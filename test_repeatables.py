@@ -0,0 +1,93 @@
+import unittest
+import io
+
+import VM
+
+EXIT = bytes([0xB8, 0x01, 0x00, 0x00, 0x00, 0x31, 0xDB, 0xCD, 0x80])  # mov eax, 1; xor ebx, ebx; int 0x80
+
+EAX, ECX, ESI, EDI = 0, 1, 6, 7
+
+
+def mov(reg: int, value: int) -> bytes:
+    # mov r32, imm32
+    return bytes([0xB8 + reg]) + value.to_bytes(4, 'little')
+
+
+REP_STOSB, REP_STOSD = bytes([0xF3, 0xAA]), bytes([0xF3, 0xAB])
+REP_MOVSB, REP_MOVSD = bytes([0xF3, 0xA4]), bytes([0xF3, 0xA5])
+STD, CLD = bytes([0xFD]), bytes([0xFC])
+
+
+class TestREP(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO())
+
+    def run_code(self, *parts):
+        self.vm.execute(VM.ExecutionStrategy.BYTES, b''.join(parts) + EXIT)
+        self.assertEqual(self.vm.RETCODE, 0)
+
+    def memory(self, address: int, size: int) -> bytes:
+        return self.vm.mem.get_bytes(address, size)
+
+    def test_stosd(self):
+        self.run_code(mov(EDI, 0x1000), mov(EAX, 0x11223344), mov(ECX, 16), REP_STOSD)
+
+        self.assertEqual(self.memory(0x1000, 68), bytes([0x44, 0x33, 0x22, 0x11]) * 16 + bytes(4))
+        self.assertEqual(self.vm.reg.ecx, 0)
+        self.assertEqual(self.vm.reg.edi, 0x1040)
+
+    def test_stosb_backward(self):
+        self.run_code(mov(EDI, 0x1100), mov(EAX, 0xAB), mov(ECX, 16), STD, REP_STOSB, CLD)
+
+        self.assertEqual(self.memory(0x10F0, 18), bytes([0]) + bytes([0xAB]) * 16 + bytes([0]))
+        self.assertEqual(self.vm.reg.edi, 0x10F0)
+
+    def test_zero_count(self):
+        self.run_code(mov(EDI, 0x1000), mov(EAX, 0xFF), mov(ECX, 0), REP_STOSB)
+
+        self.assertEqual(self.memory(0x1000, 1), bytes(1))
+        self.assertEqual(self.vm.reg.edi, 0x1000)
+
+    def test_movsd(self):
+        self.run_code(
+            mov(EDI, 0x1000), mov(EAX, 0x01020304), mov(ECX, 8), REP_STOSD,
+            mov(ESI, 0x1000), mov(EDI, 0x1800), mov(ECX, 8), REP_MOVSD
+        )
+
+        self.assertEqual(self.memory(0x1800, 32), bytes([4, 3, 2, 1]) * 8)
+        self.assertEqual(self.vm.reg.esi, 0x1020)
+        self.assertEqual(self.vm.reg.edi, 0x1820)
+        self.assertEqual(self.vm.reg.ecx, 0)
+
+    def test_movsb_backward(self):
+        self.run_code(
+            mov(EDI, 0x1000), mov(EAX, 0x01020304), mov(ECX, 1), REP_STOSD,
+            mov(ESI, 0x1003), mov(EDI, 0x1803), mov(ECX, 4), STD, REP_MOVSB, CLD
+        )
+
+        self.assertEqual(self.memory(0x1800, 4), bytes([4, 3, 2, 1]))
+        self.assertEqual(self.vm.reg.esi, 0x0FFF)
+        self.assertEqual(self.vm.reg.edi, 0x17FF)
+
+    def test_movsb_overlapping(self):
+        # copying byte by byte forward replicates the first byte
+        self.run_code(
+            mov(EDI, 0x1000), mov(EAX, 0xAA), mov(ECX, 1), REP_STOSB,
+            mov(ESI, 0x1000), mov(EDI, 0x1001), mov(ECX, 8), REP_MOVSB
+        )
+
+        self.assertEqual(self.memory(0x1000, 10), bytes([0xAA]) * 9 + bytes(1))
+        self.assertEqual(self.vm.reg.edi, 0x1009)
+
+    def test_self_modifying(self):
+        # overwrite the code that has just been executed
+        self.run_code(mov(EDI, 0), mov(EAX, 0x90), mov(ECX, 5), REP_STOSB)
+
+        self.assertEqual(self.memory(0, 5), bytes([0x90]) * 5)
+        self.assertNotIn(0, self.vm.decode_cache)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,94 @@
+import unittest
+import io
+
+import VM
+from VM.ELF import SymbolIndex
+from VM.sampler import SamplingProfiler
+
+#     call f           ; 0x00
+#     mov eax, 1       ; 0x05
+#     int 0x80         ; 0x0A
+#     nop              ; 0x0C
+# f:
+#     call g           ; 0x0D
+#     ret              ; 0x12
+# g:
+#     nop              ; 0x13
+#     ret              ; 0x14
+PROGRAM = bytes([
+    0xE8, 0x08, 0x00, 0x00, 0x00,
+    0xB8, 0x01, 0x00, 0x00, 0x00,
+    0xCD, 0x80,
+    0x90,
+    0xE8, 0x01, 0x00, 0x00, 0x00,
+    0xC3,
+    0x90,
+    0xC3,
+])
+
+
+class TestSymbolIndex(unittest.TestCase):
+    def setUp(self):
+        self.symbols = SymbolIndex([(0x200, 0, 'second'), (0x100, 0x10, 'first')])
+
+    def test_lookup(self):
+        self.assertEqual(self.symbols.lookup(0x100), ('first', 0x100))
+        self.assertEqual(self.symbols.lookup(0x10F), ('first', 0x100))
+        self.assertEqual(self.symbols.lookup(0x5000), ('second', 0x200))  # unknown size
+
+    def test_outside(self):
+        self.assertIsNone(self.symbols.lookup(0xFF))
+        self.assertIsNone(self.symbols.lookup(0x110))
+        self.assertEqual(self.symbols.name(0x110), '0x00000110')
+
+    def test_elf(self):
+        symbols = SymbolIndex.from_file('C/bin/memcpy_test.elf')
+
+        self.assertEqual(symbols.name(symbols.addresses[symbols.names.index('main')] + 1), 'main')
+        self.assertIn('_start', symbols.names)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO())
+
+    def test_shadow_stack(self):
+        symbols = SymbolIndex([(0x00, 0x0D, 'main'), (0x0D, 6, 'f'), (0x13, 2, 'g')])
+        sampler = SamplingProfiler(symbols, interval=1)
+
+        self.vm.tracing.attach(sampler)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        self.assertEqual(sum(sampler.samples.values()), self.vm.instructions_retired)
+        self.assertEqual(sampler.stack, [])
+        # the registers are sampled after each instruction: the last sample is taken after `int 0x80`
+        self.assertEqual(sampler.collapsed(), 'f 2\nf;g 2\nmain 3\n')
+        self.assertEqual(sampler.top(1), [('main', 3)])
+
+    def test_interval(self):
+        sampler = SamplingProfiler(interval=2)
+
+        self.vm.tracing.attach(sampler)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        self.assertEqual(sum(sampler.samples.values()), self.vm.instructions_retired // 2)
+        self.assertIn('0x0000000d;0x00000013 1\n', sampler.collapsed())
+
+    def test_elf(self):
+        sampler = SamplingProfiler(SymbolIndex.from_file('C/bin/memcpy_test.elf'), interval=10)
+        vm = VM.VMKernel(0x0017801d, io.StringIO(), io.StringIO(), io.StringIO())
+
+        vm.tracing.attach(sampler)
+        vm.execute(VM.ExecutionStrategy.ELF, 'C/bin/memcpy_test.elf')
+
+        self.assertEqual(vm.RETCODE, 0)
+        self.assertTrue(any(
+            stack.startswith('_start;_start_c;__libc_start_main;main')
+            for stack in sampler.collapsed().splitlines()
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,159 @@
+import unittest
+import io
+
+import VM
+from VM.Memory import PAGE_SIZE
+
+O_WRONLY = 0o1
+O_TRUNC = 0o1000
+O_LARGEFILE = 0o100000
+
+#     mov ebx, [0x2000]
+#     inc ebx
+#     mov [0x2000], ebx
+#     mov byte [0], 0xF4  ; overwrite the first instruction with `hlt`
+#     mov eax, 1
+#     int 0x80            ; exit(ebx)
+COUNTER = bytes([
+    0x8B, 0x1D, 0x00, 0x20, 0x00, 0x00,
+    0x43,
+    0x89, 0x1D, 0x00, 0x20, 0x00, 0x00,
+    0xC6, 0x05, 0x00, 0x00, 0x00, 0x00, 0xF4,
+    0xB8, 0x01, 0x00, 0x00, 0x00,
+    0xCD, 0x80
+])
+
+
+class TestSnapshot(unittest.TestCase):
+    MEMSZ = PAGE_SIZE * 4
+
+    def setUp(self):
+        self.stdin = io.StringIO('input')
+        self.vm = VM.VMKernel(self.MEMSZ, self.stdin, io.StringIO(), io.StringIO())
+
+        self.vm.mem.set_bytes(0, len(COUNTER), COUNTER)
+        self.vm.eip = 0
+        self.snapshot = self.vm.snapshot()
+
+    def test_restore(self):
+        esp = self.vm.reg.esp
+
+        self.vm.run()
+        self.assertEqual(self.vm.RETCODE, 1)
+        self.assertEqual(self.vm.mem.dirty_pages, {0, 2})
+
+        self.vm.restore(self.snapshot)
+
+        self.assertEqual(self.vm.eip, 0)
+        self.assertEqual(self.vm.reg.esp, esp)
+        self.assertEqual(self.vm.mem.get_bytes(0, len(COUNTER)), COUNTER)
+        self.assertEqual(self.vm.mem.get(0x2000, 4), 0)
+        self.assertEqual(self.vm.mem.dirty_pages, set())
+
+        self.vm.run()
+        self.assertEqual(self.vm.RETCODE, 1)
+
+    def test_descriptors(self):
+        self.stdin.read(2)
+        self.vm.descriptors.append(io.StringIO())
+
+        self.vm.restore(self.snapshot)
+
+        self.assertEqual(len(self.vm.descriptors), 3)
+        self.assertEqual(self.stdin.read(), 'input')
+
+    def test_restore_after_resize(self):
+        self.vm.run()
+        self.vm.mem.size = self.MEMSZ * 2
+
+        self.vm.restore(self.snapshot)
+
+        self.assertEqual(self.vm.mem.size, self.MEMSZ)
+        self.assertEqual(self.vm.mem.get_bytes(0, len(COUNTER)), COUNTER)
+
+        self.vm.run()
+        self.assertEqual(self.vm.RETCODE, 1)
+        self.assertEqual(self.vm.mem.dirty_pages, {0, 2})
+
+
+class TestFileSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.fs = VM.kernel.MemoryFS({'input': b'0123456789'})
+        self.vm = VM.VMKernel(PAGE_SIZE * 4, io.StringIO(), io.StringIO(), io.StringIO(), fs=self.fs)
+        self.kernel = self.vm.kernel
+
+    def open(self, name: str, flags: int) -> int:
+        self.vm.mem.set_bytes(0x100, len(name) + 1, name.encode() + b'\0')
+        return self.kernel.sys_open(0x100, flags, 0)
+
+    def test_closed_file(self):
+        fd = self.open('input', O_LARGEFILE)
+        self.assertEqual(self.kernel.sys_read(fd, 0x200, 4), 4)
+
+        snapshot = self.vm.snapshot()
+        self.assertEqual(self.kernel.sys_close(fd), 0)
+
+        self.vm.restore(snapshot)
+        self.assertEqual(self.kernel.sys_read(fd, 0x200, 4), 4)
+        self.assertEqual(self.vm.mem.get_bytes(0x200, 4), b'4567')
+
+        self.vm.restore(snapshot)  # again, after reading
+        self.assertEqual(self.kernel.sys_read(fd, 0x200, 4), 4)
+        self.assertEqual(self.vm.mem.get_bytes(0x200, 4), b'4567')
+
+    def test_memory_fs(self):
+        fd = self.open('log', O_WRONLY | O_TRUNC)
+        self.vm.mem.set_bytes(0x200, 5, b'start')
+        self.kernel.sys_write(fd, 0x200, 5)
+
+        snapshot = self.vm.snapshot()
+
+        self.kernel.sys_write(fd, 0x200, 5)
+        self.kernel.sys_close(fd)
+        self.kernel.sys_unlink(0x100)  # the path `log` is still there
+        self.kernel.sys_close(self.open('new', O_WRONLY | O_TRUNC))
+        self.assertEqual(sorted(self.fs.files), ['/input', '/new'])
+
+        self.vm.restore(snapshot)
+        self.assertEqual(self.fs.files, {'/input': b'0123456789', '/log': b'start'})
+
+        self.vm.mem.set_bytes(0x200, 3, b'end')
+        self.assertEqual(self.kernel.sys_write(fd, 0x200, 3), 3)
+        self.assertEqual(self.kernel.sys_close(fd), 0)
+        self.assertEqual(self.fs.read('log'), b'startend')
+
+
+class TestIntRegistersSnapshot(TestSnapshot):
+    def setUp(self):
+        self.stdin = io.StringIO('input')
+        self.vm = VM.VMKernel(self.MEMSZ, self.stdin, io.StringIO(), io.StringIO(), int_registers=True)
+
+        self.vm.mem.set_bytes(0, len(COUNTER), COUNTER)
+        self.vm.eip = 0
+        self.snapshot = self.vm.snapshot()
+
+
+class TestPagedSnapshot(TestSnapshot):
+    def setUp(self):
+        self.stdin = io.StringIO('input')
+        self.vm = VM.VMKernel(0, self.stdin, io.StringIO(), io.StringIO(), paged=True)
+
+        self.vm.mem.set_bytes(0, len(COUNTER), COUNTER)
+        self.vm.eip = 0
+        self.snapshot = self.vm.snapshot()
+
+    def test_restore_after_resize(self):
+        self.vm.run()
+        self.vm.mem.size = self.MEMSZ  # drops all the pages
+
+        self.vm.restore(self.snapshot)
+
+        self.assertEqual(self.vm.mem.get_bytes(0, len(COUNTER)), COUNTER)
+        self.assertEqual(self.vm.mem.committed_pages, 1)
+
+        self.vm.run()
+        self.assertEqual(self.vm.RETCODE, 1)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
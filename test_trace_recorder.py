@@ -0,0 +1,66 @@
+import unittest
+import io
+
+import VM
+from VM.traceRecorder import TraceRecorder, load_trace
+
+from test_tracing import PROGRAM
+
+
+class TestTraceRecorder(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), io.StringIO(), io.StringIO())
+
+    def record(self, recorder: TraceRecorder) -> list:
+        self.vm.tracing.attach(recorder)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        file = io.BytesIO()
+        recorder.dump(file)
+        file.seek(0)
+
+        registers, records = load_trace(file)
+        self.assertEqual(registers, recorder.registers)
+
+        return list(records)
+
+    def test_all(self):
+        records = self.record(TraceRecorder(100))
+
+        self.assertEqual(len(records), self.vm.instructions_retired)
+        self.assertEqual(records[0].eip, 0)
+        self.assertEqual(records[0].opcode, 0xB8)
+        self.assertEqual(records[0].registers['eax'], 4)  # the registers after the instruction
+        self.assertEqual(records[-1].registers['ebx'], 4)
+
+    def test_ring_buffer(self):
+        recorder = TraceRecorder(3, registers=('ebx',))
+        records = self.record(recorder)
+
+        self.assertEqual(recorder.count, 10)
+        self.assertEqual([record.opcode for record in records], [0x43, 0xB8, 0xCD])
+        self.assertEqual([record.registers for record in records], [{'ebx': 4}] * 3)
+
+    def test_no_registers(self):
+        records = self.record(TraceRecorder(4, registers=()))
+
+        self.assertEqual([record.registers for record in records], [{}] * 4)
+        self.assertEqual(records[-1].eip, 0x1E)
+
+    def test_clear(self):
+        recorder = TraceRecorder(4)
+        self.record(recorder)
+        recorder.clear()
+
+        self.assertEqual(len(recorder), 0)
+        self.assertEqual(recorder.raw_records(), b'')
+
+    def test_bad_file(self):
+        with self.assertRaises(ValueError):
+            load_trace(io.BytesIO(bytes(64)))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,131 @@
+import unittest
+import io
+
+import VM
+
+DATA = 0x100
+
+#     mov eax, 4
+#     mov ebx, 1
+#     mov ecx, DATA
+#     mov edx, 2
+#     int 0x80         ; write(1, DATA, 2)
+#     inc ebx
+#     inc ebx
+#     inc ebx
+#     mov eax, 1
+#     int 0x80         ; exit(4)
+PROGRAM = bytes([
+    0xB8, 0x04, 0x00, 0x00, 0x00,
+    0xBB, 0x01, 0x00, 0x00, 0x00,
+    0xB9, *DATA.to_bytes(4, 'little'),
+    0xBA, 0x02, 0x00, 0x00, 0x00,
+    0xCD, 0x80,
+    0x43,
+    0x43,
+    0x43,
+    0xB8, 0x01, 0x00, 0x00, 0x00,
+    0xCD, 0x80,
+])
+PROGRAM += bytes(DATA - len(PROGRAM)) + b'hi'
+
+
+class Recorder:
+    def __init__(self):
+        self.instructions = []
+        self.syscalls = []
+        self.writes = []
+
+    def on_instruction(self, vm, address, entry):
+        self.instructions.append((address, entry.opcode))
+
+    def on_syscall(self, vm, number, result):
+        self.syscalls.append((number, result))
+
+    def on_memory_write(self, vm, address, size):
+        self.writes.append((address, size))
+
+
+class SyscallRecorder:
+    def __init__(self):
+        self.syscalls = []
+
+    def on_syscall(self, vm, number, result):
+        self.syscalls.append(number)
+
+
+class TestTracing(unittest.TestCase):
+    MEMSZ = 1024 * 10
+
+    def setUp(self):
+        self.stdout = io.StringIO()
+        self.vm = VM.VMKernel(self.MEMSZ, io.StringIO(), self.stdout, io.StringIO())
+
+    def test_no_tracers(self):
+        self.assertFalse(self.vm.tracing)
+        self.assertIsNone(self.vm.mem.on_traced_write)
+        self.assertFalse(any(bits & VM.Memory.PAGE_TRACED for bits in self.vm.mem.page_state))
+
+    def test_all_hooks(self):
+        recorder = Recorder()
+        self.vm.tracing.attach(recorder)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        self.assertEqual(self.vm.RETCODE, 4)
+        self.assertEqual(self.stdout.getvalue(), 'hi')
+        self.assertEqual(len(recorder.instructions), self.vm.instructions_retired)
+        self.assertEqual(recorder.instructions[:2], [(0, 0xB8), (5, 0xBB)])
+        self.assertEqual(recorder.syscalls, [(4, 2), (1, 4)])
+        self.assertIn((0, len(PROGRAM)), recorder.writes)  # loading the program
+
+    def test_only_syscalls(self):
+        recorder = SyscallRecorder()
+        self.vm.tracing.attach(recorder)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        self.assertEqual(recorder.syscalls, [4, 1])
+        self.assertEqual(self.vm.tracing.instruction, ())
+        self.assertIsNone(self.vm.mem.on_traced_write)
+
+    def test_window(self):
+        recorder = Recorder()
+        vm = self.vm
+
+        class Switch:
+            def on_syscall(self, vm, number, result):
+                if number == 4:  # start tracing after the first syscall
+                    vm.tracing.attach(recorder)
+
+        vm.tracing.attach(Switch())
+        vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        self.assertEqual(vm.RETCODE, 4)
+        self.assertEqual([opcode for _, opcode in recorder.instructions], [0x43, 0x43, 0x43, 0xB8, 0xCD])
+        self.assertEqual(vm.instructions_retired, 10)
+
+    def test_detach(self):
+        recorder = Recorder()
+        self.vm.tracing.attach(recorder)
+        self.vm.tracing.detach(recorder)
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        self.assertEqual(recorder.instructions, [])
+        self.assertEqual(recorder.writes, [])
+        self.assertFalse(any(bits & VM.Memory.PAGE_TRACED for bits in self.vm.mem.page_state))
+
+    def test_disassembly(self):
+        output = io.StringIO()
+        self.vm.tracing.attach(VM.DisassemblyTracer(output))
+        self.vm.execute(VM.ExecutionStrategy.BYTES, PROGRAM)
+
+        lines = output.getvalue().splitlines()
+
+        self.assertEqual(lines[0], '\t[0x00000000]\tb804000000\tmov eax, 0x4')
+        self.assertIn('\t[0x00000014]\tcd80\tint 0x80', lines)
+        self.assertIn('\t[0x00000016]\t43\tinc ebx', lines)
+        self.assertIn('\tsyscall 0x04 -> 0x00000002', lines)
+        self.assertEqual(len(lines), 10 + 2)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
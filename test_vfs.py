@@ -0,0 +1,145 @@
+import unittest
+import io
+import os
+import tarfile
+import tempfile
+
+import VM
+from VM.kernel import HostFS, MemoryFS
+
+O_WRONLY = 0o1
+O_RDWR = 0o2
+O_TRUNC = 0o1000
+O_LARGEFILE = 0o100000
+
+SEEK_SET = 0
+
+
+class TestMemoryFS(unittest.TestCase):
+    def setUp(self):
+        self.fs = MemoryFS({'input.s': 'mov eax, 1\n', '/dir/../data': b'\x00\x01'})
+
+    def test_paths(self):
+        self.assertEqual(sorted(self.fs.files), ['/data', '/input.s'])
+        self.assertTrue(self.fs.exists('/input.s'))
+        self.assertTrue(self.fs.exists('./data'))
+        self.assertFalse(self.fs.exists('missing'))
+
+    def test_read_only(self):
+        with self.fs.open('input.s', 'r') as file:
+            self.assertEqual(file.read(), b'mov eax, 1\n')
+
+            with self.assertRaises(io.UnsupportedOperation):
+                file.write(b'ret')
+
+        self.assertEqual(self.fs.read('input.s'), b'mov eax, 1\n')
+
+    def test_write(self):
+        file = self.fs.open('output', 'w')
+        file.write(b'abc')
+        self.assertEqual(self.fs.read('output'), b'')
+
+        file.close()
+        self.assertEqual(self.fs.read('output'), b'abc')
+
+        with self.fs.open('output', 'r+') as file:
+            file.seek(1)
+            file.write(b'X')
+
+        self.assertEqual(self.fs.read('output'), b'aXc')
+
+    def test_errors(self):
+        with self.assertRaises(FileNotFoundError):
+            self.fs.open('missing', 'r')
+
+        with self.assertRaises(FileExistsError):
+            self.fs.open('data', 'x')
+
+        with self.assertRaises(FileNotFoundError):
+            self.fs.unlink('missing')
+
+        self.fs.unlink('data')
+        self.assertFalse(self.fs.exists('data'))
+
+    def test_from_tar(self):
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode='w') as tar:
+            for name, data in (('src/a.s', b'nop\n'), ('b.s', b'ret\n')):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+
+        archive.seek(0)
+        fs = MemoryFS.from_tar(archive)
+
+        self.assertEqual(fs.files, {'/src/a.s': b'nop\n', '/b.s': b'ret\n'})
+
+
+class TestSyscalls(unittest.TestCase):
+    def setUp(self):
+        self.fs = MemoryFS({'input': b'0123456789'})
+        self.vm = VM.VMKernel(0x1000, io.StringIO(), io.StringIO(), io.StringIO(), fs=self.fs)
+
+    def set_string(self, address: int, string: str) -> int:
+        data = string.encode() + b'\0'
+        self.vm.mem.set_bytes(address, len(data), data)
+        return address
+
+    def open(self, name: str, flags: int) -> int:
+        return self.vm.kernel.sys_open(self.set_string(0x100, name), flags, 0)
+
+    def test_read(self):
+        fd = self.open('input', O_LARGEFILE)
+        self.assertEqual(fd, 3)
+
+        self.assertEqual(self.vm.kernel.sys_read(fd, 0x200, 4), 4)
+        self.assertEqual(self.vm.kernel.sys_llseek(fd, 0, 8, 0x300, SEEK_SET), 0)
+        self.assertEqual(self.vm.kernel.sys_read(fd, 0x204, 4), 2)
+        self.assertEqual(self.vm.mem.get_bytes(0x200, 6), b'012389')
+
+        self.assertEqual(self.vm.kernel.sys_close(fd), 0)
+
+    def test_write(self):
+        fd = self.open('output', O_WRONLY | O_TRUNC)
+
+        self.vm.mem.set_bytes(0x200, 6, b'result')
+        self.assertEqual(self.vm.kernel.sys_write(fd, 0x200, 6), 6)
+        self.assertEqual(self.vm.kernel.sys_close(fd), 0)
+
+        self.assertEqual(self.fs.read('output'), b'result')
+
+    def test_errors(self):
+        self.assertEqual(self.open('missing', O_LARGEFILE), -1)
+        self.assertEqual(self.open('missing', O_RDWR), -1)
+        self.assertEqual(self.open('input', O_WRONLY), -1)  # it exists already
+
+        self.assertEqual(self.vm.kernel.sys_unlink(self.set_string(0x100, 'input')), 0)
+        self.assertEqual(self.vm.kernel.sys_unlink(self.set_string(0x100, 'input')), -1)
+        self.assertEqual(self.fs.files, {})
+
+
+class TestHostFS(unittest.TestCase):
+    def test_passthrough(self):
+        fs = HostFS()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'file')
+
+            with fs.open(path, 'w') as file:
+                file.write(b'data')
+
+            self.assertTrue(fs.exists(path))
+            with fs.open(path, 'r') as file:
+                self.assertEqual(file.read(), b'data')
+
+            fs.unlink(path)
+            self.assertFalse(fs.exists(path))
+
+    def test_default(self):
+        vm = VM.VMKernel(0x1000, io.StringIO(), io.StringIO(), io.StringIO())
+
+        self.assertIsInstance(vm.kernel.fs, HostFS)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)